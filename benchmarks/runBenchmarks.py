@@ -0,0 +1,425 @@
+"""Headless benchmarks for the widgets. Runs on the offscreen Qt platform
+and prints the results as JSON, so runs can be compared between releases.
+
+Usage:
+python benchmarks/runBenchmarks.py [--quick] [--only NAME ...] [--session FILE] [--output FILE]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import timeit
+import argparse
+import platform
+import tracemalloc
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+_repositoryRoot = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, _repositoryRoot)
+
+from PyQt5 import QtCore  # noqa: E402
+from PyQt5 import QtWidgets  # noqa: E402
+
+# Writes lines of a fixed length to stdout as fast as the pipe takes them
+_WRITER = """
+import sys
+count, length = int(sys.argv[1]), int(sys.argv[2])
+line = ("x" * (length - 8) + "{:07d}\\n")
+out = sys.stdout
+for i in range(count):
+    out.write(line.format(i % 10000000))
+"""
+
+
+def _rssBytes():
+    """Returns the resident set size of the process, or None if unknown"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _contextSwitches():
+    """Returns the voluntary context switches of the process, or None if unknown"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("voluntary_ctxt_switches:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _runEventLoop(app, seconds, until=None):
+    """Process events for up to seconds, or until until() is true"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+        if until is not None and until():
+            return True
+        time.sleep(0.001)
+    return until is None
+
+
+def _execFor(app, seconds):
+    """Run the application event loop for seconds. Unlike _runEventLoop it
+    blocks in the loop, so idle costs aren't hidden by polling
+    """
+    QtCore.QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+
+
+class _LatencyProbe(QtCore.QObject):
+    """Measures how late a periodic timer fires, as a proxy for how
+    responsive the GUI event loop is
+    """
+
+    def __init__(self, intervalMs=10):
+        super().__init__()
+        self.__interval = intervalMs / 1000
+        self.__expected = None
+        self.delays = []
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.__timer.timeout.connect(self.__fire)
+        self.__timer.start(intervalMs)
+
+    def __fire(self):
+        now = time.monotonic()
+        if self.__expected is not None:
+            self.delays.append(max(0.0, now - self.__expected))
+        self.__expected = now + self.__interval
+
+    def stop(self):
+        self.__timer.stop()
+
+    def summary(self):
+        return {"p50Ms": _msOrNone(_percentile(self.delays, 0.5)),
+                "p99Ms": _msOrNone(_percentile(self.delays, 0.99)),
+                "maxMs": _msOrNone(max(self.delays) if self.delays else None),
+                "samples": len(self.delays)}
+
+
+def _msOrNone(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def benchConsoleIngest(app, lines, lineLength, processes):
+    """Lines and bytes per second QConsoleOutputWidget takes in from
+    synthetic subprocesses, and the event loop latency meanwhile
+    """
+    from source import QConsoleOutputWidget
+
+    widget = QConsoleOutputWidget(batched=True)
+    widget.show()
+    store = widget.scrollback()
+    start = store.endIndex()
+    expected = lines * processes
+
+    probe = _LatencyProbe()
+    began = time.perf_counter()
+    for _ in range(processes):
+        widget.addProcess(subprocess.Popen([sys.executable, "-c", _WRITER, str(lines), str(lineLength)],
+                                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT),
+                          encoding="utf-8")
+    finished = _runEventLoop(app, 120, lambda: store.endIndex() - start >= expected)
+    elapsed = time.perf_counter() - began
+    probe.stop()
+
+    received = store.endIndex() - start
+    result = {"processes": processes, "lines": received, "lineLength": lineLength,
+              "complete": finished, "seconds": round(elapsed, 4),
+              "linesPerSecond": round(received / elapsed),
+              "megabytesPerSecond": round(received * lineLength / elapsed / 1e6, 3),
+              "eventLoopLatency": probe.summary()}
+    widget.close()
+    widget.deleteLater()
+    return result
+
+
+def benchConsoleReplay(app, path=None, lines=200000, lineLength=80):
+    """Lines per second QConsoleOutputWidget takes in when a recording
+    is replayed as fast as possible, and the event loop latency
+    meanwhile. Without a path, a synthetic recording of two interleaved
+    sources is written first, so the result is the same from run to run.
+    """
+    import tempfile
+    from source import ConsoleRecorder, ConsoleReplay, QConsoleOutputWidget
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.cwrec")
+        chunk = ("x" * (lineLength - 1) + "\n").encode() * 64
+        with ConsoleRecorder(path) as recorder:
+            recorder.addSource(1, "stdout")
+            recorder.addSource(2, "stderr")
+            for i in range(lines // 64):
+                recorder.record(1 + i % 2, chunk)
+
+    widget = QConsoleOutputWidget(batched=True)
+    widget.show()
+    store = widget.scrollback()
+    start = store.endIndex()
+    replay = ConsoleReplay(widget, path, speed=None)
+    done = []
+    replay.finished.connect(lambda: done.append(True))
+
+    probe = _LatencyProbe()
+    began = time.perf_counter()
+    replay.start()
+    finished = _runEventLoop(app, 120, lambda: done and not widget.pendingLineCount())
+    widget.flushPendingLines(everything=True)
+    elapsed = time.perf_counter() - began
+    probe.stop()
+
+    received = store.endIndex() - start
+    result = {"path": path, "chunks": replay.chunkCount(), "lines": received,
+              "complete": finished, "seconds": round(elapsed, 4),
+              "linesPerSecond": round(received / elapsed),
+              "megabytesPerSecond": round(replay.byteCount() / elapsed / 1e6, 3),
+              "eventLoopLatency": probe.summary()}
+    widget.close()
+    widget.deleteLater()
+    return result
+
+
+def benchLiveClocks(app, count, seconds, painted=False):
+    """CPU time and wakeups per second of count idle QLiveClockWidget
+    instances. Painted clocks each show a different timezone.
+    """
+    import datetime
+    from source import ClockTicker, QLiveClockWidget
+
+    if painted:
+        clocks = [QLiveClockWidget(painted=True, timezone=datetime.timedelta(minutes=15 * (i % 96 - 48)))
+                  for i in range(count)]
+    else:
+        clocks = [QLiveClockWidget() for _ in range(count)]
+    for clock in clocks:
+        clock.show()
+    ticks = []
+    ClockTicker.instance().tick.connect(ticks.append)
+    _runEventLoop(app, 0.5)
+
+    ticks.clear()
+    cpuBefore = time.process_time()
+    switchesBefore = _contextSwitches()
+    began = time.perf_counter()
+    _execFor(app, seconds)
+    elapsed = time.perf_counter() - began
+    cpu = time.process_time() - cpuBefore
+    switches = _contextSwitches()
+
+    ClockTicker.instance().tick.disconnect(ticks.append)
+    for clock in clocks:
+        clock.close()
+        clock.deleteLater()
+    return {"clocks": count, "painted": painted, "seconds": round(elapsed, 3),
+            "cpuPercent": round(cpu / elapsed * 100, 3),
+            "ticksPerSecond": round(len(ticks) / elapsed, 3),
+            "contextSwitchesPerSecond": (None if switches is None
+                                         else round((switches - switchesBefore) / elapsed, 1))}
+
+
+def benchMultipleChoice(app, count, virtualized):
+    """Construction time and memory of a QMultipleChoiceWidget with count options"""
+    from source import QMultipleChoiceWidget
+
+    options = {f"host-{i:06d}.example.com": (lambda: None) for i in range(count)}
+    gc.collect()
+    rssBefore = _rssBytes()
+    tracemalloc.start()
+    began = time.perf_counter()
+    widget = QMultipleChoiceWidget(options, virtualized=virtualized)
+    widget.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - began
+    pythonBytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rssAfter = _rssBytes()
+
+    filterSeconds = None
+    if widget.isVirtualized():
+        began = time.perf_counter()
+        for text in ("h", "ho", "host-01", "host-012", "example"):
+            widget.setFilter(text)
+        filterSeconds = round((time.perf_counter() - began) / 5, 6)
+
+    widget.close()
+    widget.deleteLater()
+    app.processEvents()
+    return {"options": count, "virtualized": widget.isVirtualized(),
+            "constructSeconds": round(elapsed, 4),
+            "rssDeltaBytes": None if rssBefore is None else rssAfter - rssBefore,
+            "pythonBytes": pythonBytes,
+            "filterSeconds": filterSeconds}
+
+
+def benchProgress(app, calls):
+    """Cost per call of QProgressTaskDialog.setProgress and of the progress channel"""
+    from source import QProgressTaskDialog
+
+    dialog = QProgressTaskDialog("Benchmark")
+    dialog.show()
+    app.processEvents()
+    setProgress = dialog.setProgress
+    advance = dialog.progressChannel().advance
+
+    values = [i * 100 / calls for i in range(calls)]
+    began = time.perf_counter()
+    for value in values:
+        setProgress(value)
+    setProgressNs = (time.perf_counter() - began) / calls * 1e9
+
+    advanceNs = timeit.timeit(advance, number=calls) / calls * 1e9
+    dialog.close()
+    dialog.deleteLater()
+    return {"calls": calls, "setProgressNs": round(setProgressNs, 1), "advanceNs": round(advanceNs, 1)}
+
+
+def benchWidgetPool(app, repeats):
+    """Time from asking for a dialog to it being shown and painted, when
+    it is constructed each time and when it is taken from a prewarmed
+    WidgetPool. Each repeat shows the dialog with new text, as a real
+    caller would. readyMs is the part before show(), which the pool
+    replaces with a reset().
+    """
+    from source import QAlarmLockWidget, QLabelledPromptDialog, QProgressTaskDialog, WidgetPool
+
+    # name -> (build with the text of repeat i, reset() arguments for repeat i)
+    factories = {"QProgressTaskDialog": (lambda i: QProgressTaskDialog(f"Task {i}"),
+                                         lambda i: {"taskName": f"Task {i}"}),
+                 "QLabelledPromptDialog": (lambda i: QLabelledPromptDialog(f"Prompt {i}"),
+                                           lambda i: {"prompt": f"Prompt {i}"}),
+                 "QAlarmLockWidget": (lambda i: QAlarmLockWidget(message=f"Alarm {i}"),
+                                      lambda i: {"message": f"Alarm {i}"})}
+    results = {}
+    for name, (build, argumentsOf) in factories.items():
+        constructed, constructedReady = [], []
+        for i in range(repeats):
+            began = time.perf_counter()
+            widget = build(i)
+            constructedReady.append(time.perf_counter() - began)
+            widget.show()
+            app.processEvents()
+            constructed.append(time.perf_counter() - began)
+            widget.close()
+            widget.deleteLater()
+            app.processEvents()
+
+        pool = WidgetPool(lambda: build(-1))
+        pool.prewarm()
+        pooled, pooledReady = [], []
+        for i in range(repeats):
+            began = time.perf_counter()
+            widget = pool.acquire(**argumentsOf(i))
+            pooledReady.append(time.perf_counter() - began)
+            widget.show()
+            app.processEvents()
+            pooled.append(time.perf_counter() - began)
+            pool.release(widget)
+            app.processEvents()
+        pool.size = 0  # Don't prewarm again after clear()
+        pool.clear()
+        app.processEvents()
+
+        results[name] = {"constructMs": _msOrNone(_percentile(constructed, 0.5)),
+                         "pooledMs": _msOrNone(_percentile(pooled, 0.5)),
+                         "constructReadyMs": _msOrNone(_percentile(constructedReady, 0.5)),
+                         "pooledReadyMs": _msOrNone(_percentile(pooledReady, 0.5))}
+    return results
+
+
+# Imports a statement in a fresh interpreter, and reports the time taken and what was loaded
+_IMPORTER = """
+import sys, time, json
+began = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - began
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules),
+                  "widgetModules": sorted(name for name in sys.modules if name.startswith("source.")),
+                  "threading": "threading" in sys.modules, "subprocess": "subprocess" in sys.modules}))
+"""
+
+
+def benchImportTime(app, repeats):
+    """Time to import the package and each widget in a fresh interpreter.
+    The best of repeats runs is reported, to discount disk cache effects.
+    """
+    statements = {"PyQt5": "from PyQt5 import QtCore, QtGui, QtWidgets",
+                  "package": "import source"}
+    for name in ("QAlarmLockWidget", "QConsoleInputWidget", "QConsoleOutputWidget", "QLabelledPromptDialog",
+                 "QLiveClockWidget", "QMultipleChoiceWidget", "QProgressTaskDialog"):
+        statements[name] = f"from source import {name}"
+
+    results = {}
+    for name, statement in statements.items():
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, "-c", _IMPORTER, statement], cwd=_repositoryRoot,
+                                    stdout=subprocess.PIPE, check=True).stdout
+            runs.append(json.loads(output))
+        best = min(runs, key=lambda run: run["seconds"])
+        best["seconds"] = round(best["seconds"], 5)
+        results[name] = best
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads, for a smoke test")
+    parser.add_argument("--only", nargs="+",
+                        choices=["console", "replay", "clock", "choice", "progress", "pool", "import"],
+                        help="Only run these benchmarks")
+    parser.add_argument("--session", help="Recording to replay in the replay benchmark, "
+                                          "instead of a synthetic one")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    selected = set(args.only or ["console", "replay", "clock", "choice", "progress", "pool", "import"])
+    scale = 10 if args.quick else 1
+    results = {"python": platform.python_version(), "qt": QtCore.QT_VERSION_STR,
+               "platform": platform.platform(), "qpa": os.environ["QT_QPA_PLATFORM"],
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "quick": args.quick, "benchmarks": {}}
+    benchmarks = results["benchmarks"]
+
+    if "console" in selected:
+        benchmarks["consoleIngest"] = [benchConsoleIngest(app, 200000 // scale, 80, 1),
+                                       benchConsoleIngest(app, 100000 // scale, 80, 4)]
+    if "replay" in selected:
+        benchmarks["consoleReplay"] = benchConsoleReplay(app, args.session, 200000 // scale)
+    if "clock" in selected:
+        benchmarks["liveClocks"] = [benchLiveClocks(app, count, 3 if args.quick else 10, painted)
+                                    for count, painted in ((1, False), (100, False), (100, True))]
+    if "choice" in selected:
+        benchmarks["multipleChoice"] = [benchMultipleChoice(app, count, virtualized)
+                                        for count, virtualized in ((50, False), (1000 // scale, False),
+                                                                   (50000 // scale, True))]
+    if "progress" in selected:
+        benchmarks["progress"] = benchProgress(app, 1000000 // scale)
+    if "pool" in selected:
+        benchmarks["widgetPool"] = benchWidgetPool(app, 20 if args.quick else 100)
+    if "import" in selected:
+        benchmarks["importTime"] = benchImportTime(app, 2 if args.quick else 5)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
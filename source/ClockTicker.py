@@ -0,0 +1,110 @@
+import datetime
+from PyQt5 import QtCore
+
+
+class ClockTicker(QtCore.QObject):
+    """A process-wide clock tick source shared by every QLiveClockWidget.
+    It runs a single one-shot timer on the GUI thread, armed for the next
+    second boundary, or the next minute boundary when no subscriber needs
+    seconds, so any number of clocks costs one wakeup per tick and
+    nothing in between. The timer only runs while there are subscribers.
+
+    Clocks in other timezones convert the tick with utcTime(), which
+    converts each tick from local time once, however many clocks ask.
+
+    Signals:
+    tick -- The current datetime, just after each boundary
+    """
+
+    tick = QtCore.pyqtSignal(object)
+
+    # Fire slightly after the boundary, so the clock already shows the new second
+    _SLACK_MS = 2
+
+    _instance = None
+
+    def __init__(self, parent=None):
+        """Constructor for ClockTicker. Use ClockTicker.instance() to get
+        the shared ticker instead.
+        """
+        super().__init__(parent)
+        self.__secondSubscribers = 0
+        self.__minuteSubscribers = 0
+        self.__lastTick = None
+        self.__utcTick = (None, None)
+
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.__timer.timeout.connect(self.__fire)
+
+    @classmethod
+    def instance(cls):
+        """Returns the process-wide ClockTicker. Call on the GUI thread."""
+        if cls._instance is None:
+            cls._instance = cls(QtCore.QCoreApplication.instance())
+        return cls._instance
+
+    def subscribe(self, perSecond=True):
+        """Register interest in ticks. Connect to tick to receive them.
+
+        Keyword Arguments:
+        perSecond -- True to tick every second, False for every minute (default: True)
+        """
+        if perSecond:
+            self.__secondSubscribers += 1
+        else:
+            self.__minuteSubscribers += 1
+        self.__arm()
+
+    def unsubscribe(self, perSecond=True):
+        """Undo a previous subscribe() call with the same argument"""
+        if perSecond:
+            self.__secondSubscribers = max(0, self.__secondSubscribers - 1)
+        else:
+            self.__minuteSubscribers = max(0, self.__minuteSubscribers - 1)
+        self.__arm()
+
+    def subscriberCount(self):
+        """Returns the number of subscribers"""
+        return self.__secondSubscribers + self.__minuteSubscribers
+
+    def utcTime(self, now):
+        """Returns a tick as an aware UTC datetime, for converting to
+        other timezones. The conversion is cached per tick.
+
+        Arguments:
+        now -- A naive local datetime, as emitted by tick
+
+        Example:
+        ClockTicker.instance().utcTime(now).astimezone(zoneinfo.ZoneInfo("Asia/Tokyo"))
+        """
+        tick, utc = self.__utcTick
+        if tick is not now:
+            utc = now.astimezone(datetime.timezone.utc)
+            self.__utcTick = (now, utc)
+        return utc
+
+    def __arm(self, now=None):
+        """Arm the timer for the next boundary, or stop it if nobody listens"""
+        if self.subscriberCount() == 0:
+            self.__timer.stop()
+            return
+
+        if now is None:
+            now = datetime.datetime.now()
+        msLeft = 1000 - now.microsecond // 1000
+        if not self.__secondSubscribers:
+            msLeft += (59 - now.second) * 1000
+        self.__timer.start(msLeft + self._SLACK_MS)
+
+    @QtCore.pyqtSlot()
+    def __fire(self):
+        now = datetime.datetime.now()
+        current = now.replace(microsecond=0)
+
+        # A timer that fires early is re-armed for the rest of the interval
+        if current != self.__lastTick:
+            self.__lastTick = current
+            self.tick.emit(now)
+        self.__arm(now)
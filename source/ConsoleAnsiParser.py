@@ -0,0 +1,267 @@
+"""Streaming parser for ANSI escape sequences in console output.
+
+Only SGR sequences (colours, bold, italic, underline and inverse) are
+interpreted. Every other escape sequence is removed from the text. The
+current style is carried from one chunk to the next, and an escape
+sequence split across two chunks is held back until it is complete.
+
+Styles are plain tuples, and ConsoleTextFormats interns every distinct
+style once as a small integer id with a matching QTextCharFormat, so
+lines can be stored as text plus a short tuple of (column, styleId)
+runs instead of as HTML.
+"""
+
+import re
+import threading
+from PyQt5 import QtGui
+
+# (foreground, background, bold, italic, underline, inverse). Colours are
+# None for the default colour, an int for a 256 colour palette index, or
+# an (r, g, b) tuple for 24 bit colours.
+DEFAULT_STYLE = (None, None, False, False, False, False)
+
+_CSI = re.compile(r"\x1b\[([0-?]*)[ -/]*([@-~])")
+_OSC = re.compile(r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)")
+_INCOMPLETE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[()*+])?")
+
+
+class ConsoleAnsiParser:
+    """Splits text containing ANSI escape sequences into styled runs
+
+    Example:
+    P = ConsoleAnsiParser()
+    P.feed("\\x1b[31mred\\x1b[0m plain")
+    # [("red", (1, None, False, False, False, False)), (" plain", DEFAULT_STYLE)]
+    """
+
+    def __init__(self):
+        """Constructor for ConsoleAnsiParser"""
+        self.__style = DEFAULT_STYLE
+        self.__pending = ""
+
+    def style(self):
+        """Returns the style that applies to the next text fed"""
+        return self.__style
+
+    def isIdle(self):
+        """Returns True if the default style applies and no partial
+        escape sequence is held back, so text without escape sequences
+        can skip the parser entirely.
+        """
+        return self.__style == DEFAULT_STYLE and not self.__pending
+
+    def snapshot(self):
+        """Returns the parser state, to be passed to restore() later"""
+        return (self.__style, self.__pending)
+
+    def restore(self, snapshot):
+        """Return to a state previously returned by snapshot()"""
+        self.__style, self.__pending = snapshot
+
+    def reset(self):
+        """Return to the default style and drop any partial sequence"""
+        self.__style = DEFAULT_STYLE
+        self.__pending = ""
+
+    def feed(self, text):
+        """Parse a chunk of text
+
+        Arguments:
+        text -- The text to parse
+
+        Returns:
+        list -- (text, style) runs with the escape sequences removed.
+                Adjacent runs always have different styles.
+        """
+        if self.__pending:
+            text = self.__pending + text
+            self.__pending = ""
+
+        if "\x1b" not in text:
+            return [(text, self.__style)] if text else []
+
+        runs = []
+        position = 0
+        while True:
+            escape = text.find("\x1b", position)
+            if escape < 0:
+                self.__addRun(runs, text[position:])
+                return runs
+
+            self.__addRun(runs, text[position:escape])
+
+            match = _CSI.match(text, escape)
+            if match:
+                if match.group(2) == "m":
+                    self.__applySgr(match.group(1))
+                position = match.end()
+                continue
+
+            match = _OSC.match(text, escape)
+            if match:
+                position = match.end()
+                continue
+
+            if _INCOMPLETE.fullmatch(text, escape):
+                self.__pending = text[escape:]
+                return runs
+
+            # Unsupported sequences: charset selection such as ESC ( B
+            # takes three characters, everything else two
+            position = escape + (3 if text[escape + 1:escape + 2] in ("(", ")", "*", "+") else 2)
+
+    def __addRun(self, runs, text):
+        if not text:
+            return
+        if runs and runs[-1][1] == self.__style:
+            runs[-1] = (runs[-1][0] + text, self.__style)
+        else:
+            runs.append((text, self.__style))
+
+    def __applySgr(self, parameters):
+        """Update the current style from the parameters of an SGR sequence"""
+        fg, bg, bold, italic, underline, inverse = self.__style
+        codes = [int(code) if code.isdigit() else 0
+                 for code in parameters.replace(":", ";").split(";")]
+
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                fg, bg, bold, italic, underline, inverse = DEFAULT_STYLE
+            elif code == 1:
+                bold = True
+            elif code == 3:
+                italic = True
+            elif code == 4:
+                underline = True
+            elif code == 7:
+                inverse = True
+            elif code == 22:
+                bold = False
+            elif code == 23:
+                italic = False
+            elif code == 24:
+                underline = False
+            elif code == 27:
+                inverse = False
+            elif 30 <= code <= 37:
+                fg = code - 30
+            elif 90 <= code <= 97:
+                fg = code - 90 + 8
+            elif code == 39:
+                fg = None
+            elif 40 <= code <= 47:
+                bg = code - 40
+            elif 100 <= code <= 107:
+                bg = code - 100 + 8
+            elif code == 49:
+                bg = None
+            elif code in (38, 48) and i + 1 < len(codes):
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    color = codes[i + 2] & 0xFF
+                    i += 2
+                elif codes[i + 1] == 2 and i + 4 < len(codes):
+                    color = tuple(c & 0xFF for c in codes[i + 2:i + 5])
+                    i += 4
+                else:
+                    color = None
+                    i += 1
+                if code == 38:
+                    fg = color
+                else:
+                    bg = color
+            i += 1
+
+        self.__style = (fg, bg, bold, italic, underline, inverse)
+
+
+def _paletteColor(index):
+    """Returns the (r, g, b) value of a 256 colour palette index"""
+    if index < 16:
+        base = [(0, 0, 0), (205, 49, 49), (13, 188, 121), (229, 229, 16),
+                (36, 114, 200), (188, 63, 188), (17, 168, 205), (229, 229, 229),
+                (102, 102, 102), (241, 76, 76), (35, 209, 139), (245, 245, 67),
+                (59, 142, 234), (214, 112, 214), (41, 184, 219), (255, 255, 255)]
+        return base[index]
+    if index < 232:
+        index -= 16
+        steps = [0, 95, 135, 175, 215, 255]
+        return (steps[index // 36], steps[(index // 6) % 6], steps[index % 6])
+    level = 8 + (index - 232) * 10
+    return (level, level, level)
+
+
+class ConsoleTextFormats:
+    """Interns styles produced by ConsoleAnsiParser as small integer ids,
+    with one shared QTextCharFormat per id. Id 0 is the default style.
+    styleId() is thread safe, so ids can be assigned on reader threads.
+    """
+
+    def __init__(self):
+        """Constructor for ConsoleTextFormats"""
+        self.__lock = threading.Lock()
+        self.__ids = {DEFAULT_STYLE: 0}
+        self.__styles = [DEFAULT_STYLE]
+        self.__formats = {}
+
+    def styleId(self, style):
+        """Returns the id of a style, assigning one if it is new"""
+        styleId = self.__ids.get(style)
+        if styleId is None:
+            with self.__lock:
+                styleId = self.__ids.get(style)
+                if styleId is None:
+                    styleId = len(self.__styles)
+                    self.__styles.append(style)
+                    self.__ids[style] = styleId
+        return styleId
+
+    def style(self, styleId):
+        """Returns the style tuple of an id"""
+        return self.__styles[styleId]
+
+    def format(self, styleId):
+        """Returns the interned QTextCharFormat of a style id. Default
+        colours are left unset, so they come from the widget palette.
+        """
+        textFormat = self.__formats.get(styleId)
+        if textFormat is None:
+            fg, bg, bold, italic, underline, inverse = self.__styles[styleId]
+            textFormat = QtGui.QTextCharFormat()
+            if inverse:
+                fg, bg = bg, fg
+            if fg is not None:
+                textFormat.setForeground(QtGui.QColor(*self.__rgb(fg)))
+            if bg is not None:
+                textFormat.setBackground(QtGui.QColor(*self.__rgb(bg)))
+            if bold:
+                textFormat.setFontWeight(QtGui.QFont.Bold)
+            textFormat.setFontItalic(italic)
+            textFormat.setFontUnderline(underline)
+            self.__formats[styleId] = textFormat
+        return textFormat
+
+    def toRuns(self, styledRuns):
+        """Convert (text, style) runs from ConsoleAnsiParser.feed into a
+        plain line and its compact run tuple
+
+        Returns:
+        tuple -- (text, runs) where runs is None for an unstyled line, or
+                 a tuple of (column, styleId) pairs
+        """
+        if not styledRuns:
+            return "", None
+        if len(styledRuns) == 1 and styledRuns[0][1] == DEFAULT_STYLE:
+            return styledRuns[0][0], None
+
+        runs = []
+        column = 0
+        for text, style in styledRuns:
+            runs.append((column, self.styleId(style)))
+            column += len(text)
+        return "".join(text for text, _ in styledRuns), tuple(runs)
+
+    @staticmethod
+    def __rgb(color):
+        return color if isinstance(color, tuple) else _paletteColor(color)
@@ -0,0 +1,210 @@
+"""An append-only on-disk log of console lines.
+
+A log is a pair of files. The data file holds the lines as UTF-8 text
+separated by newlines, so it can be read with any tool. The index file,
+named like the data file with ".idx" appended, holds a short header
+followed by the end offset of every line as a 64 bit little-endian
+integer. Both files are memory-mapped for reading, so opening a saved
+log takes the same time no matter how many lines it holds, and any
+line can be paged in without scanning the lines before it.
+"""
+
+import os
+import sys
+import mmap
+import array
+import shutil
+import struct
+
+_HEADER = struct.Struct("<8sII")
+_MAGIC = b"CWLOGIDX"
+_VERSION = 1
+
+
+class ConsoleDiskLog:
+    """Appends lines to a log file with an offset index, and reads any
+    range of lines back from memory-mapped files.
+
+    Example:
+    L = ConsoleDiskLog("build.log")
+    L.append(["first line", "second line"])
+    L.lines(0, 2)
+    """
+
+    def __init__(self, path, readOnly=False):
+        """Constructor for ConsoleDiskLog. Opens the log at path, creating
+        it unless readOnly is set.
+
+        Arguments:
+        path -- Path of the data file. The index is stored at path + ".idx"
+
+        Keyword Arguments:
+        readOnly -- Open an existing log without appending to it (default: False)
+
+        Exceptions:
+        OSError -- If the files can not be opened
+        ValueError -- If the files are not a console log: the data file
+                      exists without an index or the other way round, the
+                      index is not a console log index, or the data file
+                      does not end where the index says it does
+        """
+        self.path = path
+        self.indexPath = path + ".idx"
+        self.readOnly = readOnly
+
+        # Empty files hold nothing to misread, so they may start a new log
+        hasData, hasIndex = (os.path.exists(file) and (readOnly or os.path.getsize(file) > 0)
+                             for file in (path, self.indexPath))
+        if hasData != hasIndex:
+            raise ValueError(f"{path} is not a console log, its data and index files must exist together")
+
+        mode = "rb" if readOnly else "a+b"
+        self.__data = open(self.path, mode)
+        self.__index = open(self.indexPath, mode)
+        self.__dataMap = None
+        self.__indexMap = None
+
+        self.__index.seek(0, os.SEEK_END)
+        if self.__index.tell() == 0 and not readOnly:
+            self.__index.write(_HEADER.pack(_MAGIC, _VERSION, 0))
+            self.__index.flush()
+
+        self.__index.seek(0)
+        magic, version, _ = _HEADER.unpack(self.__index.read(_HEADER.size).ljust(_HEADER.size, b"\0"))
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"{self.indexPath} is not a console log index")
+
+        self.__index.seek(0, os.SEEK_END)
+        self.__lineCount = (self.__index.tell() - _HEADER.size) // 8
+        self.__data.seek(0, os.SEEK_END)
+        self.__dataSize = self.__data.tell()
+
+        indexedSize = 0
+        if self.__lineCount:
+            self.__index.seek(_HEADER.size + (self.__lineCount - 1) * 8)
+            indexedSize = int.from_bytes(self.__index.read(8), "little")
+        if indexedSize != self.__dataSize:
+            self.close()
+            raise ValueError(f"{self.path} is not a console log, it holds {self.__dataSize} bytes "
+                             f"but its index ends at {indexedSize}")
+
+    @classmethod
+    def open(cls, path):
+        """Open a saved log for reading
+
+        Example:
+        L = ConsoleDiskLog.open("session.log")
+        """
+        return cls(path, readOnly=True)
+
+    def lineCount(self):
+        """Returns the number of lines in the log"""
+        return self.__lineCount
+
+    def byteCount(self):
+        """Returns the size of the data file"""
+        return self.__dataSize
+
+    def append(self, lines):
+        """Append lines to the log, and flush them to disk
+
+        Arguments:
+        lines -- Iterable of strings without newlines
+
+        Exceptions:
+        OSError -- If the log was opened read only
+        """
+        if self.readOnly:
+            raise OSError(f"{self.path} is opened read only")
+
+        data = bytearray()
+        ends = array.array("Q")
+        for line in lines:
+            data += line.encode("utf-8", "surrogatepass")
+            data += b"\n"
+            ends.append(self.__dataSize + len(data))
+        if not ends:
+            return
+
+        if sys.byteorder == "big":
+            ends.byteswap()
+
+        self.__data.write(data)
+        self.__index.write(ends.tobytes())
+        self.__data.flush()
+        self.__index.flush()
+        self.__dataSize += len(data)
+        self.__lineCount += len(ends)
+
+    def line(self, index):
+        """Read a single line
+
+        Exceptions:
+        IndexError -- If the line does not exist
+        """
+        if not 0 <= index < self.__lineCount:
+            raise IndexError(f"line {index} is not in the log")
+        return self.lines(index, index + 1)[0]
+
+    def lines(self, start, stop):
+        """Read the lines in [start, stop), clamped to the log
+
+        Returns:
+        list -- The lines as strings
+        """
+        start = max(0, start)
+        stop = min(stop, self.__lineCount)
+        if start >= stop:
+            return []
+
+        dataMap, indexMap = self.__maps()
+        ends = array.array("Q")
+        first = _HEADER.size + (start - 1) * 8 if start else _HEADER.size
+        ends.frombytes(indexMap[first:_HEADER.size + stop * 8])
+        if sys.byteorder == "big":
+            ends.byteswap()
+        if start == 0:
+            ends.insert(0, 0)
+
+        text = dataMap[ends[0]:ends[-1]].decode("utf-8", "surrogatepass")
+        return text.split("\n")[:-1]
+
+    def export(self, path):
+        """Copy the log to a new path, and return the copy opened for appending
+
+        Arguments:
+        path -- Path of the new data file
+
+        Returns:
+        ConsoleDiskLog -- The copy
+        """
+        shutil.copyfile(self.path, path)
+        shutil.copyfile(self.indexPath, path + ".idx")
+        return ConsoleDiskLog(path)
+
+    def close(self):
+        """Close the files and memory maps"""
+        for mapped in (self.__dataMap, self.__indexMap):
+            if mapped is not None:
+                mapped.close()
+        self.__dataMap = self.__indexMap = None
+        self.__data.close()
+        self.__index.close()
+
+    def __maps(self):
+        """Returns the (data, index) memory maps, mapping again if the
+        files have grown since they were last mapped
+        """
+        indexSize = _HEADER.size + self.__lineCount * 8
+        if self.__indexMap is None or len(self.__indexMap) < indexSize:
+            if self.__indexMap is not None:
+                self.__indexMap.close()
+            self.__indexMap = mmap.mmap(self.__index.fileno(), indexSize, access=mmap.ACCESS_READ)
+
+        if self.__dataSize and (self.__dataMap is None or len(self.__dataMap) < self.__dataSize):
+            if self.__dataMap is not None:
+                self.__dataMap.close()
+            self.__dataMap = mmap.mmap(self.__data.fileno(), self.__dataSize, access=mmap.ACCESS_READ)
+
+        return self.__dataMap if self.__dataMap is not None else b"", self.__indexMap
@@ -0,0 +1,260 @@
+"""Command history for console input, kept in an append-only file.
+
+The file holds one JSON string per line, so commands may contain any
+character, and is appended to as commands are added. It is read the
+first time the history is used, or on a background thread after
+preload(), rather than when it is created. Only the most recent
+maxEntries distinct commands are kept in memory, and the file is
+rewritten with just those once it holds more than twice as many lines,
+whether when it is read or as commands are added.
+"""
+
+import os
+import json
+import bisect
+import threading
+from .PrefixIndex import PrefixIndex
+
+# Commands added since the index was built are searched one by one, and
+# the index is rebuilt once there are this many
+_TAIL_LIMIT = 1024
+
+
+class ConsoleHistory:
+    """A bounded, de-duplicated command history with prefix and substring
+    search, optionally backed by a history file.
+
+    Entries are addressed by position, oldest first. A command that is
+    added again moves to the newest position, leaving a gap at its old
+    one, so positions of other entries never change until the history is
+    compacted. Searches run on a PrefixIndex over the entries, so they
+    take the same time for a hundred entries or a few hundred thousand.
+
+    Example:
+    H = ConsoleHistory("~/.console_history")
+    H.add("make -j8")
+    H.find("make", prefix=True)  # Position of the newest command starting with "make"
+    """
+
+    def __init__(self, path=None, maxEntries=10000):
+        """Constructor for ConsoleHistory. The file is not read until the
+        history is first used.
+
+        Keyword Arguments:
+        path -- Path of the history file, None to only keep the history
+                in memory (default: None)
+        maxEntries -- Max distinct commands kept (default: 10000)
+        """
+        self.path = os.path.expanduser(path) if path is not None else None
+        self.maxEntries = maxEntries
+
+        self.__loaded = False
+        self.__loadLock = threading.Lock()
+        self.__file = None
+        self.__fileLines = 0
+        self.__commands = []  # None where an entry was moved or dropped
+        self.__positions = {}  # command -> its position in __commands
+        self.__first = 0
+        self.__index = None
+        self.__indexed = 0
+
+    def preload(self):
+        """Start reading the history file on a background thread, so it
+        is ready by the time it is used
+        """
+        if not self.__loaded:
+            threading.Thread(target=self.__load, name="ConsoleHistory", daemon=True).start()
+
+    def __len__(self):
+        self.__load()
+        return len(self.__positions)
+
+    def add(self, command):
+        """Add a command as the newest entry, and append it to the file.
+        Blank commands are ignored.
+
+        Arguments:
+        command -- The command
+        """
+        if not command.strip():
+            return
+        self.__load()
+        self.__append(command)
+        self.__trim()
+
+        if self.path is not None:
+            if self.__file is None:
+                self.__file = open(self.path, "a", encoding="utf-8")
+            self.__file.write(json.dumps(command) + "\n")
+            self.__file.flush()
+            self.__fileLines += 1
+            if self.__fileLines > 2 * self.maxEntries:
+                self.close()  # Opened again on the rewritten file
+                self.__rewrite()
+
+    def entries(self):
+        """Returns the commands, oldest first"""
+        self.__load()
+        return [command for command in self.__commands if command is not None]
+
+    def entry(self, position):
+        """Returns the command at a position returned by find()"""
+        self.__load()
+        return self.__commands[position]
+
+    def end(self):
+        """Returns the position after the newest entry"""
+        self.__load()
+        return len(self.__commands)
+
+    def find(self, text="", start=None, backward=True, prefix=False):
+        """Find the nearest entry containing text, or starting with it
+
+        Keyword Arguments:
+        text -- The text to look for, "" for any entry (default: "")
+        start -- Search from this position, not including it. None for
+                 the newest end when searching backward (default: None)
+        backward -- Search towards older entries (default: True)
+        prefix -- Only match entries starting with text (default: False)
+
+        Returns:
+        int -- The position of the entry, or None if there is none
+
+        Example:
+        position = find("ssh")
+        older = find("ssh", position)
+        """
+        self.__load()
+        commands = self.__commands
+        if start is None:
+            start = len(commands) if backward else -1
+
+        if self.__indexed < len(commands) - _TAIL_LIMIT:
+            self.__buildIndex()
+        indexed = self.__indexed
+
+        def matches(command):
+            if command is None:
+                return False
+            return command.startswith(text) if prefix else text in command
+
+        if backward:
+            for position in range(min(start, len(commands)) - 1, indexed - 1, -1):
+                if matches(commands[position]):
+                    return position
+            for position in reversed(self.__indexMatches(text, prefix, 0, min(start, indexed))):
+                if commands[position] is not None:
+                    return position
+        else:
+            for position in self.__indexMatches(text, prefix, start + 1, indexed):
+                if commands[position] is not None:
+                    return position
+            for position in range(max(start + 1, indexed), len(commands)):
+                if matches(commands[position]):
+                    return position
+        return None
+
+    def close(self):
+        """Close the history file. It is opened again if a command is added."""
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __indexMatches(self, text, prefix, low, high):
+        """Indexed positions in [low, high) matching text, in order"""
+        if low >= high:
+            return []
+        if not text:
+            return range(low, high)
+        positions = self.__index.prefixMatches(text) if prefix else self.__index.matches(text)
+        return positions[bisect.bisect_left(positions, low):bisect.bisect_left(positions, high)]
+
+    def __buildIndex(self):
+        self.__index = PrefixIndex([command or "" for command in self.__commands], caseSensitive=True)
+        self.__indexed = len(self.__commands)
+
+    def __append(self, command):
+        old = self.__positions.get(command)
+        if old is not None:
+            self.__commands[old] = None
+        self.__positions[command] = len(self.__commands)
+        self.__commands.append(command)
+
+    def __trim(self):
+        """Drop the oldest entries beyond maxEntries, and compact once
+        gaps make up most of the list
+        """
+        commands = self.__commands
+        while len(self.__positions) > self.maxEntries:
+            command = commands[self.__first]
+            if command is not None:
+                del self.__positions[command]
+                commands[self.__first] = None
+            self.__first += 1
+
+        if len(commands) > 2 * max(len(self.__positions), _TAIL_LIMIT):
+            self.__commands = [command for command in commands if command is not None]
+            self.__positions = {command: i for i, command in enumerate(self.__commands)}
+            self.__first = 0
+            self.__index = None
+            self.__indexed = 0
+
+    def __load(self):
+        """Read the file, once, on whichever thread gets here first"""
+        if self.__loaded:
+            return
+        with self.__loadLock:
+            if not self.__loaded:
+                if self.path is not None:
+                    self.__read()
+                self.__loaded = True
+
+    def __read(self):
+        """Read the newest maxEntries distinct commands from the file"""
+        try:
+            with open(self.path, "rb") as history:
+                lines = history.read().splitlines()
+        except FileNotFoundError:
+            return
+        self.__fileLines = len(lines)
+
+        # Walk back from the newest line, so only the kept lines are parsed
+        seen = set()
+        kept = []
+        for line in reversed(lines):
+            if line in seen or not line:
+                continue
+            seen.add(line)
+            try:
+                command = json.loads(line)
+            except ValueError:
+                continue  # A partly written or corrupt line
+            if isinstance(command, str):
+                kept.append(command)
+                if len(kept) >= self.maxEntries:
+                    break
+
+        for command in reversed(kept):
+            self.__append(command)
+        self.__buildIndex()
+
+        if len(lines) > 2 * self.maxEntries:
+            self.__rewrite()
+
+    def __rewrite(self):
+        """Replace the file with just the commands in memory"""
+        temporary = self.path + ".tmp"
+        written = 0
+        try:
+            with open(temporary, "w", encoding="utf-8") as history:
+                for command in self.__commands:
+                    if command is None:
+                        continue
+                    history.write(json.dumps(command) + "\n")
+                    written += 1
+            os.replace(temporary, self.path)
+        except OSError:
+            # The full file still works, it is just larger. Try again
+            # once it has grown as much again.
+            written = 0
+        self.__fileLines = written
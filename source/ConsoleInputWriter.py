@@ -0,0 +1,216 @@
+import locale
+import threading
+import collections
+from PyQt5 import QtCore
+
+
+class ConsoleInputWriter(QtCore.QObject):
+    """Writes to the stdin of a subprocess.Popen object on a background
+    thread, so a child that stops reading can never block the GUI.
+
+    Data is queued up to maxQueuedBytes. When the queue is full, write()
+    refuses new data and backpressureChanged(True) is emitted, followed
+    by backpressureChanged(False) once the child has caught up.
+
+    Flush policies:
+    "always" -- Flush after every write
+    "line" -- Flush when written data ends with the line terminator
+    "manual" -- Only flush when flush() is called
+
+    Signals:
+    backpressureChanged -- True when the queue is full, False when it has room again
+    bytesWritten -- Total bytes written to the process so far
+    writeFailed -- Error message, when the pipe is closed or broken
+    """
+
+    backpressureChanged = QtCore.pyqtSignal(bool)
+    bytesWritten = QtCore.pyqtSignal(int)
+    writeFailed = QtCore.pyqtSignal(str)
+
+    def __init__(self, process, parent=None, lineTerminator="\n", flushPolicy="line",
+                 maxQueuedBytes=1 << 20, chunkSize=65536, encoding=None):
+        """Constructor for ConsoleInputWriter
+
+        Arguments:
+        process -- The subprocess.Popen object, made with stdin=PIPE
+
+        Keyword Arguments:
+        parent -- parent object (default: None)
+        lineTerminator -- Appended to every line by writeLine / writeLines (default: "\\n")
+        flushPolicy -- "always", "line" or "manual" (default: "line")
+        maxQueuedBytes -- Max bytes waiting to be written (default: 1 MiB)
+        chunkSize -- Max bytes written to the pipe at a time (default: 65536)
+        encoding -- Encoding for str data, detected from the pipe or the
+                    locale when None (default: None)
+
+        Exceptions:
+        ValueError -- If the flush policy is unknown
+
+        Example:
+        W = ConsoleInputWriter(process, lineTerminator="\\r\\n")
+        W.writeLines(["import sys", "print(sys.version)"])
+        """
+        super().__init__(parent)
+        if flushPolicy not in ("always", "line", "manual"):
+            raise ValueError(f"Unknown flush policy: {flushPolicy}")
+
+        self.lineTerminator = lineTerminator
+        self.flushPolicy = flushPolicy
+        self.maxQueuedBytes = maxQueuedBytes
+        self.chunkSize = chunkSize
+
+        self.__stream = getattr(process.stdin, "buffer", process.stdin)
+        self.__encoding = (encoding or getattr(process.stdin, "encoding", None)
+                           or locale.getpreferredencoding(False))
+
+        self.__condition = threading.Condition()
+        self.__queue = collections.deque()
+        self.__queuedBytes = 0
+        self.__writtenBytes = 0
+        self.__flushRequested = False
+        self.__closeRequested = False
+        self.__failed = False
+        self.__backpressure = False
+
+        self.__thread = threading.Thread(target=self.__run, name="ConsoleInputWriter", daemon=True)
+        self.__thread.start()
+
+    def write(self, data, block=False, timeout=None):
+        """Queue data to be written to the process
+
+        Arguments:
+        data -- str or bytes to write, as is
+
+        Keyword Arguments:
+        block -- Wait for room in the queue instead of refusing the data.
+                 Never block on the GUI thread. (default: False)
+        timeout -- Max seconds to wait when blocking (default: None)
+
+        Returns:
+        bool -- True if the data was queued, False if the queue was full,
+                the writer was closed, or the pipe has failed
+        """
+        if isinstance(data, str):
+            data = data.encode(self.__encoding)
+        if not data:
+            return True
+
+        with self.__condition:
+            if block:
+                self.__condition.wait_for(lambda: self.__hasRoom(len(data)), timeout)
+            if self.__failed or self.__closeRequested:
+                return False
+            if not self.__hasRoom(len(data)):
+                self.__setBackpressure(True)
+                return False
+
+            self.__queue.append(memoryview(data))  # Sliced into chunks without copying
+            self.__queuedBytes += len(data)
+            if self.flushPolicy == "always" or (self.flushPolicy == "line"
+                                               and data.endswith(self.lineTerminator.encode(self.__encoding))):
+                self.__flushRequested = True
+            self.__condition.notify_all()
+            return True
+
+    def writeLine(self, line, block=False, timeout=None):
+        """Queue a line, followed by the line terminator. See write()."""
+        return self.write(line + self.lineTerminator if isinstance(line, str)
+                          else line + self.lineTerminator.encode(self.__encoding), block, timeout)
+
+    def writeLines(self, lines, block=False, timeout=None):
+        """Queue several lines as one write, each followed by the line
+        terminator. Useful for scripted input. See write().
+        """
+        terminator = self.lineTerminator.encode(self.__encoding)
+        data = b"".join((line.encode(self.__encoding) if isinstance(line, str) else line) + terminator
+                        for line in lines)
+        return self.write(data, block, timeout)
+
+    def flush(self):
+        """Flush the pipe once everything queued so far has been written"""
+        with self.__condition:
+            self.__flushRequested = True
+            self.__condition.notify_all()
+
+    def close(self):
+        """Write everything queued, then close the stdin of the process"""
+        with self.__condition:
+            self.__closeRequested = True
+            self.__condition.notify_all()
+
+    def queuedBytes(self):
+        """Returns the number of bytes waiting to be written"""
+        return self.__queuedBytes
+
+    def writtenBytes(self):
+        """Returns the number of bytes written to the process so far"""
+        return self.__writtenBytes
+
+    def hasBackpressure(self):
+        """Returns True if the queue was full at the last write"""
+        return self.__backpressure
+
+    def __hasRoom(self, size):
+        """Returns True if size bytes fit in the queue. An empty queue
+        always takes the data, so large pastes still go through.
+        Caller holds the condition.
+        """
+        return (self.__failed or self.__closeRequested or not self.__queue
+                or self.__queuedBytes + size <= self.maxQueuedBytes)
+
+    def __setBackpressure(self, active):
+        """Caller holds the condition"""
+        if active != self.__backpressure:
+            self.__backpressure = active
+            self.backpressureChanged.emit(active)
+
+    def __run(self):
+        """The writer loop. Drains the queue into the pipe chunk by chunk."""
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__queue or self.__flushRequested
+                                          or self.__closeRequested)
+                chunk = rest = None
+                if self.__queue:
+                    data = self.__queue.popleft()
+                    chunk, rest = data[:self.chunkSize], data[self.chunkSize:]
+                    if rest:
+                        self.__queue.appendleft(rest)
+                flush = self.__flushRequested and not rest
+                close = self.__closeRequested and not self.__queue
+
+            try:
+                if chunk:
+                    self.__stream.write(chunk)
+                if flush or close:
+                    self.__stream.flush()
+                if close:
+                    self.__stream.close()
+            except (OSError, ValueError) as error:
+                self.__fail(str(error))
+                return
+
+            with self.__condition:
+                if chunk:
+                    self.__queuedBytes -= len(chunk)
+                    self.__writtenBytes += len(chunk)
+                if flush and not self.__queue:
+                    self.__flushRequested = False
+                if self.__backpressure and self.__queuedBytes <= self.maxQueuedBytes // 2:
+                    self.__setBackpressure(False)
+                self.__condition.notify_all()
+
+            if chunk:
+                self.bytesWritten.emit(self.__writtenBytes)
+            if close:
+                return
+
+    def __fail(self, message):
+        """Drop everything queued after the pipe failed"""
+        with self.__condition:
+            self.__failed = True
+            self.__queue.clear()
+            self.__queuedBytes = 0
+            self.__setBackpressure(False)
+            self.__condition.notify_all()
+        self.writeFailed.emit(message)
@@ -0,0 +1,147 @@
+"""Turns a stream of raw output chunks into console lines.
+
+Chunks are decoded with an incremental decoder, so multi-byte
+characters split across two reads come out intact. A carriage return
+moves the cursor back to the start of the current line, and whatever
+follows overwrites it in place, the way a terminal shows progress bars.
+A line that has not been terminated yet can be flushed as a provisional
+line after a timeout; later writes to it replace that provisional line
+instead of producing new ones.
+"""
+
+import time
+import codecs
+import threading
+
+
+class ConsoleLineAssembler:
+    """Assembles console lines from byte or string chunks, and passes
+    every line to a callback as onLine(text, final, timestamp). Lines
+    with final set to False are provisional snapshots of an unterminated
+    line, and the next line passed for the same assembler replaces them.
+    The timestamp is the time the chunk that completed the line was read,
+    as given to feed(), or for a provisional line the time its oldest
+    unshown change was read.
+
+    All methods are thread safe, and the callback is called while the
+    assembler's lock is held, so lines arrive in order even when one
+    thread feeds data and another flushes partial lines.
+    """
+
+    def __init__(self, onLine, encoding="utf-8", errors="replace", partialTimeout=0.2):
+        """Constructor for ConsoleLineAssembler
+
+        Arguments:
+        onLine -- Called as onLine(text, final, timestamp) for every line
+
+        Keyword Arguments:
+        encoding -- Encoding used to decode byte chunks (default: "utf-8")
+        errors -- Decoding error policy, as for bytes.decode (default: "replace")
+        partialTimeout -- Seconds an unterminated line waits before being
+                          flushed as a provisional line (default: 0.2)
+
+        Exceptions:
+        LookupError -- If the encoding is unknown
+
+        Example:
+        A = ConsoleLineAssembler(print, encoding="cp1252")
+        A.feed(b"50%\\r100%\\n")  # prints: 100% True <timestamp>
+        """
+        self.__onLine = onLine
+        self.__decoder = codecs.getincrementaldecoder(encoding)(errors)
+        self.partialTimeout = partialTimeout
+
+        self.__lock = threading.Lock()
+        self.__line = ""
+        self.__column = 0
+        self.__dirtySince = None
+        self.__provisional = False
+
+    def feed(self, data, timestamp=None):
+        """Feed a chunk of output. Complete lines are passed to the callback.
+
+        Arguments:
+        data -- A bytes or str chunk
+
+        Keyword Arguments:
+        timestamp -- The time.monotonic() the chunk was read at, so lines
+                     are stamped with their read time rather than the
+                     time they are handled (default: current time)
+        """
+        with self.__lock:
+            if isinstance(data, (bytes, bytearray)):
+                data = self.__decoder.decode(data)
+            if not data:
+                return
+            if timestamp is None:
+                timestamp = time.monotonic()
+
+            *complete, rest = data.split("\n")
+            for text in complete:
+                self.__write(text, timestamp)
+                self.__endLine(timestamp)
+            self.__write(rest, timestamp)
+
+    def flushPartial(self, now=None, force=False):
+        """Pass the unterminated line to the callback as a provisional
+        line, if it changed and has been waiting for partialTimeout seconds.
+
+        Keyword Arguments:
+        now -- The time.monotonic() timestamp to use (default: current time)
+        force -- Flush regardless of the timeout (default: False)
+
+        Returns:
+        bool -- True if a provisional line was flushed
+        """
+        with self.__lock:
+            if self.__dirtySince is None:
+                return False
+            if now is None:
+                now = time.monotonic()
+            if not force and now - self.__dirtySince < self.partialTimeout:
+                return False
+
+            timestamp, self.__dirtySince = self.__dirtySince, None
+            self.__provisional = True
+            self.__onLine(self.__line, False, timestamp)
+            return True
+
+    def finish(self):
+        """Flush the decoder and pass any unterminated line on as a
+        final line. Call when the stream has ended.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__write(self.__decoder.decode(b"", True), now)
+            if self.__line or self.__provisional:
+                self.__endLine(now)
+
+    def __write(self, text, timestamp):
+        """Write text without newlines at the cursor. Caller holds the lock."""
+        if not text:
+            return
+
+        segments = text.split("\r")
+        for i, segment in enumerate(segments):
+            if i > 0:
+                self.__column = 0
+            if not segment:
+                continue
+
+            line, column = self.__line, self.__column
+            if column == len(line):
+                self.__line = line + segment
+            else:
+                self.__line = line[:column] + segment + line[column + len(segment):]
+            self.__column = column + len(segment)
+
+        if self.__dirtySince is None:
+            self.__dirtySince = timestamp
+
+    def __endLine(self, timestamp):
+        """Pass the current line on as final. Caller holds the lock."""
+        self.__onLine(self.__line, True, timestamp)
+        self.__line = ""
+        self.__column = 0
+        self.__dirtySince = None
+        self.__provisional = False
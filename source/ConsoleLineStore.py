@@ -0,0 +1,473 @@
+"""A compact, chunked line store used as the scrollback of
+QConsoleOutputWidget. Lines are kept as UTF-8 bytes in a few large
+bytearrays with an array of end offsets per chunk, rather than as one
+Python string (or QTextBlock) per line.
+
+Lines are addressed by absolute index. The first line ever appended has
+index 0, and indices stay stable when old lines are evicted, so a line
+that has been evicted simply falls below firstIndex().
+
+A line can carry a tuple of (column, styleId) runs describing its
+formatting (see ConsoleAnsiParser). Runs are only stored for styled
+lines, in a small dict per chunk, so plain output costs nothing extra.
+
+Every line also records the id of the source it came from and a
+time.monotonic() timestamp, in arrays alongside the offsets. An index of
+line numbers per source gives a view of one source's lines without
+copying them.
+
+With a backing ConsoleDiskLog, every line is also written to disk, and
+lines evicted from memory are paged back in from the log when they are
+read. Lines are written one line behind, since the newest line may
+still be replaced. Lines read back from disk carry no runs.
+"""
+
+import os
+import time
+import array
+import bisect
+import threading
+from .ConsoleDiskLog import ConsoleDiskLog
+
+
+class _LineChunk:
+    """A block of consecutive lines stored in one bytearray"""
+
+    __slots__ = ("start", "data", "offsets", "runs", "sources", "times")
+
+    def __init__(self, start):
+        self.start = start
+        self.data = bytearray()
+        self.offsets = array.array("Q", [0])
+        self.runs = {}
+        self.sources = array.array("H")
+        self.times = array.array("d")
+
+    def lineCount(self):
+        return len(self.offsets) - 1
+
+    def line(self, local):
+        return self.data[self.offsets[local]:self.offsets[local + 1]].decode("utf-8", "surrogatepass")
+
+
+class ConsoleLineStore:
+    """Stores lines of console output in fixed size chunks, and evicts
+    the oldest lines once a line or byte cap is exceeded. All methods
+    are thread safe, so a worker thread can read lines while the GUI
+    thread appends new ones.
+    """
+
+    def __init__(self, maxLines=None, maxBytes=None, chunkLines=4096, chunkBytes=1 << 20):
+        """Constructor for ConsoleLineStore
+
+        Keyword Arguments:
+        maxLines -- Max lines to keep, None for no limit (default: None)
+        maxBytes -- Max UTF-8 bytes to keep, None for no limit (default: None)
+        chunkLines -- Lines per chunk (default: 4096)
+        chunkBytes -- Bytes after which a chunk is closed (default: 1 MiB)
+
+        Example:
+        S = ConsoleLineStore(maxLines=1000000)
+        S.extend(["first line", "second line"])
+        S.line(S.firstIndex())
+        """
+        self.__maxLines = maxLines
+        self.__maxBytes = maxBytes
+        self.__chunkLines = max(1, int(chunkLines))
+        self.__chunkBytes = max(1, int(chunkBytes))
+
+        self.__lock = threading.RLock()
+        self.__endIndex = 0
+        self.__evictedCount = 0
+        self.__log = None
+        self.__logBase = 0
+        self.__loggedTo = 0
+        self.__hiddenBefore = 0
+        self.__sourceLines = {}
+        self.clear()
+
+    def clear(self):
+        """Remove every line. Indices keep counting from where they were.
+        Lines already written to a backing log stay on disk, but are no
+        longer part of the store.
+        """
+        with self.__lock:
+            self.__spill(self.__endIndex)
+            self.__hiddenBefore = self.__endIndex
+            self.__chunks = []
+            self.__starts = []
+            self.__firstIndex = self.__endIndex
+            self.__byteCount = 0
+            self.__maxLineLength = 0
+            for lines in self.__sourceLines.values():
+                del lines[:]
+
+    def setLimits(self, maxLines=None, maxBytes=None):
+        """Change the line and byte caps, evicting lines if needed
+
+        Keyword Arguments:
+        maxLines -- Max lines to keep, None for no limit (default: None)
+        maxBytes -- Max UTF-8 bytes to keep, None for no limit (default: None)
+        """
+        with self.__lock:
+            self.__maxLines = maxLines
+            self.__maxBytes = maxBytes
+            self.__evict()
+
+    def setBackingLog(self, log):
+        """Attach a ConsoleDiskLog to the store, or detach the current one.
+
+        An empty log receives the lines currently in memory and every line
+        appended from now on. The lines of a log that already holds lines,
+        such as a saved session, are placed after the lines appended so far,
+        and the lines in memory are dropped. New lines are not written to a
+        read only log, and its lines stop being part of the store once new
+        lines start being evicted.
+
+        Arguments:
+        log -- The ConsoleDiskLog, or None to detach. A detached log is
+               brought up to date and closed.
+        """
+        with self.__lock:
+            if self.__log is not None:
+                self.__spill(self.__endIndex)
+                self.__log.close()
+                self.__log = None
+                self.__hiddenBefore = self.__firstIndex
+
+            if log is None:
+                return
+
+            if log.lineCount() == 0:
+                self.__logBase = self.__loggedTo = self.__firstIndex
+            else:
+                self.clear()
+                self.__logBase = self.__endIndex
+                self.__endIndex += log.lineCount()
+                self.__firstIndex = self.__loggedTo = self.__endIndex
+            self.__hiddenBefore = self.__logBase
+            self.__log = log
+
+    def backingLog(self):
+        """Returns the attached ConsoleDiskLog, or None"""
+        return self.__log
+
+    def exportLog(self, path):
+        """Save every line in the store as a ConsoleDiskLog at path. With a
+        backing log the log files are copied rather than re-encoded.
+
+        Arguments:
+        path -- Path of the data file to write
+
+        Returns:
+        ConsoleDiskLog -- The exported log, opened for appending
+        """
+        with self.__lock:
+            for oldPath in (path, path + ".idx"):
+                if os.path.exists(oldPath):
+                    os.remove(oldPath)
+
+            if self.__log is not None and self.__diskContiguous():
+                exported = self.__log.export(path)
+                start = self.__loggedTo
+            else:
+                exported = ConsoleDiskLog(path)
+                start = self.__firstIndex
+            exported.append(self.lines(start, self.__endIndex))
+            return exported
+
+    def append(self, line, runs=None, source=0, timestamp=None):
+        """Append a single line. The line should not contain newlines.
+
+        Keyword Arguments:
+        runs -- Tuple of (column, styleId) runs, None if unstyled (default: None)
+        source -- Id of the source of the line, 0 to 65535 (default: 0)
+        timestamp -- time.monotonic() of the line, now when None (default: None)
+        """
+        self.extend((line,), None if runs is None else (runs,), (source,),
+                    None if timestamp is None else (timestamp,))
+
+    def extend(self, lines, runs=None, sources=None, timestamps=None):
+        """Append several lines in one go
+
+        Arguments:
+        lines -- Iterable of strings without newlines
+
+        Keyword Arguments:
+        runs -- Iterable with a run tuple or None for every line (default: None)
+        sources -- Iterable with a source id for every line, or None for
+                   source 0 (default: None)
+        timestamps -- Iterable with a time.monotonic() timestamp for every
+                      line, or None for now (default: None)
+
+        Returns:
+        int -- Absolute index of the first appended line
+        """
+        with self.__lock:
+            first = self.__endIndex
+            chunk = self.__chunks[-1] if self.__chunks else None
+            longest = self.__maxLineLength
+            runIter = iter(runs) if runs is not None else None
+            sourceIter = iter(sources) if sources is not None else None
+            timeIter = iter(timestamps) if timestamps is not None else None
+            now = time.monotonic() if timestamps is None else None
+            sourceLines = self.__sourceLines
+
+            for line in lines:
+                if (chunk is None or chunk.lineCount() >= self.__chunkLines
+                        or len(chunk.data) >= self.__chunkBytes):
+                    chunk = _LineChunk(self.__endIndex)
+                    self.__chunks.append(chunk)
+                    self.__starts.append(chunk.start)
+
+                encoded = line.encode("utf-8", "surrogatepass")
+                chunk.data += encoded
+                chunk.offsets.append(len(chunk.data))
+                if runIter is not None:
+                    lineRuns = next(runIter)
+                    if lineRuns:
+                        chunk.runs[chunk.lineCount() - 1] = lineRuns
+                source = next(sourceIter) if sourceIter is not None else 0
+                chunk.sources.append(source)
+                chunk.times.append(next(timeIter) if timeIter is not None else now)
+                indices = sourceLines.get(source)
+                if indices is None:
+                    indices = sourceLines[source] = array.array("Q")
+                indices.append(self.__endIndex)
+                self.__byteCount += len(encoded)
+                self.__endIndex += 1
+                if len(line) > longest:
+                    longest = len(line)
+
+            self.__maxLineLength = longest
+            self.__spill(self.__endIndex - 1)
+            self.__evict()
+            return first
+
+    def replaceLast(self, line, runs=None):
+        """Replace the text of the most recently appended line
+
+        Arguments:
+        line -- The new text of the line
+
+        Keyword Arguments:
+        runs -- The new run tuple, None if unstyled (default: None)
+
+        Returns:
+        bool -- False if the store is empty, True otherwise
+        """
+        with self.__lock:
+            if self.__endIndex == self.__firstIndex:
+                return False
+
+            chunk = self.__chunks[-1]
+            begin = chunk.offsets[-2]
+            encoded = line.encode("utf-8", "surrogatepass")
+            self.__byteCount += len(encoded) - (len(chunk.data) - begin)
+            del chunk.data[begin:]
+            chunk.data += encoded
+            chunk.offsets[-1] = len(chunk.data)
+            if runs:
+                chunk.runs[chunk.lineCount() - 1] = runs
+            else:
+                chunk.runs.pop(chunk.lineCount() - 1, None)
+            self.__maxLineLength = max(self.__maxLineLength, len(line))
+            return True
+
+    def line(self, index):
+        """Get the line at the given absolute index
+
+        Exceptions:
+        IndexError -- If the line has been evicted or does not exist yet
+        """
+        with self.__lock:
+            if self.__firstIndex <= index < self.__endIndex:
+                chunk = self.__chunkFor(index)
+                return chunk.line(index - chunk.start)
+            if self.firstIndex() <= index < self.__firstIndex:
+                return self.__log.line(index - self.__logBase)
+            raise IndexError(f"line {index} is not in the store")
+
+    def lines(self, start, stop):
+        """Get the lines in the absolute range [start, stop). The range is
+        clamped to the lines currently held by the store.
+
+        Returns:
+        list -- The lines as strings
+        """
+        with self.__lock:
+            start = max(start, self.firstIndex())
+            stop = min(stop, self.__endIndex)
+            result = self.__diskLines(start, stop)
+            start += len(result)
+            while start < stop:
+                chunk = self.__chunkFor(start)
+                local = start - chunk.start
+                count = min(stop - start, chunk.lineCount() - local)
+                result.extend(chunk.line(i) for i in range(local, local + count))
+                start += count
+            return result
+
+    def styledLines(self, start, stop):
+        """Like lines(), but returns (text, runs) tuples, where runs is
+        None for unstyled lines.
+        """
+        with self.__lock:
+            start = max(start, self.firstIndex())
+            stop = min(stop, self.__endIndex)
+            result = [(line, None) for line in self.__diskLines(start, stop)]
+            start += len(result)
+            while start < stop:
+                chunk = self.__chunkFor(start)
+                local = start - chunk.start
+                count = min(stop - start, chunk.lineCount() - local)
+                runs = chunk.runs
+                result.extend((chunk.line(i), runs.get(i)) for i in range(local, local + count))
+                start += count
+            return result
+
+    def lineSource(self, index):
+        """Returns the source id of a line held in memory
+
+        Exceptions:
+        IndexError -- If the line is not held in memory
+        """
+        with self.__lock:
+            chunk = self.__chunkFor(index)
+            return chunk.sources[index - chunk.start]
+
+    def lineTime(self, index):
+        """Returns the time.monotonic() timestamp of a line held in memory
+
+        Exceptions:
+        IndexError -- If the line is not held in memory
+        """
+        with self.__lock:
+            chunk = self.__chunkFor(index)
+            return chunk.times[index - chunk.start]
+
+    def sourceIds(self):
+        """Returns the ids of every source that has appended lines"""
+        with self.__lock:
+            return sorted(self.__sourceLines)
+
+    def sourceLines(self, source):
+        """Returns the sorted absolute indices of the lines of one source
+        that are held in memory. The array is owned by the store, and
+        grows as the source appends lines. Call on the appending thread.
+
+        Arguments:
+        source -- The source id
+        """
+        with self.__lock:
+            lines = self.__sourceLines.get(source)
+            if lines is None:
+                lines = self.__sourceLines[source] = array.array("Q")
+            evicted = bisect.bisect_left(lines, self.__firstIndex)
+            if evicted:
+                del lines[:evicted]
+            return lines
+
+    def firstIndex(self):
+        """Returns the absolute index of the oldest line held, in memory
+        or in the backing log
+        """
+        if self.__log is not None and self.__diskContiguous():
+            return max(self.__logBase, self.__hiddenBefore)
+        return self.__firstIndex
+
+    def memoryFirstIndex(self):
+        """Returns the absolute index of the oldest line held in memory"""
+        return self.__firstIndex
+
+    def endIndex(self):
+        """Returns the absolute index one past the newest line"""
+        return self.__endIndex
+
+    def lineCount(self):
+        """Returns the number of lines currently held, in memory or in
+        the backing log
+        """
+        return self.__endIndex - self.firstIndex()
+
+    def byteCount(self):
+        """Returns the number of UTF-8 bytes currently held in memory"""
+        return self.__byteCount
+
+    def evictedCount(self):
+        """Returns the number of lines evicted since creation"""
+        return self.__evictedCount
+
+    def maxLineLength(self):
+        """Returns the length in characters of the longest line seen"""
+        return self.__maxLineLength
+
+    def __len__(self):
+        return self.lineCount()
+
+    def __diskContiguous(self):
+        """Returns True if the backing log holds every line up to the
+        oldest line in memory. Caller holds the lock.
+        """
+        return self.__loggedTo >= self.__firstIndex
+
+    def __diskLines(self, start, stop):
+        """Read the part of [start, stop) that is only held in the
+        backing log. Caller holds the lock and has clamped the range.
+        """
+        stop = min(stop, self.__firstIndex)
+        if self.__log is None or start >= stop:
+            return []
+        return self.__log.lines(start - self.__logBase, stop - self.__logBase)
+
+    def __spill(self, upTo):
+        """Write lines from memory to the backing log up to, but not
+        including, the absolute index upTo. Caller holds the lock.
+        """
+        if self.__log is None or self.__log.readOnly or self.__loggedTo >= upTo:
+            return
+
+        start = max(self.__loggedTo, self.__firstIndex)
+        lines = []
+        while start < upTo:
+            chunk = self.__chunkFor(start)
+            local = start - chunk.start
+            count = min(upTo - start, chunk.lineCount() - local)
+            lines.extend(chunk.line(i) for i in range(local, local + count))
+            start += count
+        self.__log.append(lines)
+        self.__loggedTo = upTo
+
+    def __chunkFor(self, index):
+        """Find the chunk holding an absolute index. Caller holds the lock."""
+        if index < self.__firstIndex or index >= self.__endIndex:
+            raise IndexError(f"line {index} is not in the store")
+        return self.__chunks[bisect.bisect_right(self.__starts, index) - 1]
+
+    def __evict(self):
+        """Drop the oldest lines until the caps are respected. Whole chunks
+        are released once all of their lines are gone. Caller holds the lock.
+        """
+        maxLines, maxBytes = self.__maxLines, self.__maxBytes
+        while self.__chunks:
+            lineCount = self.__endIndex - self.__firstIndex
+            overLines = maxLines is not None and lineCount > maxLines
+            overBytes = maxBytes is not None and self.__byteCount > maxBytes and lineCount > 1
+            if not (overLines or overBytes):
+                break
+
+            chunk = self.__chunks[0]
+            local = self.__firstIndex - chunk.start
+            if overLines and not overBytes:
+                # Evict as many lines from this chunk as needed in one step
+                count = min(lineCount - maxLines, chunk.lineCount() - local)
+            else:
+                count = 1
+            self.__spill(self.__firstIndex + count)
+            self.__byteCount -= chunk.offsets[local + count] - chunk.offsets[local]
+            self.__firstIndex += count
+            self.__evictedCount += count
+
+            if self.__firstIndex - chunk.start >= chunk.lineCount():
+                del self.__chunks[0]
+                del self.__starts[0]
@@ -0,0 +1,178 @@
+"""A single reader thread that multiplexes the output pipes of every
+process attached to a console. Streams are registered with a selector
+(epoll / kqueue / poll, whichever the platform offers), switched to
+non-blocking mode and read in chunks, so the number of threads stays
+the same no matter how many processes are attached.
+
+Windows selectors only support sockets, so on Windows each stream
+falls back to its own blocking reader thread.
+
+A callback that raises only ends its own stream. The error is printed,
+the stream is closed and its onClosed is called, and the other streams
+keep being read.
+"""
+
+import os
+import traceback
+import threading
+import selectors
+
+
+class ConsoleProcessReader:
+    """Reads from registered pipes on one shared background thread,
+    and hands every chunk to a callback. Use instance() to get the
+    process-wide reader.
+
+    Example:
+    reader = ConsoleProcessReader.instance()
+    reader.addStream(process.stdout, onData, onClosed)
+    """
+
+    _instance = None
+    _instanceLock = threading.Lock()
+
+    def __init__(self, chunkSize=65536):
+        """Constructor for ConsoleProcessReader
+
+        Keyword Arguments:
+        chunkSize -- Max bytes read from a stream at a time (default: 65536)
+        """
+        self.chunkSize = chunkSize
+
+        self.__lock = threading.Lock()
+        self.__pending = []
+        self.__streamCount = 0
+        self.__thread = None
+        self.__selector = None
+        self.__wakeRead = self.__wakeWrite = None
+
+    @classmethod
+    def instance(cls):
+        """Returns the process-wide ConsoleProcessReader"""
+        with cls._instanceLock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def streamCount(self):
+        """Returns the number of streams currently being read"""
+        return self.__streamCount
+
+    def addStream(self, stream, onData, onClosed=None):
+        """Start reading a stream on the reader thread
+
+        Arguments:
+        stream -- A file object with a fileno(), such as Popen.stdout
+        onData -- Called with each chunk of bytes read from the stream
+
+        Keyword Arguments:
+        onClosed -- Called once the stream reached EOF and was closed (default: None)
+
+        Note:
+        Both callbacks run on the reader thread, and must not touch widgets.
+        """
+        with self.__lock:
+            self.__streamCount += 1
+
+        if os.name == "nt":
+            threading.Thread(target=self.__readBlocking, args=(stream, onData, onClosed),
+                             daemon=True).start()
+            return
+
+        os.set_blocking(stream.fileno(), False)
+        with self.__lock:
+            self.__pending.append((stream, onData, onClosed))
+            self.__ensureThread()
+        os.write(self.__wakeWrite, b"\0")
+
+    def __ensureThread(self):
+        """Start the selector thread if it is not running. Caller holds the lock."""
+        if self.__thread is not None:
+            return
+
+        self.__selector = selectors.DefaultSelector()
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        os.set_blocking(self.__wakeRead, False)
+        self.__selector.register(self.__wakeRead, selectors.EVENT_READ, None)
+
+        self.__thread = threading.Thread(target=self.__run, name="ConsoleProcessReader",
+                                         daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        """The reader loop. Runs forever on the reader thread."""
+        selector = self.__selector
+        while True:
+            for key, _ in selector.select():
+                if key.data is None:
+                    self.__registerPending()
+                else:
+                    self.__readReady(key)
+
+    def __registerPending(self):
+        """Drain the wake-up pipe and register newly added streams"""
+        try:
+            while os.read(self.__wakeRead, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self.__lock:
+            pending, self.__pending = self.__pending, []
+        for stream, onData, onClosed in pending:
+            self.__selector.register(stream.fileno(), selectors.EVENT_READ,
+                                     (stream, onData, onClosed))
+
+    def __readReady(self, key):
+        """Read one chunk from a stream the selector marked as readable"""
+        stream, onData, onClosed = key.data
+        try:
+            data = os.read(key.fd, self.chunkSize)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if data:
+            try:
+                onData(data)
+                return
+            except Exception:
+                traceback.print_exc()  # Give up on this stream only
+
+        self.__selector.unregister(key.fd)
+        self.__closeStream(stream, onClosed)
+
+    def __readBlocking(self, stream, onData, onClosed):
+        """Fallback reader used where pipes can not be selected on"""
+        raw = getattr(stream, "buffer", stream)
+        read = getattr(raw, "read1", raw.read)
+        while True:
+            try:
+                data = read(self.chunkSize)
+            except (OSError, ValueError):
+                data = b""
+            if not data:
+                break
+            try:
+                onData(data)
+            except Exception:
+                traceback.print_exc()
+                break
+        self.__closeStream(stream, onClosed)
+
+    def __closeStream(self, stream, onClosed):
+        """Close a finished stream and notify its owner"""
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+        with self.__lock:
+            self.__streamCount -= 1
+
+        if onClosed is not None:
+            try:
+                onClosed()
+            except Exception:
+                traceback.print_exc()
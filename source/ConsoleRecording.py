@@ -0,0 +1,302 @@
+"""Recording and replay of the output a QConsoleOutputWidget receives.
+
+A recording is a binary file. It starts with a header of a magic string,
+a version and the wall clock time the recording started. A sequence of
+records follows, each with a fixed 15 byte head of its kind, source id,
+microseconds since the start of the recording and payload length:
+
+SOURCE -- A source was added, the payload is its UTF-8 name
+CHUNK -- A chunk of raw output, as read from the source
+CLOSE -- The source was closed, no payload
+
+Chunks are stored exactly as they arrived, before line splitting and
+decoding, so a replay goes through the whole ingest path again.
+"""
+
+import time
+import struct
+import threading
+from PyQt5 import QtCore
+
+_HEADER = struct.Struct("<8sId")
+_RECORD = struct.Struct("<BHQI")
+_MAGIC = b"CWREC\0\0\0"
+_VERSION = 1
+
+SOURCE = 1
+CHUNK = 2
+CLOSE = 3
+
+
+class ConsoleRecorder:
+    """Writes a recording of console output. Get one from
+    QConsoleOutputWidget.startRecording(), or create one and pass it to
+    QConsoleOutputWidget.setRecorder().
+
+    Every method may be called from any thread.
+
+    Example:
+    R = console.startRecording("build.cwrec")
+    ...
+    console.stopRecording()
+    """
+
+    def __init__(self, path, bufferSize=1 << 16):
+        """Constructor for ConsoleRecorder. Creates or truncates the file at path.
+
+        Arguments:
+        path -- Path of the recording
+
+        Keyword Arguments:
+        bufferSize -- Bytes buffered before they are written (default: 64 KiB)
+
+        Exceptions:
+        OSError -- If the file can not be created
+        """
+        self.path = path
+        self.__file = open(path, "wb", buffering=bufferSize)
+        self.__lock = threading.Lock()
+        self.__start = time.monotonic()
+        self.__chunks = 0
+        self.__bytes = 0
+        self.__file.write(_HEADER.pack(_MAGIC, _VERSION, time.time()))
+
+    def addSource(self, sourceId, name):
+        """Record that a source was added
+
+        Arguments:
+        sourceId -- The id of the source
+        name -- The name of the source
+        """
+        self.__write(SOURCE, sourceId, name.encode("utf-8"))
+
+    def record(self, sourceId, data):
+        """Record a chunk of output
+
+        Arguments:
+        sourceId -- The id of the source it was read from
+        data -- The bytes read
+        """
+        self.__write(CHUNK, sourceId, data)
+
+    def closeSource(self, sourceId):
+        """Record that a source was closed
+
+        Arguments:
+        sourceId -- The id of the source
+        """
+        self.__write(CLOSE, sourceId, b"")
+
+    def chunkCount(self):
+        """Returns the number of chunks recorded"""
+        return self.__chunks
+
+    def byteCount(self):
+        """Returns the number of bytes of output recorded"""
+        return self.__bytes
+
+    def isClosed(self):
+        """Returns True once the recording has been closed"""
+        return self.__file.closed
+
+    def close(self):
+        """Write out the buffered records and close the file"""
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+    def __write(self, kind, sourceId, payload):
+        offset = int((time.monotonic() - self.__start) * 1e6)
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.write(_RECORD.pack(kind, sourceId, offset, len(payload)))
+            self.__file.write(payload)
+            if kind == CHUNK:
+                self.__chunks += 1
+                self.__bytes += len(payload)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+def readRecording(path):
+    """Read the records of a recording, one at a time, so recordings of
+    any size can be read
+
+    Arguments:
+    path -- Path of the recording
+
+    Returns:
+    generator -- (kind, sourceId, seconds, payload) for each record,
+                 where seconds is the time since the recording started
+
+    Exceptions:
+    OSError -- If the file can not be opened
+    ValueError -- If path is not a console recording
+
+    Example:
+    for kind, sourceId, seconds, payload in readRecording("build.cwrec"):
+        ...
+    """
+    with open(path, "rb") as recording:
+        magic, version, _ = _HEADER.unpack(recording.read(_HEADER.size).ljust(_HEADER.size, b"\0"))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a console recording")
+
+        read = recording.read
+        unpack = _RECORD.unpack
+        size = _RECORD.size
+        while True:
+            head = read(size)
+            if len(head) < size:
+                return  # A truncated last record is ignored
+            kind, sourceId, offset, length = unpack(head)
+            payload = read(length)
+            if len(payload) < length:
+                return
+            yield kind, sourceId, offset / 1e6, payload
+
+
+class ConsoleReplay(QtCore.QObject):
+    """Plays a recording back into a QConsoleOutputWidget. Each recorded
+    source is added to the console with addSource(), and fed its chunks
+    on the GUI thread as they were timed in the recording, sped up by a
+    factor, or as fast as possible. The recording is read as it plays.
+
+    As fast as possible, chunks are fed in bursts of maxChunksPerBurst
+    with a trip through the event loop between bursts, so the console
+    still gets to paint and a replay measures the whole ingest and
+    rendering path.
+
+    Signals:
+    finished -- When every record has been played
+    """
+
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, console, path, speed=1.0, maxChunksPerBurst=256, parent=None):
+        """Constructor for ConsoleReplay
+
+        Arguments:
+        console -- The QConsoleOutputWidget to play into
+        path -- Path of the recording
+
+        Keyword Arguments:
+        speed -- Playback speed factor, None to play as fast as possible (default: 1.0)
+        maxChunksPerBurst -- Max chunks fed per event loop iteration (default: 256)
+        parent -- parent object (default: None)
+
+        Exceptions:
+        ValueError -- If speed is not positive
+
+        Example:
+        ConsoleReplay(console, "build.cwrec").start()
+        ConsoleReplay(console, "build.cwrec", speed=10).start()
+        ConsoleReplay(console, "build.cwrec", speed=None).start()
+        """
+        super().__init__(parent)
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive, or None")
+
+        self.console = console
+        self.path = path
+        self.speed = speed
+        self.maxChunksPerBurst = maxChunksPerBurst
+
+        self.__records = None
+        self.__next = None
+        self.__sources = {}
+        self.__started = None
+        self.__chunks = 0
+        self.__bytes = 0
+
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.__timer.timeout.connect(self.__play)
+
+    def start(self):
+        """Start playing from the beginning of the recording
+
+        Exceptions:
+        OSError -- If the recording can not be opened
+        ValueError -- If path is not a console recording
+        """
+        self.stop()
+        self.__records = readRecording(self.path)
+        self.__next = next(self.__records, None)  # Reads the header, raising early
+        self.__sources = {}
+        self.__chunks = 0
+        self.__bytes = 0
+        self.__started = time.monotonic()
+        self.__timer.start(0)
+
+    def stop(self):
+        """Stop playing, and close the sources added so far"""
+        self.__timer.stop()
+        if self.__records is not None:
+            self.__records.close()
+            self.__records = None
+        for source in self.__sources.values():
+            source.close()
+        self.__sources = {}
+
+    def isPlaying(self):
+        """Returns True while the replay is playing"""
+        return self.__records is not None
+
+    def chunkCount(self):
+        """Returns the number of chunks played so far"""
+        return self.__chunks
+
+    def byteCount(self):
+        """Returns the number of bytes of output played so far"""
+        return self.__bytes
+
+    @QtCore.pyqtSlot()
+    def __play(self):
+        """Play the records that are due, and wait for the next one"""
+        if self.speed is None:
+            due = float("inf")
+        else:
+            due = (time.monotonic() - self.__started) * self.speed
+
+        record = self.__next
+        played = 0
+        while record is not None and record[2] <= due and played < self.maxChunksPerBurst:
+            self.__playRecord(*record)
+            played += 1
+            record = next(self.__records, None)
+        self.__next = record
+
+        if record is None:
+            self.__records = None
+            for source in self.__sources.values():
+                source.close()
+            self.__sources = {}
+            self.finished.emit()
+        elif record[2] <= due:
+            self.__timer.start(0)  # Behind, or as fast as possible
+        else:
+            self.__timer.start(max(0, int((record[2] - due) / self.speed * 1000)))
+
+    def __playRecord(self, kind, sourceId, seconds, payload):
+        if kind == SOURCE:
+            self.__sources[sourceId] = self.console.addSource(payload.decode("utf-8", "replace"))
+            return
+
+        source = self.__sources.get(sourceId)
+        if source is None:
+            # A source that was added before the recording started
+            source = self.__sources[sourceId] = self.console.addSource(f"Source {sourceId}")
+        if kind == CHUNK:
+            self.__chunks += 1
+            self.__bytes += len(payload)
+            source.feed(payload)
+        elif kind == CLOSE:
+            source.close()
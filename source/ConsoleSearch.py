@@ -0,0 +1,225 @@
+"""Background search over a ConsoleLineStore.
+
+Queries run on a worker thread that reads the store in slices, so the
+GUI thread never blocks on a large scrollback. Matches are streamed
+back slice by slice through a queued signal, and collected into an
+index of matching line numbers on the GUI thread. New lines are scanned
+incrementally as they arrive, so the index stays current without ever
+rescanning the whole store. Every scan is tagged with the number of
+line replacements made when it was sent, so matches for a line that was
+replaced while the scan was in flight are dropped.
+"""
+
+import re
+import array
+import bisect
+import queue
+import threading
+from PyQt5 import QtCore
+
+
+class ConsoleSearch(QtCore.QObject):
+    """Searches a ConsoleLineStore for a plain text or regex query on a
+    worker thread, and keeps a sorted index of the matching lines.
+
+    Signals:
+    matchesFound -- List of (line, start, end) matches, as they are found
+    searchFinished -- The initial scan of the store has completed
+    """
+
+    matchesFound = QtCore.pyqtSignal(object)
+    searchFinished = QtCore.pyqtSignal()
+    _sliceScanned = QtCore.pyqtSignal(int, int, object, bool, bool)
+
+    def __init__(self, store, parent=None, sliceLines=4096):
+        """Constructor for ConsoleSearch
+
+        Arguments:
+        store -- The ConsoleLineStore to search
+
+        Keyword Arguments:
+        parent -- parent object (default: None)
+        sliceLines -- Lines read from the store per step (default: 4096)
+
+        Example:
+        S = ConsoleSearch(widget.scrollback())
+        S.matchesFound.connect(showMatches)
+        S.setQuery("error", caseSensitive=False)
+        """
+        super().__init__(parent)
+        self.__store = store
+        self.__sliceLines = sliceLines
+
+        self.__generation = 0
+        self.__pattern = None
+        self.__scannedTo = store.endIndex()
+        self.__matchingLines = array.array("Q")
+        self.__version = 0  # Lines replaced so far
+        self.__replaced = {}  # line -> version it was replaced at, while older scans are in flight
+
+        self.__jobs = queue.Queue()
+        self.__worker = None
+
+        self._sliceScanned.connect(self.__collect)
+        # The worker holds no reference to a deleted search, so tell it to stop
+        jobs = self.__jobs
+        self.destroyed.connect(lambda _=None: jobs.put(None))
+
+    def setQuery(self, query, regex=False, caseSensitive=False):
+        """Start a new search, discarding the results of the old one
+
+        Arguments:
+        query -- The text or regular expression to search for
+
+        Keyword Arguments:
+        regex -- Treat the query as a regular expression (default: False)
+        caseSensitive -- Match case (default: False)
+
+        Exceptions:
+        re.error -- If regex is True and the query is not a valid expression
+        """
+        flags = re.MULTILINE | (0 if caseSensitive else re.IGNORECASE)
+        pattern = re.compile(query if regex else re.escape(query), flags)
+
+        self.__generation += 1
+        self.__pattern = pattern
+        self.__matchingLines = array.array("Q")
+        self.__replaced = {}
+        self.__scannedTo = self.__store.endIndex()
+
+        self.__ensureWorker()
+        self.__jobs.put((self.__generation, self.__version, pattern, self.__store.firstIndex(),
+                         self.__scannedTo, True))
+
+    def clearQuery(self):
+        """Stop searching and clear the index"""
+        self.__generation += 1
+        self.__pattern = None
+        self.__matchingLines = array.array("Q")
+        self.__replaced = {}
+
+    def isActive(self):
+        """Returns True if a query is set"""
+        return self.__pattern is not None
+
+    def linesAppended(self):
+        """Scan the lines appended since the last call. Call on the GUI
+        thread after new lines were written to the store.
+        """
+        end = self.__store.endIndex()
+        if self.__pattern is None or end <= self.__scannedTo:
+            return
+
+        self.__jobs.put((self.__generation, self.__version, self.__pattern, self.__scannedTo, end, False))
+        self.__scannedTo = end
+
+    def lineReplaced(self, index):
+        """Scan a line again after it was replaced in the store
+
+        Arguments:
+        index -- Absolute index of the replaced line
+        """
+        if self.__pattern is None or index >= self.__scannedTo:
+            return
+
+        lines = self.__matchingLines
+        if lines and lines[-1] == index:
+            lines.pop()
+        self.__version += 1
+        self.__replaced[index] = self.__version
+        self.__jobs.put((self.__generation, self.__version, self.__pattern, index, index + 1, False))
+
+    def matchingLines(self):
+        """Returns the sorted absolute indices of matching lines that are
+        still held by the store.
+        """
+        lines = self.__matchingLines
+        evicted = bisect.bisect_left(lines, self.__store.firstIndex())
+        if evicted:
+            del lines[:evicted]
+        return lines
+
+    def __ensureWorker(self):
+        if self.__worker is None:
+            self.__worker = threading.Thread(target=self.__run, name="ConsoleSearch", daemon=True)
+            self.__worker.start()
+
+    def __run(self):
+        """The worker loop. Scans queued ranges of the store slice by slice,
+        until the search is destroyed.
+        """
+        jobs = self.__jobs
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            generation, version, pattern, start, stop, initial = job
+
+            try:
+                while start < stop and generation == self.__generation:
+                    sliceStop = min(stop, start + self.__sliceLines)
+                    matches = self.__scan(pattern, start, sliceStop)
+                    if matches:
+                        self._sliceScanned.emit(generation, version, matches, False, False)
+                    start = sliceStop
+
+                if generation == self.__generation:
+                    self._sliceScanned.emit(generation, version, [], True, initial)
+            except RuntimeError:
+                return  # The search was deleted mid-scan
+
+    def __scan(self, pattern, start, stop):
+        """Find the matches in a range of lines. The lines are joined and
+        searched as one string, which keeps the per-line work in C.
+
+        Returns:
+        list -- (line, start, end) tuples
+        """
+        start = max(start, self.__store.firstIndex())
+        lines = self.__store.lines(start, stop)
+        if not lines:
+            return []
+
+        lineStarts = []
+        position = 0
+        for line in lines:
+            lineStarts.append(position)
+            position += len(line) + 1
+
+        matches = []
+        for match in pattern.finditer("\n".join(lines)):
+            row = bisect.bisect_right(lineStarts, match.start()) - 1
+            lineStart = lineStarts[row]
+            if match.end() > lineStart + len(lines[row]) or match.start() == match.end():
+                continue  # Spans a line break, or is empty
+            matches.append((start + row, match.start() - lineStart, match.end() - lineStart))
+        return matches
+
+    @QtCore.pyqtSlot(int, int, object, bool, bool)
+    def __collect(self, generation, version, matches, done, finished):
+        """Merge matches from the worker into the index, leaving out lines
+        replaced since the scan was sent
+        """
+        if generation != self.__generation:
+            return
+
+        replaced = self.__replaced
+        if replaced:
+            matches = [match for match in matches if replaced.get(match[0], 0) <= version]
+            if done:
+                # Jobs run in order, so no scan sent before this one is still in flight
+                self.__replaced = {line: at for line, at in replaced.items() if at > version}
+
+        lines = self.__matchingLines
+        for line, _, _ in matches:
+            if not lines or line > lines[-1]:
+                lines.append(line)
+            elif line < lines[-1]:
+                position = bisect.bisect_left(lines, line)
+                if position == len(lines) or lines[position] != line:
+                    lines.insert(position, line)
+
+        if matches:
+            self.matchesFound.emit(matches)
+        if finished:
+            self.searchFinished.emit()
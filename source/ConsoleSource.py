@@ -0,0 +1,73 @@
+class ConsoleSource:
+    """A handle for feeding output into a QConsoleOutputWidget. Get one
+    from QConsoleOutputWidget.addSource(). Data fed to it goes through
+    the same line assembly, ANSI parsing and queue as process output,
+    and is tagged with the source's id.
+
+    feed() and close() may be called from any thread.
+
+    Example:
+    S = console.addSource("worker")
+    S.feed(b"progress 10%\\r")
+    S.feed("done\\n")
+    S.close()
+    """
+
+    def __init__(self, name, sourceId, onData, onClosed, encoding):
+        """Constructor for ConsoleSource. Use QConsoleOutputWidget.addSource().
+
+        Arguments:
+        name -- The name of the source
+        sourceId -- The id lines of the source are tagged with
+        onData -- Called with each chunk of bytes fed
+        onClosed -- Called once, when the source is closed
+        encoding -- Used to encode str data
+        """
+        self.__name = name
+        self.__sourceId = sourceId
+        self.__onData = onData
+        self.__onClosed = onClosed
+        self.__encoding = encoding
+        self.__closed = False
+
+    def name(self):
+        """Returns the name of the source"""
+        return self.__name
+
+    def sourceId(self):
+        """Returns the id lines of the source are tagged with"""
+        return self.__sourceId
+
+    def feed(self, data):
+        """Feed output. Lines are split on newlines, and an unterminated
+        line is shown once it has waited for the partial timeout.
+
+        Arguments:
+        data -- str or bytes
+
+        Exceptions:
+        ValueError -- If the source is closed
+        """
+        if self.__closed:
+            raise ValueError(f"Source {self.__name} is closed")
+        if isinstance(data, str):
+            data = data.encode(self.__encoding)
+        if data:
+            self.__onData(data)
+
+    def close(self):
+        """End the source. An unterminated last line is shown as is."""
+        if not self.__closed:
+            self.__closed = True
+            self.__onClosed()
+
+    def isClosed(self):
+        """Returns True once the source has been closed"""
+        return self.__closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
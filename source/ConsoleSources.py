@@ -0,0 +1,301 @@
+"""Adapters that feed QConsoleOutputWidget from sources other than a
+subprocess.Popen. Each one writes to a ConsoleSource from
+QConsoleOutputWidget.addSource(), so all output takes the same path
+into the console.
+
+ConsoleLogHandler -- A logging.Handler that batches formatted records
+ConsoleFileTailer -- Follows a log file as it grows and rotates
+feedFromStream -- Pumps an asyncio.StreamReader into a source
+feedFromAsyncProcess -- Pumps the pipes of an asyncio subprocess
+"""
+import os
+import logging
+import threading
+from PyQt5 import QtCore
+
+
+class ConsoleLogHandler(logging.Handler):
+    """A logging.Handler that shows records in a QConsoleOutputWidget.
+    Records are formatted on the logging thread and collected, and fed
+    to the console as one chunk per flush interval or per maxBatch
+    records, rather than one at a time. Timed flushes are done by one
+    flusher thread per handler, started with the first record and
+    stopped by close().
+
+    Example:
+    handler = ConsoleLogHandler(console.addSource("log"))
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logging.getLogger().addHandler(handler)
+    """
+
+    def __init__(self, source, level=logging.NOTSET, flushInterval=0.05, maxBatch=1000):
+        """Constructor for ConsoleLogHandler
+
+        Arguments:
+        source -- The ConsoleSource to feed
+
+        Keyword Arguments:
+        level -- The handler level (default: logging.NOTSET)
+        flushInterval -- Max seconds a record waits to be fed (default: 0.05)
+        maxBatch -- Records after which a batch is fed at once (default: 1000)
+        """
+        super().__init__(level)
+        self.source = source
+        self.flushInterval = flushInterval
+        self.maxBatch = maxBatch
+        self.__batch = []
+        self.__flusher = None
+        self.__queued = threading.Event()
+        self.__stopped = threading.Event()
+
+    def emit(self, record):
+        """Queue a formatted record. Called with the handler lock held."""
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        self.__batch.append(text)
+        if len(self.__batch) >= self.maxBatch:
+            self.__feedBatch()
+        elif len(self.__batch) == 1:
+            if self.__flusher is None:
+                self.__flusher = threading.Thread(target=self.__runFlusher, name="ConsoleLogHandler",
+                                                  daemon=True)
+                self.__flusher.start()
+            self.__queued.set()
+
+    def flush(self):
+        """Feed the queued records now"""
+        self.acquire()
+        try:
+            self.__feedBatch()
+        finally:
+            self.release()
+
+    def close(self):
+        """Stop the flusher, feed the queued records and close the source"""
+        self.__stopped.set()
+        self.__queued.set()
+        self.flush()
+        self.source.close()
+        super().close()
+
+    def __runFlusher(self):
+        """Feed each batch flushInterval after its first record. Runs on
+        the flusher thread until the handler is closed.
+        """
+        queued, stopped = self.__queued, self.__stopped
+        while True:
+            queued.wait()
+            if stopped.wait(self.flushInterval):
+                return  # close() feeds what is left
+            self.acquire()
+            try:
+                queued.clear()
+                self.__feedBatch()
+            finally:
+                self.release()
+
+    def __feedBatch(self):
+        """Caller holds the handler lock"""
+        if not self.__batch or self.source.isClosed():
+            self.__batch = []
+            return
+
+        text = "\n".join(self.__batch) + "\n"
+        self.__batch = []
+        self.source.feed(text)
+
+
+class ConsoleFileTailer(QtCore.QObject):
+    """Follows a file, such as a daemon's log, and feeds what is appended
+    to a ConsoleSource. By default it starts at the end of the file, so
+    a multi-GB log is never read in full.
+
+    Changes are picked up through a QFileSystemWatcher, with a polling
+    timer as a fallback for file systems that don't report changes.
+    Reads are bounded per event loop iteration, so a burst of output
+    can't stall the GUI. When the file is rotated (renamed or replaced)
+    the rest of the old file is read before the new one is followed from
+    its start, and a truncated file is followed from its start again.
+
+    Signals:
+    rotated -- When the followed file was replaced by a new file
+    """
+
+    rotated = QtCore.pyqtSignal()
+
+    def __init__(self, source, path, fromStart=False, chunkSize=1 << 16, maxChunksPerRead=16,
+                 pollInterval=1000, parent=None):
+        """Constructor for ConsoleFileTailer
+
+        Arguments:
+        source -- The ConsoleSource to feed
+        path -- Path of the file to follow. It may not exist yet.
+
+        Keyword Arguments:
+        fromStart -- Read the existing contents too (default: False)
+        chunkSize -- Bytes read at a time (default: 64 KiB)
+        maxChunksPerRead -- Chunks read before yielding to the event loop (default: 16)
+        pollInterval -- Milliseconds between polls, 0 to only rely on the
+                        watcher (default: 1000)
+        parent -- parent object (default: None)
+
+        Example:
+        T = ConsoleFileTailer(console.addSource("syslog"), "/var/log/syslog")
+        """
+        super().__init__(parent)
+        self.source = source
+        self.path = path
+        self.chunkSize = chunkSize
+        self.maxChunksPerRead = maxChunksPerRead
+
+        self.__file = None
+        self.__identity = None
+        self.__readScheduled = False
+
+        self.__watcher = QtCore.QFileSystemWatcher(self)
+        self.__watcher.fileChanged.connect(self.__scheduleRead)
+        self.__watcher.directoryChanged.connect(self.__scheduleRead)
+        directory = os.path.dirname(os.path.abspath(path))
+        if os.path.isdir(directory):
+            self.__watcher.addPath(directory)
+
+        self.__pollTimer = QtCore.QTimer(self)
+        self.__pollTimer.timeout.connect(self.__scheduleRead)
+        if pollInterval:
+            self.__pollTimer.start(pollInterval)
+
+        self.__open(atEnd=not fromStart)
+
+    def stop(self):
+        """Stop following the file, and close it"""
+        self.__pollTimer.stop()
+        self.__watcher.removePaths(self.__watcher.files() + self.__watcher.directories())
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __open(self, atEnd):
+        """Open the file at path, if it exists, and start watching it"""
+        try:
+            self.__file = open(self.path, "rb")
+        except OSError:
+            self.__file = None
+            self.__identity = None
+            return
+
+        status = os.fstat(self.__file.fileno())
+        self.__identity = (status.st_dev, status.st_ino)
+        if atEnd:
+            self.__file.seek(0, os.SEEK_END)
+        if self.path not in self.__watcher.files():
+            self.__watcher.addPath(self.path)
+
+    @QtCore.pyqtSlot()
+    def __scheduleRead(self):
+        if not self.__readScheduled:
+            self.__readScheduled = True
+            QtCore.QTimer.singleShot(0, self.__read)
+
+    @QtCore.pyqtSlot()
+    def __read(self):
+        """Read up to maxChunksPerRead chunks, check for rotation and
+        truncation, and schedule another read if there is more
+        """
+        self.__readScheduled = False
+        if self.source.isClosed():
+            self.stop()
+            return
+
+        if self.__file is None:
+            self.__open(atEnd=False)
+            if self.__file is None:
+                return
+
+        for _ in range(self.maxChunksPerRead):
+            data = self.__file.read(self.chunkSize)
+            if not data:
+                break
+            self.source.feed(data)
+        else:
+            self.__scheduleRead()  # More to read, after other events
+            return
+
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return  # Rotated away, and the new file doesn't exist yet
+
+        if (status.st_dev, status.st_ino) != self.__identity:
+            # The old file has been read to its end, follow the new one
+            self.__file.close()
+            self.__open(atEnd=False)
+            self.rotated.emit()
+            self.__scheduleRead()
+        elif status.st_size < self.__file.tell():
+            self.__file.seek(0)
+            self.__scheduleRead()
+
+
+async def feedFromStream(source, reader, chunkSize=1 << 16, close=True):
+    """Feed everything read from an asyncio.StreamReader into a source,
+    until the end of the stream
+
+    Arguments:
+    source -- The ConsoleSource to feed
+    reader -- The asyncio.StreamReader
+
+    Keyword Arguments:
+    chunkSize -- Max bytes read at a time (default: 64 KiB)
+    close -- Close the source at the end of the stream (default: True)
+
+    Returns:
+    int -- The number of bytes fed
+
+    Example:
+    process = await asyncio.create_subprocess_exec("make", stdout=asyncio.subprocess.PIPE)
+    await feedFromStream(console.addSource("make"), process.stdout)
+    """
+    total = 0
+    try:
+        while True:
+            data = await reader.read(chunkSize)
+            if not data:
+                return total
+            total += len(data)
+            source.feed(data)
+    finally:
+        if close:
+            source.close()
+
+
+async def feedFromAsyncProcess(console, process, name=None, chunkSize=1 << 16):
+    """Feed the stdout and stderr pipes of an asyncio subprocess into a
+    console, as separate sources, and wait for the process to exit.
+    Call with the console's GUI thread running the asyncio loop, e.g.
+    through qasync, as the sources are added on the calling thread.
+
+    Arguments:
+    console -- The QConsoleOutputWidget
+    process -- An asyncio.subprocess.Process
+
+    Keyword Arguments:
+    name -- Source name prefix (default: the process id)
+    chunkSize -- Max bytes read at a time (default: 64 KiB)
+
+    Returns:
+    int -- The return code of the process
+    """
+    import asyncio
+
+    name = name or str(process.pid)
+    feeds = []
+    if process.stdout is not None:
+        feeds.append(feedFromStream(console.addSource(name), process.stdout, chunkSize))
+    if process.stderr is not None:
+        feeds.append(feedFromStream(console.addSource(f"{name} stderr"), process.stderr, chunkSize))
+    await asyncio.gather(*feeds)
+    return await process.wait()
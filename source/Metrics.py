@@ -0,0 +1,254 @@
+"""Counters, gauges and histograms for instrumenting the widgets.
+
+Each instrumented widget owns a MetricsRegistry, readable in process
+through its metrics() method, or for every live widget at once through
+snapshot(). A MetricsDumper writes snapshots periodically.
+
+Metrics are off by default. Instrumented code checks the module level
+Metrics.enabled flag before measuring, so when disabled a hot path only
+pays for one attribute lookup. Set CWIDGETS_METRICS=1 in the environment,
+or call setEnabled(True), to turn them on.
+
+Example:
+from source import Metrics
+Metrics.setEnabled(True)
+dumper = Metrics.MetricsDumper(5000, "metrics.jsonl")
+...
+print(console.metrics().snapshot())
+"""
+import os
+import sys
+import json
+import math
+import time
+import weakref
+import threading
+import itertools
+import collections
+from PyQt5 import QtCore
+
+enabled = os.environ.get("CWIDGETS_METRICS", "") not in ("", "0")
+
+_registries = weakref.WeakValueDictionary()
+_registryIds = collections.defaultdict(itertools.count)
+_registriesLock = threading.Lock()
+
+
+def setEnabled(on):
+    """Turn metric collection on or off for the whole process"""
+    global enabled
+    enabled = bool(on)
+
+
+def isEnabled():
+    """Returns True if metrics are being collected"""
+    return enabled
+
+
+def snapshot():
+    """Returns a snapshot of every live registry, by registry name"""
+    with _registriesLock:
+        registries = list(_registries.values())
+    return {registry.name(): registry.snapshot() for registry in registries}
+
+
+class Counter:
+    """A count that only goes up, e.g. lines read"""
+
+    __slots__ = ("__lock", "__value")
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__value = 0
+
+    def add(self, amount=1):
+        with self.__lock:
+            self.__value += amount
+
+    def value(self):
+        return self.__value
+
+    def snapshot(self):
+        return self.__value
+
+
+class Gauge:
+    """A value that is set, e.g. a queue depth. Also keeps the highest value set."""
+
+    __slots__ = ("__value", "__peak")
+
+    def __init__(self):
+        self.__value = 0
+        self.__peak = 0
+
+    def set(self, value):
+        self.__value = value
+        if value > self.__peak:
+            self.__peak = value
+
+    def value(self):
+        return self.__value
+
+    def snapshot(self):
+        return {"value": self.__value, "peak": self.__peak}
+
+
+class Histogram:
+    """A distribution of observed values, e.g. durations. Values are
+    counted in power of two buckets, so percentiles are estimates
+    within a factor of two, while count, sum, min and max are exact.
+    """
+
+    __slots__ = ("__lock", "__buckets", "__count", "__sum", "__min", "__max")
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__buckets = collections.Counter()
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = None
+        self.__max = None
+
+    def observe(self, value):
+        bucket = math.frexp(value)[1] if value > 0 else None
+        with self.__lock:
+            self.__buckets[bucket] += 1
+            self.__count += 1
+            self.__sum += value
+            if self.__min is None or value < self.__min:
+                self.__min = value
+            if self.__max is None or value > self.__max:
+                self.__max = value
+
+    def count(self):
+        return self.__count
+
+    def snapshot(self):
+        with self.__lock:
+            buckets = sorted(self.__buckets.items(), key=lambda item: -math.inf if item[0] is None else item[0])
+            count, total, low, high = self.__count, self.__sum, self.__min, self.__max
+
+        result = {"count": count, "sum": total, "min": low, "max": high,
+                  "mean": total / count if count else None}
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            result[name] = self.__percentile(buckets, count, fraction, low, high)
+        return result
+
+    @staticmethod
+    def __percentile(buckets, count, fraction, low, high):
+        """Upper bound of the bucket holding the percentile, clamped to the observed range"""
+        if not count:
+            return None
+        rank = fraction * count
+        seen = 0
+        for bucket, bucketCount in buckets:
+            seen += bucketCount
+            if seen >= rank:
+                bound = 0.0 if bucket is None else math.ldexp(1.0, bucket)
+                return min(max(bound, low), high)
+        return high
+
+
+class MetricsRegistry:
+    """The named metrics of one widget. Metrics are created on first use."""
+
+    def __init__(self, prefix):
+        """Constructor for MetricsRegistry
+
+        Arguments:
+        prefix -- Name of the registry, usually the widget class. A
+                  sequence number is appended to make it unique.
+        """
+        with _registriesLock:
+            self.__name = f"{prefix}.{next(_registryIds[prefix])}"
+            _registries[self.__name] = self
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def name(self):
+        """Returns the unique name of the registry"""
+        return self.__name
+
+    def counter(self, name):
+        """Returns the Counter called name"""
+        return self.__get(name, Counter)
+
+    def gauge(self, name):
+        """Returns the Gauge called name"""
+        return self.__get(name, Gauge)
+
+    def histogram(self, name):
+        """Returns the Histogram called name"""
+        return self.__get(name, Histogram)
+
+    def snapshot(self):
+        """Returns the current values of every metric, by name"""
+        with self.__lock:
+            metrics = list(self.__metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(metrics)}
+
+    def __get(self, name, kind):
+        metric = self.__metrics.get(name)
+        if metric is None:
+            with self.__lock:
+                metric = self.__metrics.setdefault(name, kind())
+        if not isinstance(metric, kind):
+            raise TypeError(f"Metric {name} is a {type(metric).__name__}, not a {kind.__name__}")
+        return metric
+
+
+class MetricsDumper(QtCore.QObject):
+    """Writes a snapshot of every registry as one JSON line at a fixed
+    interval, while metrics are enabled. Counter rates per second since
+    the previous dump are included under "rates".
+    """
+
+    def __init__(self, interval=5000, path=None, parent=None):
+        """Constructor for MetricsDumper
+
+        Keyword Arguments:
+        interval -- Milliseconds between dumps (default: 5000)
+        path -- File to append to, or None for stderr (default: None)
+        parent -- parent object (default: None)
+        """
+        super().__init__(parent)
+        self.__path = path
+        self.__lastCounters = {}
+        self.__lastTime = time.monotonic()
+
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.timeout.connect(self.dump)
+        self.__timer.start(interval)
+
+    @QtCore.pyqtSlot()
+    def dump(self):
+        """Write a snapshot now"""
+        if not enabled:
+            return
+
+        now = time.monotonic()
+        elapsed = now - self.__lastTime
+        self.__lastTime = now
+        metrics = snapshot()
+
+        counters = {}
+        rates = {}
+        for registryName, values in metrics.items():
+            for metricName, value in values.items():
+                if isinstance(value, int):
+                    key = f"{registryName}/{metricName}"
+                    counters[key] = value
+                    if key in self.__lastCounters and elapsed > 0:
+                        rates[key] = (value - self.__lastCounters[key]) / elapsed
+        self.__lastCounters = counters
+
+        line = json.dumps({"time": time.time(), "metrics": metrics, "rates": rates})
+        if self.__path is None:
+            print(line, file=sys.stderr)
+        else:
+            with open(self.__path, "a") as output:
+                output.write(line + "\n")
+
+    def stop(self):
+        """Stop dumping"""
+        self.__timer.stop()
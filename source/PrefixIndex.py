@@ -0,0 +1,103 @@
+import bisect
+
+
+class PrefixIndex:
+    """An immutable index over a list of strings, for type-to-filter
+    lookups on large lists.
+
+    Prefix lookups binary search a sorted copy of the keys. Substring
+    lookups run str.find over all keys joined into one string, which is
+    much faster than testing each key in Python, and a query that
+    refines the previous one only rescans the previous matches.
+
+    Matches are returned as positions in the original list, in order.
+
+    Example:
+    I = PrefixIndex(["alpha", "beta", "alphabet"])
+    I.prefixMatches("alp")  # [0, 2]
+    I.matches("bet")        # [1, 2]
+    """
+
+    def __init__(self, keys, caseSensitive=False):
+        """Constructor for PrefixIndex
+
+        Arguments:
+        keys -- The strings to index
+
+        Keyword Arguments:
+        caseSensitive -- Match case (default: False)
+        """
+        self.__keys = list(keys)
+        self.__caseSensitive = caseSensitive
+        self.__folded = self.__keys if caseSensitive else [key.casefold() for key in self.__keys]
+
+        order = sorted(range(len(self.__folded)), key=self.__folded.__getitem__)
+        self.__sortedKeys = [self.__folded[i] for i in order]
+        self.__sortedIds = order
+
+        # A query without the separator can never match across two keys
+        self.__separator = "\0"
+        self.__joined = self.__separator.join(self.__folded)
+        self.__starts = []
+        offset = 0
+        for key in self.__folded:
+            self.__starts.append(offset)
+            offset += len(key) + 1
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def key(self, i):
+        """Returns the key at position i"""
+        return self.__keys[i]
+
+    def keys(self):
+        """Returns a copy of the keys"""
+        return list(self.__keys)
+
+    def prefixMatches(self, prefix, limit=None):
+        """Returns the positions of the keys starting with prefix
+
+        Keyword Arguments:
+        limit -- Max matches, taken in sorted key order (default: None)
+        """
+        prefix = self.__fold(prefix)
+        if not prefix:
+            return list(range(len(self.__keys)))[:limit]
+
+        low = bisect.bisect_left(self.__sortedKeys, prefix)
+        high = bisect.bisect_left(self.__sortedKeys, prefix + "\U0010ffff", low)
+        if limit is not None:
+            high = min(high, low + limit)
+        return sorted(self.__sortedIds[low:high])
+
+    def matches(self, text, within=None):
+        """Returns the positions of the keys containing text
+
+        Keyword Arguments:
+        within -- Positions to search in, e.g. the matches of a shorter
+                  query that text contains (default: None, all keys)
+        """
+        text = self.__fold(text)
+        if not text:
+            return list(range(len(self.__keys))) if within is None else list(within)
+        if self.__separator in text:
+            return []
+
+        if within is not None:
+            folded = self.__folded
+            return [i for i in within if text in folded[i]]
+
+        result = []
+        joined = self.__joined
+        starts = self.__starts
+        position = joined.find(text)
+        while position != -1:
+            i = bisect.bisect_right(starts, position) - 1
+            result.append(i)
+            # Continue after this key, so each key is reported once
+            position = joined.find(text, starts[i + 1] if i + 1 < len(starts) else len(joined))
+        return result
+
+    def __fold(self, text):
+        return text if self.__caseSensitive else text.casefold()
@@ -0,0 +1,123 @@
+import weakref
+import itertools
+import threading
+
+
+class _ThreadToken:
+    """Lives in a thread's local storage, so it is freed when the thread ends"""
+    __slots__ = ("__weakref__",)
+
+
+def _retireCell(lock, cells, retired, cell):
+    """Fold the cell of a finished thread into the retired count"""
+    with lock:
+        retired[0] += cell[0]
+        cells.remove(cell)
+
+
+class ProgressChannel:
+    """A cheap, thread safe progress counter that worker threads write
+    to and a dialog samples on a timer.
+
+    advance() adds to a counter cell owned by the calling thread, so no
+    lock is taken and threads never contend. setDone() stores an
+    absolute count, and setPercent() stores a percentage that is only
+    converted when the channel is read. Reading sums the cells, which is
+    only done at the UI refresh rate. The cell of a thread that has
+    ended is folded into a single count, so threads coming and going in
+    a pool don't make the channel grow.
+
+    Example:
+    C = ProgressChannel(total=len(files))
+    for f in files:      # on any number of threads
+        process(f)
+        C.advance()
+    """
+
+    def __init__(self, total=100):
+        """Constructor for ProgressChannel
+
+        Keyword Arguments:
+        total -- The count at which the work is complete (default: 100)
+        """
+        self.__total = total
+        self.__base = 0
+        self.__cells = []
+        self.__retired = [0]
+        self.__cellsLock = threading.Lock()
+        self.__local = threading.local()
+        self.__percent = None
+        self.__writes = itertools.count(1)  # next() is atomic, so threads can share it
+        self.__percentWrite = 0
+        self.__foldedWrite = 0
+
+    def advance(self, amount=1):
+        """Add to the done count. Safe to call from any thread."""
+        try:
+            self.__local.cell[0] += amount
+        except AttributeError:
+            cell = [amount]
+            with self.__cellsLock:
+                self.__cells.append(cell)
+            token = _ThreadToken()
+            weakref.finalize(token, _retireCell, self.__cellsLock, self.__cells, self.__retired, cell)
+            self.__local.token = token
+            self.__local.cell = cell
+
+    def setDone(self, done):
+        """Set the done count to an absolute value. When several threads
+        set it, the last write wins.
+        """
+        self.__base = done - self.__cellSum()
+
+    def setPercent(self, percent):
+        """Set the done count to a percentage of the total, clamped to
+        0 - 100. Only stores the value, it is converted when read, so this
+        is as cheap as advance(). Safe to call from any thread.
+        """
+        self.__percent = percent
+        self.__percentWrite = next(self.__writes)  # Written last, so done() never misses the value
+
+    def done(self):
+        """Returns the done count"""
+        write = self.__percentWrite
+        if write != self.__foldedWrite:
+            self.__foldedWrite = write
+            self.setDone(min(100, max(0, self.__percent)) * self.__total / 100)
+        return self.__base + self.__cellSum()
+
+    def setTotal(self, total):
+        """Set the count at which the work is complete"""
+        self.__total = total
+
+    def total(self):
+        """Returns the count at which the work is complete"""
+        return self.__total
+
+    def fraction(self):
+        """Returns the done count as a fraction of the total, from 0 to 1"""
+        total = self.__total
+        if total <= 0:
+            return 0.0
+        return min(1.0, max(0.0, self.done() / total))
+
+    def reset(self, total=None):
+        """Set the done count back to 0, and optionally change the total.
+        Don't call while other threads are advancing.
+        """
+        with self.__cellsLock:
+            for cell in self.__cells:
+                cell[0] = 0
+            self.__retired[0] = 0
+        self.__base = 0
+        self.__percent = None
+        self.__foldedWrite = self.__percentWrite
+        if total is not None:
+            self.__total = total
+
+    def __cellSum(self):
+        with self.__cellsLock:
+            total = self.__retired[0]
+            for cell in self.__cells:
+                total += cell[0]
+        return total
@@ -1,9 +1,82 @@
+import math
 import time
-import threading
+import weakref
 from PyQt5 import QtCore
 from PyQt5 import QtWidgets
 
 
+class _UnlockCountdown(QtCore.QObject):
+    """Runs the lock countdown of every locked QAlarmLockWidget on the
+    GUI thread, with a single one-shot timer. The timer is armed for the
+    next moment any alarm's remaining whole seconds change, so each
+    countdown updates exactly on its second boundaries, and several
+    open alarms cost no more than one.
+    """
+
+    _instance = None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.__deadlines = {}
+        self.__watched = weakref.WeakSet()
+
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.__timer.timeout.connect(self.__update)
+
+    @classmethod
+    def instance(cls):
+        """Returns the shared countdown. Call on the GUI thread."""
+        if cls._instance is None:
+            cls._instance = cls(QtCore.QCoreApplication.instance())
+        return cls._instance
+
+    def add(self, widget, deadline):
+        """Count down a widget until a time.monotonic() deadline"""
+        self.__deadlines[widget] = deadline
+        if widget not in self.__watched:
+            # Pooled widgets are counted down many times, but connected once
+            self.__watched.add(widget)
+            widget.destroyed.connect(lambda _=None, w=widget: self.remove(w))
+        self.__update()
+
+    def remove(self, widget):
+        """Stop counting down a widget"""
+        self.__deadlines.pop(widget, None)
+
+    @QtCore.pyqtSlot()
+    def __update(self):
+        """Update every countdown, unlock the finished ones, and arm the
+        timer for the next change
+        """
+        now = time.monotonic()
+        nextChange = None
+
+        for widget, deadline in list(self.__deadlines.items()):
+            remaining = deadline - now
+            try:
+                if remaining <= 0:
+                    del self.__deadlines[widget]
+                    widget._unlock()
+                    continue
+                seconds = math.ceil(remaining)
+                widget._showCountdown(seconds)
+            except RuntimeError:
+                # The widget was deleted on the C++ side
+                self.__deadlines.pop(widget, None)
+                continue
+
+            change = deadline - (seconds - 1)
+            if nextChange is None or change < nextChange:
+                nextChange = change
+
+        if nextChange is None:
+            self.__timer.stop()
+        else:
+            self.__timer.start(max(0, math.ceil((nextChange - now) * 1000)))
+
+
 class QAlarmLockWidget(QtWidgets.QWidget):
     """The QAlarmLockWidget is a widget that pops up on your screen
     and (potentially) soft-locks it for a given amount of time with
@@ -12,12 +85,24 @@ class QAlarmLockWidget(QtWidgets.QWidget):
     computer. Hence why it can soft-lock your workstation for a given
     amount of time.
 
+    The lock countdown runs on the GUI event loop, shared by every open
+    alarm, and uses a monotonic clock, so changing the system time does
+    not shorten or extend the lock.
+
+    The screen geometry is looked up once and shared by every alarm
+    until the screens change. reset() readies an alarm to be shown
+    again with a new message and lock, see WidgetPool.
+
     Signals:
     alarmUnlocked -- Triggered when a locked AlarmLockWidget unlocks
     """
 
     alarmUnlocked = QtCore.pyqtSignal()
 
+    # Shared screen geometry, cleared when the screens change
+    _screenGeometry = None
+    _screensWatched = False
+
     def __init__(self, parent=None, message="Alarm", locks=False, lockTime=5):
         """Constructor for QAlarmLockWidget
 
@@ -33,38 +118,72 @@ class QAlarmLockWidget(QtWidgets.QWidget):
         A.alarmUnlocked.connect(A.close) # Auto Close
         """
         super().__init__(parent)
-        self.__initUI(message, locks)
+        self.__initUI()
+        self.reset(message, locks, lockTime)
 
-        if locks:
-            self.unlockTime = time.time() + int(lockTime)
-            self.unlockThread = threading.Thread(target=self.__checkForUnlock)
-            self.unlockThread.start()
+    @staticmethod
+    def __screenSize():
+        """Returns the cached geometry of the screen, looked up again
+        once the screens are resized, added or removed
+        """
+        if QAlarmLockWidget._screenGeometry is None:
+            desktop = QtWidgets.QApplication.desktop()
+            QAlarmLockWidget._screenGeometry = desktop.screenGeometry()
+            if not QAlarmLockWidget._screensWatched:
+                QAlarmLockWidget._screensWatched = True
+                desktop.resized.connect(QAlarmLockWidget.__screensChanged)
+                desktop.screenCountChanged.connect(QAlarmLockWidget.__screensChanged)
+        return QAlarmLockWidget._screenGeometry
+
+    @staticmethod
+    def __screensChanged(*_):
+        QAlarmLockWidget._screenGeometry = None
+
+    def reset(self, message="Alarm", locks=False, lockTime=5):
+        """Set the message and lock of the alarm, as if it were new, so it
+        can be reused rather than rebuilt. A running countdown is stopped.
+        Connections to alarmUnlocked are kept, see WidgetPool.connect().
 
-    def __initUI(self, message, isLocked):
-        """Initializes the UI
+        Keyword Arguments:
+        message (str) -- The message to display (default: "Alarm")
+        locks -- true if alarm should lock the screen (default: False)
+        lockTime (int) -- seconds screen should be locked (default: 5)
 
-        Arguments:
-        message -- The message passed from the constructor. Used to
-                   initialize the alarm message.
-        isLocked -- Used to make the close button locked or unlocked
-                    by default
+        Example:
+        A.reset("Stand up", locks=True, lockTime=30)
         """
+        countdown = _UnlockCountdown.instance()
+        countdown.remove(self)
+
+        # Only touch what changed, so reusing an alarm doesn't lay it out again
+        size = self.__screenSize()
+        geometry = QtCore.QRect(0, 0, size.width(), size.height())
+        if self.geometry() != geometry:
+            self.setGeometry(geometry)
+        if self._alarmMessage.text() != message:
+            self._alarmMessage.setText(message)
+        if self._closeButton.text() != "CLOSE":
+            self._closeButton.setText("CLOSE")
+        if self._closeButton.isEnabled() == locks:
+            self._closeButton.setEnabled(not locks)
 
-        # Make it fullscreen
-        size = QtWidgets.QApplication.desktop().screenGeometry()
+        if locks:
+            self.unlockTime = time.time() + int(lockTime)
+            countdown.add(self, time.monotonic() + int(lockTime))
+
+    def __initUI(self):
+        """Initializes the UI. The message, lock and fullscreen geometry
+        are set by reset().
+        """
         self.setWindowFlags(QtCore.Qt.FramelessWindowHint)
-        self.setGeometry(0, 0, size.width(), size.height())
 
         self.setStyleSheet("background-color: #FF0000;")
 
         # Setup widgets
         self._alarmMessage = QtWidgets.QLabel(self)
         self._alarmMessage.setStyleSheet("font-size: 72px;")
-        self._alarmMessage.setText(message)
 
         self._closeButton = QtWidgets.QPushButton("CLOSE")
-        if isLocked:
-            self._closeButton.setEnabled(False)
         self._closeButton.clicked.connect(self.close)
         self._closeButton.setStyleSheet("background-color: #FFF; font-size: 20px;")
 
@@ -80,14 +199,16 @@ class QAlarmLockWidget(QtWidgets.QWidget):
 
         self.setLayout(self._vLayout)
 
-    def __checkForUnlock(self):
-        """A check run by the unlock thread if the widget should be locked.
-        Will update the close button text, and re-enable it after the given
-        unlock time. Don't call manually.
+    def _showCountdown(self, seconds):
+        """Show the seconds left until unlock on the close button. Called
+        by the shared countdown. Don't call manually.
+        """
+        self._closeButton.setText(f"UNLOCK IN {seconds}s...")
+
+    def _unlock(self):
+        """Re-enable the close button and emit alarmUnlocked. Called by
+        the shared countdown once the lock time is over. Don't call manually.
         """
-        while time.time() < self.unlockTime:
-            self._closeButton.setText(f"UNLOCK IN {self.unlockTime - time.time():0.0f}s...")
-            time.sleep(1)
         self._closeButton.setText("CLOSE")
         self._closeButton.setEnabled(True)
         self.alarmUnlocked.emit()
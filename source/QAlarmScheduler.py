@@ -0,0 +1,228 @@
+import time
+import heapq
+import datetime
+import itertools
+from PyQt5 import QtCore
+from .QAlarmLockWidget import QAlarmLockWidget
+
+
+class _Alarm:
+    """A scheduled alarm. version is bumped whenever the alarm is
+    rescheduled, which turns its old heap entry stale.
+    """
+
+    __slots__ = ("alarmId", "deadline", "repeat", "message", "locks", "lockTime", "version")
+
+    def __init__(self, alarmId, deadline, repeat, message, locks, lockTime):
+        self.alarmId = alarmId
+        self.deadline = deadline
+        self.repeat = repeat
+        self.message = message
+        self.locks = locks
+        self.lockTime = lockTime
+        self.version = 0
+
+
+class QAlarmScheduler(QtCore.QObject):
+    """Schedules one-shot and recurring alarms, and shows a
+    QAlarmLockWidget when an alarm goes off.
+
+    Pending alarms are kept in a binary heap ordered by deadline, and
+    only the nearest deadline is armed, on a single one-shot timer.
+    Scheduling is O(log n). Cancelling marks the heap entry stale rather
+    than searching for it, and stale entries are dropped when they reach
+    the top or when they make up most of the heap.
+
+    Signals:
+    alarmFired -- The id of an alarm that went off
+    """
+
+    alarmFired = QtCore.pyqtSignal(int)
+
+    # QTimer intervals are 32 bit milliseconds, so far deadlines are armed in steps
+    _MAX_INTERVAL_MS = 2 ** 31 - 1
+
+    def __init__(self, parent=None):
+        """Constructor for QAlarmScheduler
+
+        Keyword Arguments:
+        parent -- parent object (default: None)
+
+        Example:
+        S = QAlarmScheduler()
+        S.scheduleIn(25 * 60, "Take a break", locks=True, lockTime=300)
+        S.scheduleAt(datetime.datetime(2030, 1, 1, 9), "Standup", repeat=datetime.timedelta(days=1))
+        """
+        super().__init__(parent)
+        self.__heap = []
+        self.__alarms = {}
+        self.__staleEntries = 0
+        self.__ids = itertools.count(1)
+        self.__sequence = itertools.count()
+        self.__openWidgets = set()
+
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.timeout.connect(self.__fireDue)
+
+    def scheduleAt(self, when, message="Alarm", locks=False, lockTime=5, repeat=None):
+        """Schedule an alarm at a point in time
+
+        Arguments:
+        when -- A datetime, or a time.time() timestamp
+
+        Keyword Arguments:
+        message (str) -- The message shown by the alarm (default: "Alarm")
+        locks -- True if the alarm should lock the screen (default: False)
+        lockTime (int) -- Seconds the screen is locked (default: 5)
+        repeat -- Seconds or timedelta between recurrences, None for a
+                  one-shot alarm (default: None)
+
+        Returns:
+        int -- The id of the alarm
+
+        Exceptions:
+        ValueError -- If repeat is not positive
+
+        Example:
+        alarmId = scheduleAt(datetime.datetime(2030, 1, 1, 12), "Lunch")
+        """
+        repeat = self.__toSeconds(repeat)
+        if repeat is not None and repeat <= 0:
+            raise ValueError("repeat must be positive")
+
+        alarm = _Alarm(next(self.__ids), self.__toTimestamp(when), repeat, message, locks, lockTime)
+        self.__alarms[alarm.alarmId] = alarm
+        self.__push(alarm)
+        return alarm.alarmId
+
+    def scheduleIn(self, seconds, message="Alarm", locks=False, lockTime=5, repeat=None):
+        """Schedule an alarm a number of seconds from now. See scheduleAt()."""
+        return self.scheduleAt(time.time() + self.__toSeconds(seconds), message, locks, lockTime, repeat)
+
+    def cancel(self, alarmId):
+        """Cancel a pending alarm
+
+        Returns:
+        bool -- False if no such alarm is pending
+        """
+        if self.__alarms.pop(alarmId, None) is None:
+            return False
+
+        self.__staleEntries += 1
+        self.__compact()
+        self.__arm()
+        return True
+
+    def reschedule(self, alarmId, when):
+        """Move a pending alarm to a new point in time
+
+        Arguments:
+        alarmId -- The id returned when the alarm was scheduled
+        when -- A datetime, or a time.time() timestamp
+
+        Returns:
+        bool -- False if no such alarm is pending
+        """
+        alarm = self.__alarms.get(alarmId)
+        if alarm is None:
+            return False
+
+        alarm.version += 1
+        alarm.deadline = self.__toTimestamp(when)
+        self.__staleEntries += 1
+        self.__push(alarm)
+        self.__compact()
+        return True
+
+    def deadline(self, alarmId):
+        """Returns the time.time() timestamp an alarm goes off at next,
+        or None if no such alarm is pending
+        """
+        alarm = self.__alarms.get(alarmId)
+        return alarm.deadline if alarm is not None else None
+
+    def pendingCount(self):
+        """Returns the number of pending alarms"""
+        return len(self.__alarms)
+
+    def nextDeadline(self):
+        """Returns the time.time() timestamp of the nearest alarm, or None"""
+        self.__dropStaleTop()
+        return self.__heap[0][0] if self.__heap else None
+
+    def __push(self, alarm):
+        heapq.heappush(self.__heap, (alarm.deadline, next(self.__sequence), alarm.alarmId, alarm.version))
+        self.__arm()
+
+    def __isStale(self, entry):
+        alarm = self.__alarms.get(entry[2])
+        return alarm is None or alarm.version != entry[3]
+
+    def __dropStaleTop(self):
+        heap = self.__heap
+        while heap and self.__isStale(heap[0]):
+            heapq.heappop(heap)
+            self.__staleEntries -= 1
+
+    def __compact(self):
+        """Rebuild the heap without stale entries once they dominate it"""
+        if self.__staleEntries > 64 and self.__staleEntries * 2 > len(self.__heap):
+            self.__heap = [entry for entry in self.__heap if not self.__isStale(entry)]
+            heapq.heapify(self.__heap)
+            self.__staleEntries = 0
+
+    def __arm(self):
+        """Arm the timer for the nearest deadline, or stop it"""
+        self.__dropStaleTop()
+        if not self.__heap:
+            self.__timer.stop()
+            return
+
+        msLeft = max(0, int((self.__heap[0][0] - time.time()) * 1000) + 1)
+        self.__timer.start(min(msLeft, self._MAX_INTERVAL_MS))
+
+    @QtCore.pyqtSlot()
+    def __fireDue(self):
+        """Fire every alarm whose deadline has passed, and re-arm"""
+        now = time.time()
+        heap = self.__heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if self.__isStale(entry):
+                self.__staleEntries -= 1
+                continue
+
+            alarm = self.__alarms[entry[2]]
+            if alarm.repeat is None:
+                del self.__alarms[alarm.alarmId]
+            else:
+                # Skip recurrences that were missed, e.g. while suspended
+                while alarm.deadline <= now:
+                    alarm.deadline += alarm.repeat
+                heapq.heappush(heap, (alarm.deadline, next(self.__sequence), alarm.alarmId, alarm.version))
+
+            self.__showAlarm(alarm)
+            self.alarmFired.emit(alarm.alarmId)
+
+        self.__arm()
+
+    def __showAlarm(self, alarm):
+        """Open the lock widget of an alarm, keeping it alive until closed"""
+        widget = QAlarmLockWidget(message=alarm.message, locks=alarm.locks, lockTime=alarm.lockTime)
+        widget.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.__openWidgets.add(widget)
+        widget.destroyed.connect(lambda _=None, w=widget: self.__openWidgets.discard(w))
+        widget.show()
+
+    @staticmethod
+    def __toTimestamp(when):
+        if isinstance(when, datetime.datetime):
+            return when.timestamp()
+        return float(when)
+
+    @staticmethod
+    def __toSeconds(duration):
+        if isinstance(duration, datetime.timedelta):
+            return duration.total_seconds()
+        return duration
@@ -1,16 +1,27 @@
-import sys, subprocess
-import Resources
+from . import Resources
+from PyQt5 import QtCore
 from PyQt5 import QtGui
 from PyQt5 import QtWidgets
-from QConsoleOutputWidget import QConsoleOutputWidget
+from .ConsoleInputWriter import ConsoleInputWriter
+from .ConsoleHistory import ConsoleHistory
 
 
 class QConsoleInputWidget(QtWidgets.QWidget):
     """The QConsoleInputWidget allows you to send console input
     to a running subprocess.Popen() object through stdin.
+
+    Input is written by a ConsoleInputWriter on a background thread, so
+    a child that stops reading never freezes the window. While the
+    writer's queue is full the submit button is disabled.
+
+    Sent commands are kept in a ConsoleHistory, which can be saved to a
+    history file. Up and Down step through the commands starting with
+    what was typed, and Ctrl+R searches back through the commands
+    containing the search text, pressing it again for older matches.
     """
 
-    def __init__(self, process, parent=None):
+    def __init__(self, process, parent=None, lineTerminator="\n", flushPolicy="line",
+                 maxQueuedBytes=1 << 20, history=None, historySize=10000):
         """Constructor for QConsoleInputWidget
 
         Arguments:
@@ -18,15 +29,35 @@ class QConsoleInputWidget(QtWidgets.QWidget):
 
         Keyword Arguments:
         parent -- parent widget for this widget (default: None)
+        lineTerminator -- Appended to every submitted line (default: "\n")
+        flushPolicy -- "always", "line" or "manual", see ConsoleInputWriter (default: "line")
+        maxQueuedBytes -- Max bytes waiting to be written (default: 1 MiB)
+        history -- A ConsoleHistory, or the path of a history file. None to
+                   only keep the history while the widget lives (default: None)
+        historySize -- Max commands kept, when history is not a
+                       ConsoleHistory (default: 10000)
 
         Example:
-        QConsoleInputWidget()
+        QConsoleInputWidget(process)
+        QConsoleInputWidget(process, lineTerminator="\r\n")
+        QConsoleInputWidget(process, history="~/.python_history.jsonl")
         """
         super().__init__(parent)
-        QtGui.QFontDatabase().addApplicationFont(Resources.monspaceFont)
+        Resources.loadFont(Resources.monspaceFont)
         self.__initUI()
         self.process = process
 
+        if not isinstance(history, ConsoleHistory):
+            history = ConsoleHistory(history, historySize)
+        self.__history = history
+        self.__history.preload()
+        self.__historyPosition = None
+        self.__draft = ""
+        self.__searchPosition = None
+
+        self.writer = ConsoleInputWriter(process, self, lineTerminator, flushPolicy, maxQueuedBytes)
+        self.writer.backpressureChanged.connect(self.__backpressureChanged)
+
     def __initUI(self):
         """Initialize the UI"""
         self.setWindowTitle("Console Input")
@@ -35,16 +66,28 @@ class QConsoleInputWidget(QtWidgets.QWidget):
         self._inputField.setFont(QtGui.QFont("Ubuntu Mono"))
         self._submitButton = QtWidgets.QPushButton("Submit", self)
 
+        self._searchLabel = QtWidgets.QLabel("reverse-i-search:", self)
+        self._searchField = QtWidgets.QLineEdit(self)
+        self._searchField.setMaximumWidth(200)
+        self._searchLabel.hide()
+        self._searchField.hide()
+
         self._layout = QtWidgets.QHBoxLayout()
+        self._layout.addWidget(self._searchLabel)
+        self._layout.addWidget(self._searchField)
         self._layout.addWidget(self._inputField)
         self._layout.addWidget(self._submitButton)
 
         self.setLayout(self._layout)
 
-        with open(Resources.consoleStyle, "r") as CSS:
-            self._inputField.setStyleSheet(CSS.read())
+        self._inputField.setStyleSheet(Resources.styleSheet(Resources.consoleStyle))
 
         self._submitButton.clicked.connect(self.sendInputToProcess)
+        self._inputField.returnPressed.connect(self.sendInputToProcess)
+        self._inputField.textEdited.connect(self.__inputEdited)
+        self._inputField.installEventFilter(self)
+        self._searchField.textEdited.connect(self.__searchEdited)
+        self._searchField.installEventFilter(self)
 
     def clearInputData(self):
         """Clear the input field, wiping all text from it"""
@@ -62,26 +105,142 @@ class QConsoleInputWidget(QtWidgets.QWidget):
         return self._inputField.text()
 
     def send(self, data):
-        """Send data to the stdin of the attached process
+        """Send data to the stdin of the attached process, as is
+
+        Arguments:
+        data -- The str or bytes to send through stdin
+
+        Returns:
+        bool -- False if the data was refused because the queue is full
+        """
+        return self.writer.write(data)
+
+    def sendLines(self, lines):
+        """Send several lines at once, each followed by the line
+        terminator. Useful for pastes and scripted input.
 
         Arguments:
-        data -- The data to send through stdin
+        lines -- Iterable of str or bytes lines
+
+        Returns:
+        bool -- False if the lines were refused because the queue is full
+
+        Example:
+        sendLines(["import os", "print(os.getcwd())"])
         """
-        try:
-            self.process.stdin.write(data.encode())
-        except:
-            self.process.stdin.write(data)
+        return self.writer.writeLines(lines)
+
+    def flush(self):
+        """Flush stdin once everything sent so far has been written"""
+        self.writer.flush()
 
     def sendInputToProcess(self):
-        """Gets the input text, clears the field, and then sends the
-        data to the attached process.
+        """Gets the input text, and sends it to the attached process as
+        a line. The field is only cleared if the input was accepted.
         """
         data = self.getInputData()
-        self.clearInputData()
-        self.send(data)
+        if self.writer.writeLine(data):
+            self.__history.add(data)
+            self.__historyPosition = None
+            self.clearInputData()
+
+    def history(self):
+        """Returns the ConsoleHistory of sent commands"""
+        return self.__history
+
+    def eventFilter(self, watched, event):
+        """History keys of the input field and the search field"""
+        if event.type() != QtCore.QEvent.KeyPress:
+            return super().eventFilter(watched, event)
+
+        key = event.key()
+        searchKey = key == QtCore.Qt.Key_R and event.modifiers() & QtCore.Qt.ControlModifier
+        if watched is self._inputField:
+            if key in (QtCore.Qt.Key_Up, QtCore.Qt.Key_Down):
+                self.__stepHistory(key == QtCore.Qt.Key_Up)
+                return True
+            if searchKey:
+                self.__startSearch()
+                return True
+        elif watched is self._searchField:
+            if searchKey:
+                self.__search(self.__searchPosition)
+                return True
+            if key in (QtCore.Qt.Key_Return, QtCore.Qt.Key_Enter):
+                self.__endSearch(True)
+                return True
+            if key == QtCore.Qt.Key_Escape:
+                self.__endSearch(False)
+                return True
+        return super().eventFilter(watched, event)
+
+    def __stepHistory(self, backward):
+        """Show the previous or next command starting with the text that
+        was typed before stepping into the history
+        """
+        if self.__historyPosition is None:
+            if not backward:
+                return
+            self.__draft = self._inputField.text()
+
+        position = self.__history.find(self.__draft, self.__historyPosition, backward, prefix=True)
+        if position is None:
+            if not backward:
+                self.__historyPosition = None
+                self._inputField.setText(self.__draft)
+            return
+        self.__historyPosition = position
+        self._inputField.setText(self.__history.entry(position))
+
+    @QtCore.pyqtSlot(str)
+    def __inputEdited(self, text):
+        self.__historyPosition = None
+
+    def __startSearch(self):
+        self.__draft = self._inputField.text()
+        self.__searchPosition = None
+        self._searchLabel.setText("reverse-i-search:")
+        self._searchLabel.show()
+        self._searchField.show()
+        self._searchField.setFocus()
+        self._searchField.selectAll()
+
+    @QtCore.pyqtSlot(str)
+    def __searchEdited(self, text):
+        self.__search(None)
+
+    def __search(self, start):
+        """Show the newest command before start containing the search text"""
+        position = self.__history.find(self._searchField.text(), start)
+        if position is None:
+            self._searchLabel.setText("failing reverse-i-search:")
+            return
+        self._searchLabel.setText("reverse-i-search:")
+        self.__searchPosition = position
+        self._inputField.setText(self.__history.entry(position))
+
+    def __endSearch(self, accept):
+        """Hide the search field, keeping the match or restoring the input"""
+        if not accept:
+            self._inputField.setText(self.__draft)
+        self.__historyPosition = None
+        self._searchField.clear()
+        self._searchLabel.hide()
+        self._searchField.hide()
+        self._inputField.setFocus()
+
+    @QtCore.pyqtSlot(bool)
+    def __backpressureChanged(self, active):
+        """Block submitting while the child is not keeping up"""
+        self._submitButton.setEnabled(not active)
 
 
 if __name__ == '__main__':
+    # Run from the repository root with: python -m source.QConsoleInputWidget
+    import sys
+    import subprocess
+    from .QConsoleOutputWidget import QConsoleOutputWidget
+
     app = QtWidgets.QApplication(sys.argv)
 
     p = subprocess.Popen(["python"], stdout=subprocess.PIPE, stdin=subprocess.PIPE, universal_newlines=True)
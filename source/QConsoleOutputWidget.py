@@ -1,6 +1,23 @@
+import re
+import time
+import heapq
+import array
+import bisect
+import locale
 import threading
 import subprocess
-import Resources
+import collections
+from . import Metrics
+from . import Resources
+from .ConsoleLineStore import ConsoleLineStore
+from .ConsoleLineAssembler import ConsoleLineAssembler
+from .ConsoleAnsiParser import ConsoleAnsiParser, ConsoleTextFormats
+from .ConsoleSearch import ConsoleSearch
+from .ConsoleDiskLog import ConsoleDiskLog
+from .ConsoleProcessReader import ConsoleProcessReader
+from .ConsoleSource import ConsoleSource
+from .ConsoleRecording import ConsoleRecorder
+from .QConsoleViewport import QConsoleViewport
 from PyQt5 import QtCore
 from PyQt5 import QtGui
 from PyQt5 import QtWidgets
@@ -11,91 +28,431 @@ class QConsoleOutputWidget(QtWidgets.QWidget):
     stdout / stderr, by showing it in a QtWidget instead
     of your regular console. It is designed for
     subprocess.Popen objects.
+
+    Process output is read by the shared ConsoleProcessReader, which
+    multiplexes the pipes of every attached process on one thread, and
+    is split into lines by a ConsoleLineAssembler per stream. Carriage
+    returns overwrite the current line in place, so progress bars stay
+    on a single line. ANSI colour codes are parsed into interned text
+    formats rather than shown raw.
+
+    Lines are pushed onto a queue which the GUI thread drains. In
+    batched mode it is drained on a fixed cadence, inserting each batch
+    as a single edit, otherwise as soon as lines arrive.
+
+    Output is kept in a ConsoleLineStore, which can be capped by line
+    count or size, and shown through a QConsoleViewport that only lays
+    out the lines currently on screen.
+
+    Every stdout and stderr stream is a separate source, and each line
+    is tagged with its source id and the time the chunk completing it
+    was read, stamped on the reader thread. The default view merges
+    every source in timestamp order, as queued lines are k-way merged on
+    their timestamps before they are stored. In batched mode lines newer
+    than mergeWindow seconds are held back to the next flush, so lines
+    read close together are merged even when they are queued in
+    different batches. setSourceView() shows the lines of one source,
+    through the store's per-source index rather than a copy of the lines.
+
+    Output that doesn't come from a subprocess.Popen, such as logging
+    records, tailed files or asyncio streams, is fed through a
+    ConsoleSource from addSource(). See ConsoleSources for adapters.
+
+    startRecording() records every chunk of output as it arrives, with
+    its source and time, and ConsoleRecording.ConsoleReplay plays a
+    recording back into a console, for load tests and bug reports.
+
+    The output can be searched with plain or regex queries on a
+    background thread, and filtered down to the matching lines. The
+    filter stays live as new output arrives. Press Ctrl+F to show the
+    filter bar.
+
+    For long sessions the output can also be written to an on-disk log
+    with setDiskLog(). Only the most recent lines are then kept in
+    memory, and older lines are paged in from the log when scrolled to
+    or searched. Sessions can be exported and reopened later. The log
+    doesn't record sources, so the view of one source only covers the
+    lines still in memory, from sourceViewFirstIndex() on.
+
+    When Metrics are enabled, metrics() counts the lines and bytes read
+    per process, and times the queue, flushes, painting and printToConsole.
+
+    Signals:
+    readStdout -- Emit with a string to print it to the console
+    searchMatches -- List of (line, start, end) matches, as they are found
     """
     readStdout = QtCore.pyqtSignal(str)
+    searchMatches = QtCore.pyqtSignal(object)
+    _linesQueued = QtCore.pyqtSignal()
 
-    def __init__(self, parent=None, title="Console Output"):
+    def __init__(self, parent=None, title="Console Output", batched=False,
+                 flushRate=30, maxLinesPerFlush=1000, maxLines=None, maxBytes=None):
         """Constructor for QConsoleOutputWidget.
 
         Keyword Arguments:
         parent -- parent widget for this widget (default: None)
         title -- Title for the window (default: "Console Output")
+        batched -- Queue lines and print them in batches (default: False)
+        flushRate -- Batch flushes per second in batched mode (default: 30)
+        maxLinesPerFlush -- Max lines inserted per flush (default: 1000)
+        maxLines -- Scrollback line cap, None for no limit (default: None)
+        maxBytes -- Scrollback size cap in bytes, None for no limit (default: None)
 
         Example:
         QConsoleOutputWidget()
         QConsoleOutputWidget(title="Program Output")
+        QConsoleOutputWidget(batched=True, flushRate=60)
+        QConsoleOutputWidget(maxLines=1000000, maxBytes=256 * 1024 * 1024)
         """
         super().__init__(parent)
         self.setWindowTitle(str(title))
         self.setGeometry(800, 400, 600, 200)
 
-        QtGui.QFontDatabase().addApplicationFont(Resources.monspaceFont)
+        Resources.loadFont(Resources.monspaceFont)
 
         self.messageQueue = []
         self.__processes = []
-        self.__processThreads = []
+        self.__assemblers = []
+        self.__provisionalLines = {}
         self.__printLock = threading.Lock()
 
+        # deque.append / popleft are atomic, so reader threads can push
+        # without taking a lock
+        self.__pendingLines = collections.deque()
+        self.__heldLines = []
+        self.__flushScheduled = False
+        self.__batched = False
+        self.__maxLinesPerFlush = 1000
+        self.__mergeWindow = 0.05
+        self.__scrollback = ConsoleLineStore(maxLines, maxBytes)
+        self.__formats = ConsoleTextFormats()
+        self.__printParser = ConsoleAnsiParser()
+        self.__search = ConsoleSearch(self.__scrollback, self)
+        self.__filtering = False
+        self.__sources = {0: "Console"}
+        self.__sourceView = None
+        self.__recorder = None
+
+        self.__metrics = Metrics.MetricsRegistry("QConsoleOutputWidget")
+        self.__queueDepth = self.__metrics.histogram("queue.depth")
+        self.__flushLines = self.__metrics.histogram("flush.lines")
+        self.__flushTime = self.__metrics.histogram("flush.seconds")
+        self.__printTime = self.__metrics.histogram("printToConsole.seconds")
+        self.__storedLines = self.__metrics.gauge("lines.stored")
+        self.__evictedLines = self.__metrics.gauge("lines.evicted")
+
         self.__initUI()
+        self.setBatching(batched, flushRate, maxLinesPerFlush)
 
     def __initUI(self):
         """Initialize the UI"""
         self.__layout = QtWidgets.QVBoxLayout()
 
-        self.__console = QtWidgets.QTextEdit(self)
+        self.__console = QConsoleViewport(self.__scrollback, self)
         self.__console.setFont(QtGui.QFont("Ubuntu Mono"))
         self.__console.setMinimumWidth(400)
         self.__console.setMinimumHeight(100)
-        self.__console.setReadOnly(True)
+        self.__console.setTextFormats(self.__formats)
+        self.__console.setMetrics(self.__metrics)
 
+        self.__filterField = QtWidgets.QLineEdit(self)
+        self.__filterField.setPlaceholderText("Filter output")
+        self.__filterRegex = QtWidgets.QCheckBox("Regex", self)
+
+        self.__filterBar = QtWidgets.QWidget(self)
+        filterLayout = QtWidgets.QHBoxLayout(self.__filterBar)
+        filterLayout.setContentsMargins(0, 0, 0, 0)
+        filterLayout.addWidget(self.__filterField)
+        filterLayout.addWidget(self.__filterRegex)
+        self.__filterBar.hide()
+
+        self.__sourceBox = QtWidgets.QComboBox(self)
+        self.__sourceBox.addItem("All sources", None)
+        self.__sourceBox.addItem(self.__sources[0], 0)
+        self.__sourceBox.hide()
+
+        self.__layout.addWidget(self.__sourceBox)
+        self.__layout.addWidget(self.__filterBar)
         self.__layout.addWidget(self.__console)
         self.setLayout(self.__layout)
 
-        with open(Resources.consoleStyle, "r") as CSS:
-            self.__console.setStyleSheet(CSS.read())
+        self.__console.setStyleSheet(Resources.styleSheet(Resources.consoleStyle))
+        self.__filterField.setStyleSheet(Resources.styleSheet(Resources.consoleStyle))
+
+        QtWidgets.QShortcut(QtGui.QKeySequence.Find, self, self.__showFilterBar)
+        QtWidgets.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_Escape), self.__filterField,
+                            self.__hideFilterBar)
+
+        self.__flushTimer = QtCore.QTimer(self)
+        self.__partialTimer = QtCore.QTimer(self)
 
         # Connect Signals
         self.readStdout.connect(self.printToConsole)
+        self._linesQueued.connect(self.__flushQueuedLines)
+        self.__flushTimer.timeout.connect(self.flushPendingLines)
+        self.__partialTimer.timeout.connect(self.__flushPartialLines)
+        self.__search.matchesFound.connect(self.__searchMatchesFound)
+        self.__filterField.textChanged.connect(self.__filterBarChanged)
+        self.__filterRegex.toggled.connect(self.__filterBarChanged)
+        self.__sourceBox.currentIndexChanged.connect(self.__sourceBoxChanged)
+
+    def __styleLine(self, parser, text, final):
+        """Strip ANSI escape sequences from a line and turn them into runs.
+        A provisional line does not advance the parser, since it will be
+        parsed again once it is complete.
 
-    def __readFromProcess(self, process):
-        """Method used internally by threads to read from a process
-        until it has ended. Before returning, the thread will clean
-        up the process, ensuring it is terminated and closed
+        Arguments:
+        parser -- The ConsoleAnsiParser of the line's source
+        text -- The raw text of the line
+        final -- False if the line is a provisional partial line
+
+        Returns:
+        tuple -- (text, runs) as stored in the scrollback
+        """
+        if "\x1b" not in text and parser.isIdle():
+            return text, None
+
+        snapshot = None if final else parser.snapshot()
+        styled = self.__formats.toRuns(parser.feed(text))
+        if snapshot is not None:
+            parser.restore(snapshot)
+        return styled
+
+    def __queueLine(self, source, sourceId, parser, text, final, timestamp):
+        """Hand a line to the GUI thread. Called on the reader thread by
+        the line assembler of a stream.
 
         Arguments:
-        process -- The process to track in this thread
+        source -- The ConsoleLineAssembler that produced the line
+        sourceId -- The source id the line is tagged with
+        parser -- The ConsoleAnsiParser for the source
+        text -- The text of the line
+        final -- False if the line is a provisional partial line
+        timestamp -- The time.monotonic() the line was read at
         """
-        output = ""
-        while process.poll() is None or output:
-            output = process.stdout.readline()
-            if output:
-                try:
-                    self.readStdout.emit(output.strip())
-                except:
-                    self.readStdout.emit(output.decode().strip())
+        text, runs = self.__styleLine(parser, text, final)
+        self.__pendingLines.append((source, sourceId, timestamp, text, runs, final))
 
-    def addProcess(self, process):
+        # The flag is checked after appending, and cleared by the GUI
+        # thread before it drains the queue, so no line is left behind
+        if not self.__batched and not self.__flushScheduled:
+            self.__flushScheduled = True
+            self._linesQueued.emit()
+
+    @QtCore.pyqtSlot()
+    def __flushQueuedLines(self):
+        """Drain the queue when not in batched mode"""
+        self.__flushScheduled = False
+        self.flushPendingLines(everything=True)
+
+    @QtCore.pyqtSlot()
+    def __flushPartialLines(self):
+        """Flush unterminated lines that have waited long enough"""
+        if not self.__assemblers:
+            self.__partialTimer.stop()
+            return
+
+        now = time.monotonic()
+        for assembler in list(self.__assemblers):
+            assembler.flushPartial(now)
+
+    def __streamReader(self, sourceId, metricPrefix, encoding, errors, partialTimeout, onFinished):
+        """Create the data and close callbacks that feed a source, backed
+        by a line assembler. Every source, whether a process pipe or a
+        ConsoleSource, is ingested through these.
+
+        Arguments:
+        sourceId -- The source id its lines are tagged with
+        metricPrefix -- Prefix of the stream's metric names
+        encoding -- Encoding of the output
+        errors -- Decoding error policy
+        partialTimeout -- Seconds before a partial line is shown
+        onFinished -- Called once the stream is closed, or None
+
+        Returns:
+        tuple -- (onData, onClosed) callbacks, callable from any thread
+        """
+        parser = ConsoleAnsiParser()
+        bytesRead = self.__metrics.counter(f"{metricPrefix}.bytesRead")
+        linesRead = self.__metrics.counter(f"{metricPrefix}.linesRead")
+
+        def onLine(text, final, timestamp):
+            if final and Metrics.enabled:
+                linesRead.add()
+            self.__queueLine(assembler, sourceId, parser, text, final, timestamp)
+
+        def onData(data):
+            timestamp = time.monotonic()  # Stamped as read, not as handled by the GUI
+            if Metrics.enabled:
+                bytesRead.add(len(data))
+            recorder = self.__recorder
+            if recorder is not None:
+                recorder.record(sourceId, data)
+            assembler.feed(data, timestamp)
+
+        assembler = ConsoleLineAssembler(onLine, encoding, errors, partialTimeout)
+        self.__assemblers.append(assembler)
+
+        def onClosed():
+            assembler.finish()
+            self.__assemblers.remove(assembler)
+            recorder = self.__recorder
+            if recorder is not None:
+                recorder.closeSource(sourceId)
+            if onFinished is not None:
+                onFinished()
+
+        return onData, onClosed
+
+    def addProcess(self, process, encoding=None, errors="replace", partialTimeout=0.2):
         """Adds a process to show output for to the console window.
-        The added process should be made with: stdout=subprocess.PIPE
-        stderr=subprocess.STDOUT and universal_newlines=True in order
-        to work properly.
+        The added process should be made with: stdout=subprocess.PIPE.
+        If it is made with stderr=subprocess.PIPE, stderr is shown as a
+        separate source, while stderr=subprocess.STDOUT mixes it into
+        stdout. Its pipes are read by the shared reader thread, and
+        closed once the process has finished writing to them.
 
         Arguments:
         process -- The subprocess.Popen process to start tracking
 
+        Keyword Arguments:
+        encoding -- Encoding of the output. Detected from the pipe or
+                    the locale when None (default: None)
+        errors -- Decoding error policy, as for bytes.decode (default: "replace")
+        partialTimeout -- Seconds before an unterminated line is shown (default: 0.2)
+
         Exceptions:
         ValueError -- If the process is not of type subprocess.Popen
+        LookupError -- If the encoding is unknown
+
+        Returns:
+        tuple -- The source ids of stdout, and of stderr or None
 
         Example:
         addProcess(Popen(["python"], stdout=PIPE))
+        addProcess(Popen(["tool"], stdout=PIPE, stderr=PIPE), encoding="utf-8", errors="strict")
         """
         if (not isinstance(process, subprocess.Popen)):
             raise ValueError("process must be a subprocess.Popen object")
 
+        streams = [(process.stdout, f"{process.pid}", f"process.{process.pid}")]
+        if process.stderr is not None:
+            streams.append((process.stderr, f"{process.pid} stderr", f"process.{process.pid}.stderr"))
+        openStreams = [len(streams)]
+
+        def onFinished():
+            openStreams[0] -= 1
+            if openStreams[0] == 0:
+                process.poll()
+                try:
+                    self.__processes.remove(process)
+                except ValueError:
+                    pass
+
         self.__processes.append(process)
-        newThread = threading.Thread(target=self.__readFromProcess, args=(process,))
-        newThread.start()
-        self.__processThreads.append(newThread)
+        sourceIds = []
+        for stream, name, metricPrefix in streams:
+            sourceId = self.__addSource(name)
+            streamEncoding = (encoding or getattr(stream, "encoding", None)
+                              or locale.getpreferredencoding(False))
+            callbacks = self.__streamReader(sourceId, metricPrefix, streamEncoding, errors,
+                                            partialTimeout, onFinished)
+            ConsoleProcessReader.instance().addStream(stream, *callbacks)
+            sourceIds.append(sourceId)
+
+        self.__startPartialTimer(partialTimeout)
+        return sourceIds[0], sourceIds[1] if len(sourceIds) > 1 else None
+
+    def addSource(self, name, encoding="utf-8", errors="replace", partialTimeout=0.2):
+        """Add a source of output that is fed by the caller rather than
+        read from a process. Call on the GUI thread; the returned source
+        can then be fed from any thread.
+
+        Arguments:
+        name -- The name shown in the source selector
+
+        Keyword Arguments:
+        encoding -- Encoding of bytes fed to the source (default: "utf-8")
+        errors -- Decoding error policy, as for bytes.decode (default: "replace")
+        partialTimeout -- Seconds before an unterminated line is shown (default: 0.2)
+
+        Returns:
+        ConsoleSource -- The source to feed
+
+        Exceptions:
+        LookupError -- If the encoding is unknown
+
+        Example:
+        source = addSource("daemon.log")
+        source.feed(b"started\\n")
+        """
+        sourceId = self.__addSource(name)
+        onData, onClosed = self.__streamReader(sourceId, f"source.{sourceId}", encoding, errors,
+                                               partialTimeout, None)
+        self.__startPartialTimer(partialTimeout)
+        return ConsoleSource(name, sourceId, onData, onClosed, encoding)
+
+    def __startPartialTimer(self, partialTimeout):
+        if not self.__partialTimer.isActive():
+            self.__partialTimer.start(max(1, int(partialTimeout * 1000)))
+
+    def __addSource(self, name):
+        """Register a source and list it in the source selector
+
+        Returns:
+        int -- The id of the new source
+        """
+        # Store ids are 16 bit, so sources beyond that share the last id
+        sourceId = min(len(self.__sources), 0xFFFF)
+        if sourceId not in self.__sources:
+            self.__sources[sourceId] = name if sourceId < 0xFFFF else "Other sources"
+            self.__sourceBox.addItem(self.__sources[sourceId], sourceId)
+            if self.__recorder is not None:
+                self.__recorder.addSource(sourceId, self.__sources[sourceId])
+        self.__sourceBox.show()
+        return sourceId
+
+    def sources(self):
+        """Returns a dict of the source ids and names seen so far. Source
+        0 is text printed with printToConsole().
+        """
+        return dict(self.__sources)
+
+    def setSourceView(self, sourceId=None):
+        """Only show the lines of one source. Only lines held in memory
+        have a source, so lines older than sourceViewFirstIndex() are not
+        shown, even when they are in the disk log.
+
+        Keyword Arguments:
+        sourceId -- The source id, or None for the merged view of every
+                    source (default: None)
+
+        Exceptions:
+        KeyError -- If there is no such source
+        """
+        if sourceId is not None and sourceId not in self.__sources:
+            raise KeyError(f"Unknown source: {sourceId}")
+        self.__sourceView = sourceId
+        self.__sourceBox.blockSignals(True)
+        self.__sourceBox.setCurrentIndex(self.__sourceBox.findData(sourceId))
+        self.__sourceBox.blockSignals(False)
+        self.__applyView()
+
+    def sourceView(self):
+        """Returns the source id shown, or None for the merged view"""
+        return self.__sourceView
+
+    def sourceViewFirstIndex(self):
+        """Returns the index of the oldest line the view of one source
+        can show. Older lines are only held in the disk log, which does
+        not record their source. Equal to the scrollback's firstIndex()
+        when there is no disk log.
+        """
+        return self.__scrollback.memoryFirstIndex()
+
+    @QtCore.pyqtSlot(int)
+    def __sourceBoxChanged(self, index):
+        self.setSourceView(self.__sourceBox.itemData(index))
 
     @QtCore.pyqtSlot(str)
     def printToConsole(self, message):
@@ -108,6 +465,398 @@ class QConsoleOutputWidget(QtWidgets.QWidget):
         Example:
         printToConsole("I promise to be good!")
         """
+        began = time.perf_counter() if Metrics.enabled else None
+        recorder = self.__recorder
+        if recorder is not None:
+            recorder.record(0, (message + "\n").encode("utf-8"))
+        self.__printLock.acquire()
+        styled = [self.__styleLine(self.__printParser, line, True) for line in message.split("\n")]
+        self.__scrollback.extend([text for text, _ in styled], [runs for _, runs in styled])
+        self.__printLock.release()
+        self.__contentsChanged()
+        if began is not None:
+            self.__printTime.observe(time.perf_counter() - began)
+
+    def setBatching(self, enabled, flushRate=30, maxLinesPerFlush=1000, mergeWindow=0.05):
+        """Turn batched printing on or off. When enabled, lines read
+        from processes are queued and flushed to the console flushRate
+        times per second, at most maxLinesPerFlush lines at a time.
+        Lines above that limit wait for the next flush, so a lower limit
+        favours GUI latency and a higher one favours throughput.
+
+        Lines read less than mergeWindow seconds before a flush are held
+        back to the next one, so a line of another source read just
+        before them, but queued just after, is still merged in order.
+
+        Arguments:
+        enabled -- True to enable batching, False to print every line
+
+        Keyword Arguments:
+        flushRate -- Flushes per second (default: 30)
+        maxLinesPerFlush -- Max lines per flush (default: 1000)
+        mergeWindow -- Seconds lines are held back to be merged, 0 to
+                       show every line at the next flush (default: 0.05)
+
+        Exceptions:
+        ValueError -- If flushRate or maxLinesPerFlush is not positive,
+                      or mergeWindow is negative
+
+        Example:
+        setBatching(True, flushRate=60, maxLinesPerFlush=5000)
+        """
+        if flushRate <= 0 or maxLinesPerFlush <= 0:
+            raise ValueError("flushRate and maxLinesPerFlush must be positive")
+        if mergeWindow < 0:
+            raise ValueError("mergeWindow must not be negative")
+
+        self.__maxLinesPerFlush = int(maxLinesPerFlush)
+        self.__mergeWindow = mergeWindow
+        self.__flushTimer.setInterval(max(1, int(1000 / flushRate)))
+        self.__batched = bool(enabled)
+
+        if self.__batched:
+            self.__flushTimer.start()
+        else:
+            self.__flushTimer.stop()
+            self.flushPendingLines(everything=True)
+
+    def isBatching(self):
+        """Returns True if the console is in batched mode"""
+        return self.__batched
+
+    def pendingLineCount(self):
+        """Returns the number of queued lines waiting to be printed"""
+        return len(self.__pendingLines) + len(self.__heldLines)
+
+    @QtCore.pyqtSlot()
+    def flushPendingLines(self, everything=False):
+        """Prints queued lines to the console as one scrollback append.
+        Called by the flush timer in batched mode.
+
+        Keyword Arguments:
+        everything -- Ignore maxLinesPerFlush and the merge window, and
+                      empty the queue (default: False)
+        """
+        pending = self.__pendingLines
+        held = self.__heldLines
+        count = len(pending) if everything else min(len(pending), self.__maxLinesPerFlush)
+        if count == 0 and not held:
+            return
+
+        began = None
+        if Metrics.enabled:
+            began = time.perf_counter()
+            self.__queueDepth.observe(len(pending))
+            self.__flushLines.observe(count)
+
+        batch = held + [pending.popleft() for _ in range(count)]
+        holdAfter = None
+        if self.__batched and not everything and self.__mergeWindow:
+            holdAfter = time.monotonic() - self.__mergeWindow
+
         self.__printLock.acquire()
-        self.__console.append(message)
+        self.__heldLines = self.__commitLines(batch, holdAfter)
         self.__printLock.release()
+        self.__contentsChanged()
+        if began is not None:
+            self.__flushTime.observe(time.perf_counter() - began)
+
+    def __commitLines(self, batch, holdAfter=None):
+        """Write queued lines to the scrollback. Runs of final lines are
+        appended in one go, while a provisional line replaces the previous
+        provisional line of its source if that is still the newest line.
+
+        Lines of different sources are merged on their timestamps first,
+        keeping the order of each source.
+
+        Arguments:
+        batch -- List of (source, sourceId, timestamp, text, runs, final) tuples
+
+        Keyword Arguments:
+        holdAfter -- Don't write the merged lines from the first one
+                     stamped after this time on (default: None)
+
+        Returns:
+        list -- The lines held back, in merged order
+        """
+        store = self.__scrollback
+        provisional = self.__provisionalLines
+        plain, plainRuns, plainSources, plainTimes = [], [], [], []
+
+        streams = {}
+        for entry in batch:
+            streams.setdefault(entry[1], []).append(entry)
+        if len(streams) > 1:
+            batch = list(heapq.merge(*streams.values(), key=lambda entry: entry[2]))
+
+        held = []
+        if holdAfter is not None:
+            for i, entry in enumerate(batch):
+                if entry[2] > holdAfter:
+                    batch, held = batch[:i], batch[i:]
+                    break
+
+        for source, sourceId, timestamp, text, runs, final in batch:
+            if final and source not in provisional:
+                plain.append(text)
+                plainRuns.append(runs)
+                plainSources.append(sourceId)
+                plainTimes.append(timestamp)
+                continue
+
+            if plain:
+                store.extend(plain, plainRuns, plainSources, plainTimes)
+                plain, plainRuns, plainSources, plainTimes = [], [], [], []
+
+            index = provisional.pop(source, None)
+            if index is not None and index == store.endIndex() - 1:
+                store.replaceLast(text, runs)
+                self.__search.lineReplaced(index)
+            else:
+                index = store.extend((text,), (runs,), (sourceId,), (timestamp,))
+            if not final:
+                provisional[source] = index
+
+        if plain:
+            store.extend(plain, plainRuns, plainSources, plainTimes)
+        return held
+
+    def scrollback(self):
+        """Returns the ConsoleLineStore holding the console output"""
+        return self.__scrollback
+
+    def setScrollbackLimits(self, maxLines=None, maxBytes=None):
+        """Change the scrollback caps. The oldest lines are evicted
+        first when a cap is exceeded.
+
+        Keyword Arguments:
+        maxLines -- Max lines to keep, None for no limit (default: None)
+        maxBytes -- Max bytes to keep, None for no limit (default: None)
+
+        Example:
+        setScrollbackLimits(maxLines=100000)
+        """
+        self.__scrollback.setLimits(maxLines, maxBytes)
+        self.__contentsChanged()
+
+    def setDiskLog(self, path):
+        """Write all output to a log file, keeping older lines on disk
+        instead of in memory. Lines beyond the scrollback caps are
+        evicted from memory but remain readable from the log.
+
+        Arguments:
+        path -- Path of the log file, or None to stop logging. An existing
+                log at path is continued, and shown before new output.
+
+        Exceptions:
+        OSError -- If the log can not be opened
+        ValueError -- If path exists but is not a console log
+
+        Example:
+        C = QConsoleOutputWidget(maxLines=100000)
+        C.setDiskLog("/tmp/build.log")
+        """
+        self.__scrollback.setBackingLog(ConsoleDiskLog(path) if path is not None else None)
+        self.__contentsChanged()
+
+    def exportSession(self, path):
+        """Save every line of output to a log file that can be opened
+        again with openSession()
+
+        Arguments:
+        path -- Path of the file to write
+
+        Example:
+        exportSession("session.log")
+        """
+        self.__scrollback.exportLog(path).close()
+
+    def openSession(self, path):
+        """Show a saved session. The console is cleared, and the lines of
+        the session are shown before any new output. The session is opened
+        read only, and only its index is mapped, so this takes the same
+        time for any size of session.
+
+        Arguments:
+        path -- Path of a log written by setDiskLog() or exportSession()
+
+        Exceptions:
+        OSError -- If the log can not be opened
+        ValueError -- If path is not a console log
+
+        Example:
+        openSession("session.log")
+        """
+        self.__scrollback.setBackingLog(ConsoleDiskLog.open(path))
+        self.__contentsChanged()
+
+    def startRecording(self, path):
+        """Record every chunk of output from now on, with its source and
+        time, until stopRecording(). A recording that is already running
+        is stopped first.
+
+        Arguments:
+        path -- Path of the recording to write
+
+        Returns:
+        ConsoleRecording.ConsoleRecorder -- The running recorder
+
+        Exceptions:
+        OSError -- If the file can not be created
+
+        Example:
+        startRecording("build.cwrec")
+        """
+        return self.setRecorder(ConsoleRecorder(path))
+
+    def setRecorder(self, recorder):
+        """Record output with a recorder that is already open. The
+        sources seen so far are recorded first. A recording that is
+        already running is stopped first.
+
+        Arguments:
+        recorder -- A ConsoleRecording.ConsoleRecorder, None to stop recording
+
+        Returns:
+        ConsoleRecording.ConsoleRecorder -- The recorder
+        """
+        self.stopRecording()
+        if recorder is not None:
+            for sourceId, name in self.__sources.items():
+                recorder.addSource(sourceId, name)
+        self.__recorder = recorder
+        return recorder
+
+    def stopRecording(self):
+        """Stop recording, and close the recording"""
+        recorder, self.__recorder = self.__recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def recorder(self):
+        """Returns the running ConsoleRecording.ConsoleRecorder, or None"""
+        return self.__recorder
+
+    def metrics(self):
+        """Returns the Metrics.MetricsRegistry of this console"""
+        return self.__metrics
+
+    def clearConsole(self):
+        """Remove all output from the console"""
+        self.__scrollback.clear()
+        self.__contentsChanged()
+
+    def __contentsChanged(self):
+        """Bring the search index and the view up to date after the
+        scrollback changed
+        """
+        self.__search.linesAppended()
+        if Metrics.enabled:
+            self.__storedLines.set(self.__scrollback.lineCount())
+            self.__evictedLines.set(self.__scrollback.evictedCount())
+        self.__applyView()
+
+    def __applyView(self):
+        """Show the lines of the selected source that match the filter"""
+        lines = None
+        if self.__sourceView is not None:
+            lines = self.__scrollback.sourceLines(self.__sourceView)
+        if self.__filtering:
+            matches = self.__search.matchingLines()
+            lines = matches if lines is None else self.__matchesOfSource(matches, self.__sourceView)
+
+        if lines is None and self.__console.lineFilter() is None:
+            self.__console.updateContents()
+        else:
+            self.__console.setLineFilter(lines)
+
+    def __matchesOfSource(self, matches, sourceId):
+        """Returns the matching lines that came from a source, from
+        sourceViewFirstIndex() on, as older lines have no source
+        """
+        store = self.__scrollback
+        first = self.sourceViewFirstIndex()
+        return array.array("Q", (index for index in matches[bisect.bisect_left(matches, first):]
+                                 if store.lineSource(index) == sourceId))
+
+    def search(self, query, regex=False, caseSensitive=False):
+        """Search the output on a background thread. Matches are emitted
+        through searchMatches as they are found, including matches in
+        output that arrives later.
+
+        Arguments:
+        query -- The text or regular expression to search for
+
+        Keyword Arguments:
+        regex -- Treat the query as a regular expression (default: False)
+        caseSensitive -- Match case (default: False)
+
+        Exceptions:
+        re.error -- If regex is True and the query is not a valid expression
+
+        Example:
+        search(r"error \d+", regex=True)
+        """
+        self.__search.setQuery(query, regex, caseSensitive)
+        self.__contentsChanged()
+
+    def setFilter(self, query, regex=False, caseSensitive=False):
+        """Only show lines matching a query. The filter is applied to
+        new output as it arrives.
+
+        Arguments:
+        query -- The text or regular expression to filter on
+
+        Keyword Arguments:
+        regex -- Treat the query as a regular expression (default: False)
+        caseSensitive -- Match case (default: False)
+
+        Exceptions:
+        re.error -- If regex is True and the query is not a valid expression
+
+        Example:
+        setFilter("WARNING")
+        """
+        self.__filtering = True
+        self.search(query, regex, caseSensitive)
+
+    def clearSearch(self):
+        """Stop searching and show every line again"""
+        self.__search.clearQuery()
+        self.__filtering = False
+        self.__applyView()
+
+    def matchingLines(self):
+        """Returns the sorted absolute indices of the lines matching
+        the current search that are still in the scrollback
+        """
+        return self.__search.matchingLines()
+
+    @QtCore.pyqtSlot(object)
+    def __searchMatchesFound(self, matches):
+        """Update the filtered view and pass matches on"""
+        if self.__filtering:
+            self.__applyView()
+        self.searchMatches.emit(matches)
+
+    def __showFilterBar(self):
+        self.__filterBar.show()
+        self.__filterField.setFocus()
+        self.__filterField.selectAll()
+
+    def __hideFilterBar(self):
+        self.__filterField.clear()
+        self.__filterBar.hide()
+        self.__console.setFocus()
+
+    def __filterBarChanged(self):
+        """Apply the filter typed into the filter bar"""
+        query = self.__filterField.text()
+        if not query:
+            self.clearSearch()
+            return
+
+        try:
+            self.setFilter(query, self.__filterRegex.isChecked())
+        except re.error:
+            pass  # Keep the previous filter while the expression is incomplete
@@ -0,0 +1,253 @@
+import time
+import bisect
+from . import Metrics
+from PyQt5 import QtCore
+from PyQt5 import QtGui
+from PyQt5 import QtWidgets
+
+
+class QConsoleViewport(QtWidgets.QAbstractScrollArea):
+    """A read-only view over a ConsoleLineStore. Only the lines that
+    are visible are fetched and painted, and every line has the same
+    height, so scrolling costs the same whether the store holds a
+    hundred lines or a million.
+
+    The view follows the newest line while scrolled to the bottom, and
+    otherwise keeps the top visible line in place as lines are appended.
+
+    Styled lines are painted run by run, using the formats of a
+    ConsoleTextFormats set with setTextFormats().
+
+    A line filter, set with setLineFilter(), restricts the view to a
+    sorted sequence of absolute line indices, such as the matching
+    lines of a ConsoleSearch.
+    """
+
+    def __init__(self, store, parent=None):
+        """Constructor for QConsoleViewport
+
+        Arguments:
+        store -- The ConsoleLineStore to display
+
+        Keyword Arguments:
+        parent -- parent widget for this widget (default: None)
+
+        Example:
+        V = QConsoleViewport(ConsoleLineStore(maxLines=100000))
+        """
+        super().__init__(parent)
+        self.__store = store
+        self.__topLine = store.firstIndex()
+        self.__topRow = 0
+        self.__followTail = True
+        self.__lineFilter = None
+        self.__formats = None
+        self.__paintStyles = {}
+        self.__paintTime = None
+
+        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
+        self.verticalScrollBar().valueChanged.connect(self.__verticalScrolled)
+        self.updateContents()
+
+    def store(self):
+        """Returns the ConsoleLineStore shown by this view"""
+        return self.__store
+
+    def setTextFormats(self, formats):
+        """Set the ConsoleTextFormats used to resolve style ids in line runs
+
+        Arguments:
+        formats -- A ConsoleTextFormats, or None to paint all text plain
+        """
+        self.__formats = formats
+        self.__paintStyles = {}
+        self.viewport().update()
+
+    def setMetrics(self, registry):
+        """Record the time spent painting in a "paint.seconds" histogram
+
+        Arguments:
+        registry -- A Metrics.MetricsRegistry, or None to stop recording
+        """
+        self.__paintTime = registry.histogram("paint.seconds") if registry is not None else None
+
+    def setLineFilter(self, lines):
+        """Only show the given lines
+
+        Arguments:
+        lines -- Sorted sequence of absolute line indices, or None to
+                 show every line. The sequence may grow as lines arrive,
+                 call updateContents() when it changes.
+        """
+        self.__lineFilter = lines
+        self.updateContents()
+
+    def lineFilter(self):
+        """Returns the current line filter, or None"""
+        return self.__lineFilter
+
+    def visibleLineCount(self):
+        """Returns the number of fully visible lines"""
+        return max(1, self.viewport().height() // self.__lineHeight())
+
+    def scrollToBottom(self):
+        """Scroll to the newest line and keep following new output"""
+        self.__followTail = True
+        self.updateContents()
+
+    @QtCore.pyqtSlot()
+    def updateContents(self):
+        """Update the scroll ranges after lines were appended, replaced
+        or evicted, and schedule a repaint. Call on the GUI thread.
+        """
+        maximum = max(0, self.__rowCount() - self.visibleLineCount())
+
+        if self.__followTail:
+            self.__topRow = maximum
+        else:
+            self.__topRow = min(max(self.__rowOf(self.__topLine), 0), maximum)
+        self.__topLine = self.__lineAt(self.__topRow)
+
+        vBar = self.verticalScrollBar()
+        vBar.blockSignals(True)
+        vBar.setRange(0, maximum)
+        vBar.setPageStep(self.visibleLineCount())
+        vBar.setValue(self.__topRow)
+        vBar.blockSignals(False)
+
+        charWidth = self.fontMetrics().averageCharWidth()
+        hBar = self.horizontalScrollBar()
+        hBar.setRange(0, max(0, self.__store.maxLineLength() * charWidth - self.viewport().width()))
+        hBar.setPageStep(self.viewport().width())
+        hBar.setSingleStep(charWidth)
+
+        self.viewport().update()
+
+    def __lineHeight(self):
+        return max(1, self.fontMetrics().lineSpacing())
+
+    def __rowCount(self):
+        """Returns the number of rows the view can scroll through"""
+        if self.__lineFilter is None:
+            return self.__store.lineCount()
+        return len(self.__lineFilter)
+
+    def __rowOf(self, line):
+        """Returns the row of an absolute line index, or of the next
+        visible line if it is filtered out
+        """
+        if self.__lineFilter is None:
+            return line - self.__store.firstIndex()
+        return bisect.bisect_left(self.__lineFilter, line)
+
+    def __lineAt(self, row):
+        """Returns the absolute line index shown in a row"""
+        if self.__lineFilter is None:
+            return self.__store.firstIndex() + row
+        if row < len(self.__lineFilter):
+            return self.__lineFilter[row]
+        return self.__store.endIndex()
+
+    def __rowLines(self, firstRow, lastRow):
+        """Returns the (text, runs) tuples shown in a range of rows"""
+        if self.__lineFilter is None:
+            first = self.__store.firstIndex()
+            return self.__store.styledLines(first + firstRow, first + lastRow)
+
+        result = []
+        for line in self.__lineFilter[firstRow:lastRow]:
+            result.extend(self.__store.styledLines(line, line + 1))
+        return result
+
+    @QtCore.pyqtSlot(int)
+    def __verticalScrolled(self, value):
+        """Track the absolute top line when the user scrolls"""
+        vBar = self.verticalScrollBar()
+        self.__topRow = value
+        self.__topLine = self.__lineAt(value)
+        self.__followTail = value >= vBar.maximum()
+        self.viewport().update()
+
+    def __paintStyle(self, styleId):
+        """Returns the cached (font, foreground, background) of a style id.
+        Default colours come from the palette, and background is None
+        when nothing needs to be filled.
+        """
+        paintStyle = self.__paintStyles.get(styleId)
+        if paintStyle is None:
+            textFormat = self.__formats.format(styleId)
+            inverse = self.__formats.style(styleId)[5]
+            palette = self.palette()
+
+            font = QtGui.QFont(self.font())
+            font.setBold(textFormat.fontWeight() >= QtGui.QFont.Bold)
+            font.setItalic(textFormat.fontItalic())
+            font.setUnderline(textFormat.fontUnderline())
+
+            if textFormat.hasProperty(QtGui.QTextFormat.ForegroundBrush):
+                foreground = textFormat.foreground().color()
+            else:
+                foreground = palette.color(QtGui.QPalette.Base if inverse else QtGui.QPalette.Text)
+
+            if textFormat.hasProperty(QtGui.QTextFormat.BackgroundBrush):
+                background = textFormat.background().color()
+            else:
+                background = palette.color(QtGui.QPalette.Text) if inverse else None
+
+            paintStyle = (font, foreground, background)
+            self.__paintStyles[styleId] = paintStyle
+        return paintStyle
+
+    def changeEvent(self, event):
+        if event.type() in (QtCore.QEvent.FontChange, QtCore.QEvent.PaletteChange,
+                            QtCore.QEvent.StyleChange):
+            self.__paintStyles = {}
+        super().changeEvent(event)
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.updateContents()
+
+    def paintEvent(self, event):
+        began = time.perf_counter() if Metrics.enabled and self.__paintTime is not None else None
+        painter = QtGui.QPainter(self.viewport())
+        font = self.font()
+        textColor = self.palette().color(QtGui.QPalette.Text)
+        painter.setFont(font)
+        painter.setPen(textColor)
+
+        lineHeight = self.__lineHeight()
+        ascent = self.fontMetrics().ascent()
+        charWidth = self.fontMetrics().averageCharWidth()
+        x = -self.horizontalScrollBar().value()
+
+        exposed = event.rect()
+        firstRow = exposed.top() // lineHeight
+        lastRow = exposed.bottom() // lineHeight + 1
+
+        lines = self.__rowLines(self.__topRow + firstRow, self.__topRow + lastRow)
+        for row, (text, runs) in enumerate(lines, firstRow):
+            y = row * lineHeight
+            if runs is None or self.__formats is None:
+                painter.drawText(x, y + ascent, text)
+                continue
+
+            ends = [column for column, _ in runs[1:]] + [len(text)]
+            for (column, styleId), end in zip(runs, ends):
+                runFont, foreground, background = self.__paintStyle(styleId)
+                left = x + column * charWidth
+                if background is not None:
+                    painter.fillRect(left, y, (end - column) * charWidth, lineHeight, background)
+                painter.setFont(runFont)
+                painter.setPen(foreground)
+                painter.drawText(left, y + ascent, text[column:end])
+
+            painter.setFont(font)
+            painter.setPen(textColor)
+
+        painter.end()
+        if began is not None:
+            self.__paintTime.observe(time.perf_counter() - began)
@@ -0,0 +1,193 @@
+import collections
+from PyQt5 import QtCore
+from PyQt5 import QtGui
+from PyQt5 import QtWidgets
+
+
+class QGlyphLabel(QtWidgets.QWidget):
+    """A single line label that paints its text from cached glyph
+    pixmaps, for text that changes a few characters at a time, such as
+    a clock. Each character is rendered to a pixmap once per font,
+    colour and pixel ratio, and the cache is shared by every label, so
+    a hundred clocks in the same font share one set of glyphs. Only the
+    most recently used sets are cached; a label keeps the set it uses.
+
+    Digits all take the width of the widest digit, so the characters
+    keep their positions as digits change. setText() then only
+    repaints the cells of the characters that changed, with no text
+    layout at all.
+    """
+
+    # (font, colour, pixel ratio) -> {character: (pixmap, width)}, least recently used first
+    _glyphCache = collections.OrderedDict()
+    _glyphCacheSize = 4
+
+    def __init__(self, text="", parent=None):
+        """Constructor for QGlyphLabel
+
+        Keyword Arguments:
+        text -- The initial text (default: "")
+        parent -- parent widget for this widget (default: None)
+
+        Example:
+        L = QGlyphLabel("12:00:00")
+        L.setAlignment(QtCore.Qt.AlignCenter)
+        """
+        super().__init__(parent)
+        self.__text = ""
+        self.__alignment = QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter
+        self.__glyphs = None
+        self.__glyphKey = None
+        self.__cells = []
+        self.__origin = QtCore.QPoint()
+        self.setSizePolicy(QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Fixed)
+        self.setText(text)
+
+    def text(self):
+        """Returns the text of the label"""
+        return self.__text
+
+    def setText(self, text):
+        """Set the text, repainting only the characters that changed
+
+        Arguments:
+        text -- The new text
+        """
+        old = self.__text
+        if text == old:
+            return
+        self.__text = text
+
+        if self.__glyphs is None or len(text) != len(old) or not self.__sameWidths(old, text):
+            self.__layout()
+            self.update()
+            return
+
+        for i, cell in enumerate(self.__cells):
+            if text[i] != old[i]:
+                self.update(cell.translated(self.__origin))
+
+    def setAlignment(self, alignment):
+        """Set the alignment of the text within the label
+
+        Arguments:
+        alignment -- A combination of Qt.AlignmentFlag values
+        """
+        self.__alignment = alignment
+        self.__place()
+        self.update()
+
+    def alignment(self):
+        """Returns the alignment of the text within the label"""
+        return self.__alignment
+
+    def sizeHint(self):
+        width = self.__cells[-1].right() + 1 if self.__cells else 0
+        return QtCore.QSize(width, self.fontMetrics().height())
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def __sameWidths(self, old, new):
+        """True if every changed character takes the same cell width"""
+        glyphs = self.__glyphs
+        return all(a == b or (a in glyphs and b in glyphs and glyphs[a][1] == glyphs[b][1])
+                   for a, b in zip(old, new))
+
+    def __glyphSet(self):
+        """Returns the shared glyph dict for the current font, colour and pixel ratio
+
+        Returns:
+        tuple -- (key, glyphs)
+        """
+        color = self.palette().color(QtGui.QPalette.WindowText)
+        key = (self.font().key(), color.rgba(), self.devicePixelRatioF())
+        cache = self._glyphCache
+        glyphs = cache.get(key)
+        if glyphs is not None:
+            cache.move_to_end(key)
+            return key, glyphs
+
+        # A set evicted while this label still uses it is put back, not rendered again
+        glyphs = self.__glyphs if self.__glyphs is not None and key == self.__glyphKey else {}
+        cache[key] = glyphs
+        if len(cache) > self._glyphCacheSize:
+            cache.popitem(last=False)
+        return key, glyphs
+
+    def __renderGlyph(self, glyphs, character):
+        metrics = self.fontMetrics()
+        if character.isdigit():
+            width = max(metrics.horizontalAdvance(digit) for digit in "0123456789")
+        else:
+            width = metrics.horizontalAdvance(character)
+        ratio = self.devicePixelRatioF()
+
+        pixmap = QtGui.QPixmap(max(1, round(width * ratio)), max(1, round(metrics.height() * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
+        painter.setFont(self.font())
+        painter.setPen(self.palette().color(QtGui.QPalette.WindowText))
+        painter.drawText(QtCore.QRectF(0, 0, width, metrics.height()), QtCore.Qt.AlignCenter, character)
+        painter.end()
+
+        glyphs[character] = (pixmap, width)
+
+    def __layout(self):
+        """Look up the glyphs of the text, and lay out a cell per character"""
+        self.__glyphKey, glyphs = self.__glyphSet()
+        self.__glyphs = glyphs
+        height = self.fontMetrics().height()
+        self.__cells = []
+        x = 0
+        for character in self.__text:
+            if character not in glyphs:
+                self.__renderGlyph(glyphs, character)
+            width = glyphs[character][1]
+            self.__cells.append(QtCore.QRect(x, 0, width, height))
+            x += width
+        self.__place()
+        self.updateGeometry()
+
+    def __place(self):
+        """Position the text within the label according to the alignment"""
+        width = self.__cells[-1].right() + 1 if self.__cells else 0
+        height = self.fontMetrics().height()
+        if self.__alignment & QtCore.Qt.AlignRight:
+            x = self.width() - width
+        elif self.__alignment & QtCore.Qt.AlignHCenter:
+            x = (self.width() - width) // 2
+        else:
+            x = 0
+        if self.__alignment & QtCore.Qt.AlignBottom:
+            y = self.height() - height
+        elif self.__alignment & QtCore.Qt.AlignTop:
+            y = 0
+        else:
+            y = (self.height() - height) // 2
+        self.__origin = QtCore.QPoint(x, y)
+
+    def changeEvent(self, event):
+        if event.type() in (QtCore.QEvent.FontChange, QtCore.QEvent.PaletteChange,
+                            QtCore.QEvent.StyleChange):
+            self.__glyphs = None
+            self.__layout()
+            self.update()
+        super().changeEvent(event)
+
+    def resizeEvent(self, event):
+        self.__place()
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        if self.__glyphs is None or self.__glyphs is not self.__glyphSet()[1]:
+            self.__layout()  # First paint, or moved to a screen with another pixel ratio
+
+        painter = QtGui.QPainter(self)
+        dirty = event.rect().translated(-self.__origin)
+        glyphs = self.__glyphs
+        for character, cell in zip(self.__text, self.__cells):
+            if cell.intersects(dirty):
+                painter.drawPixmap(cell.topLeft() + self.__origin, glyphs[character][0])
+        painter.end()
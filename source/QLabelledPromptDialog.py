@@ -1,14 +1,35 @@
+import concurrent.futures
+from .PrefixIndex import PrefixIndex
+from PyQt5 import QtCore
 from PyQt5 import QtWidgets
 
 
 class QLabelledPromptDialog(QtWidgets.QDialog):
-    """A window that unconditionally asks for user input, and
-    that does not care if it receives any, or if it is considered
-    valid. It will simply prompt and receive. Any validation will
-    have to be done later.
+    """A window that asks for user input. By default it does not care
+    if it receives any, or if it is considered valid. It will simply
+    prompt and receive, and any validation will have to be done later.
+
+    A validator can check the input while the user types instead. It is
+    called on a worker thread once typing pauses, so slow validators,
+    such as inventory lookups, never block the dialog. Results for text
+    that has since changed are discarded, and the result for the current
+    text is shown below the input field. The dialog can't be confirmed
+    with invalid input.
+
+    Completions are looked up in a PrefixIndex, which binary searches a
+    sorted copy of the candidates, so suggestions take the same time for
+    a hundred candidates or a few hundred thousand. Only the best
+    maxCompletions matches are handed to the completer popup.
+
+    Signals:
+    validated -- (valid, message) when the current text has been validated
     """
 
-    def __init__(self, prompt, buttonText="Confirm"):
+    validated = QtCore.pyqtSignal(bool, str)
+    _validationDone = QtCore.pyqtSignal(int, bool, str)
+
+    def __init__(self, prompt, buttonText="Confirm", validator=None, completions=None,
+                 validationDelay=250, maxCompletions=10):
         """Constructor for QLabelledPromptDialog
 
         Arguments:
@@ -17,9 +38,18 @@ class QLabelledPromptDialog(QtWidgets.QDialog):
         Keyword Arguments
         string buttonText -- The text to show on the submit button
             Default: "Confirm"
+        validator -- Called with the text on a worker thread. Returns True
+                     or None if it is valid, and False or a message if it
+                     is not. An exception counts as invalid (default: None)
+        completions -- Strings, or a PrefixIndex, to complete the input
+                       from (default: None)
+        validationDelay -- Milliseconds typing must pause before the text
+                           is validated (default: 250)
+        maxCompletions -- Max completions shown at a time (default: 10)
 
         Example:
         QLabelledPromptDialog("State your name", "Confirm")
+        QLabelledPromptDialog("Host", validator=inventory.check, completions=hostnames)
         """
 
         super().__init__()
@@ -31,6 +61,10 @@ class QLabelledPromptDialog(QtWidgets.QDialog):
 
         self._inputField = QtWidgets.QLineEdit(self)
 
+        self._validationLabel = QtWidgets.QLabel(self)
+        self._validationLabel.setStyleSheet("color: #d03030;")
+        self._validationLabel.hide()
+
         self._confirmButton = QtWidgets.QPushButton(self)
         self._confirmButton.setText(buttonText)
         self._confirmButton.clicked.connect(self.__confirmClicked)
@@ -39,10 +73,30 @@ class QLabelledPromptDialog(QtWidgets.QDialog):
         __layout.addStretch()  # Ensure label stays with the input field
         __layout.addWidget(self._titleLabel)
         __layout.addWidget(self._inputField)
+        __layout.addWidget(self._validationLabel)
         __layout.addWidget(self._confirmButton)
 
         self.setLayout(__layout)
 
+        self.__validator = None
+        self.__executor = None
+        self.__generation = 0
+        self.__submitted = None
+        self.__valid = True
+        self.__confirmWhenValid = False
+        self.__validationTimer = QtCore.QTimer(self)
+        self.__validationTimer.setSingleShot(True)
+        self.__validationTimer.timeout.connect(self.__startValidation)
+        self._validationDone.connect(self.__validationDone)
+        self.finished.connect(self.__shutdown)
+        self.setValidator(validator, validationDelay)
+
+        self.__index = None
+        self.__maxCompletions = maxCompletions
+        self.__completionModel = None
+        self.__completer = None
+        self.setCompletions(completions)
+
     def empty(self):
         """Returns True if the input text field is empty."""
         return len(self._inputField.text()) == 0
@@ -51,6 +105,173 @@ class QLabelledPromptDialog(QtWidgets.QDialog):
         """Return the string value currently in self._inputField"""
         return self._inputField.text()
 
+    def reset(self, prompt=None, buttonText=None):
+        """Make the dialog ready to prompt again, as if it were new, so it
+        can be reused rather than rebuilt. See WidgetPool. The input is
+        cleared. The validator, completions and connections to validated
+        are kept, see WidgetPool.connect().
+
+        Keyword Arguments:
+        prompt -- New prompt, None to keep the current one (default: None)
+        buttonText -- New button text, None to keep the current one (default: None)
+        """
+        # Only touch what changed, so reusing the dialog doesn't lay it out again
+        if prompt is not None and prompt != self._titleLabel.text():
+            self.setWindowTitle(prompt)
+            self._titleLabel.setText(prompt)
+        if buttonText is not None and buttonText != self._confirmButton.text():
+            self._confirmButton.setText(buttonText)
+
+        self.__confirmWhenValid = False
+        if self.__completer is not None and self.__completionModel.rowCount():
+            self.__completer.popup().hide()
+            self.__completionModel.setStringList([])
+
+        if self._inputField.text():
+            self._inputField.clear()  # Revalidated like any other edit
+
+    def setValidator(self, validator, delay=250):
+        """Set the validator of the input. See the constructor.
+
+        Arguments:
+        validator -- The validator, or None to accept any input
+
+        Keyword Arguments:
+        delay -- Milliseconds typing must pause before the text is validated (default: 250)
+        """
+        if self.__validator is not None:
+            self._inputField.textChanged.disconnect(self.__textChanged)
+        self.__validator = validator
+        self.__validationTimer.setInterval(delay)
+        if validator is None:
+            self.__generation += 1
+            self.__showResult(True, "")
+            return
+
+        self._inputField.textChanged.connect(self.__textChanged)
+        self.__textChanged()
+
+    def isValid(self):
+        """Returns True if the current text is valid, False if it is not,
+        and None while it is being validated
+        """
+        return self.__valid
+
+    def validationMessage(self):
+        """Returns the message of the last failed validation, or an empty string"""
+        return self._validationLabel.text() if self.__valid is False else ""
+
+    def setCompletions(self, completions):
+        """Set the strings the input is completed from
+
+        Arguments:
+        completions -- Strings, or a PrefixIndex to share one index
+                       between dialogs. None for no completion.
+        """
+        if completions is not None and not isinstance(completions, PrefixIndex):
+            completions = PrefixIndex(completions)
+        self.__index = completions
+
+        if completions is None:
+            if self.__completer is not None:
+                self._inputField.textEdited.disconnect(self.__complete)
+                self._inputField.setCompleter(None)
+                self.__completer = self.__completionModel = None
+            return
+
+        if self.__completer is None:
+            # The index does the filtering, so the completer shows its model as is
+            self.__completionModel = QtCore.QStringListModel(self)
+            self.__completer = QtWidgets.QCompleter(self.__completionModel, self)
+            self.__completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+            self.__completer.setMaxVisibleItems(self.__maxCompletions)
+            self._inputField.setCompleter(self.__completer)
+            self._inputField.textEdited.connect(self.__complete)
+
+    @QtCore.pyqtSlot(str)
+    def __complete(self, text):
+        """Show the best completions of text"""
+        if not text:
+            self.__completionModel.setStringList([])
+            self.__completer.popup().hide()
+            return
+
+        index = self.__index
+        matches = [index.key(i) for i in index.prefixMatches(text, self.__maxCompletions)]
+        self.__completionModel.setStringList(matches)
+        if matches:
+            self.__completer.complete()
+        else:
+            self.__completer.popup().hide()
+
+    @QtCore.pyqtSlot()
+    def __textChanged(self):
+        """Invalidate the current result, and validate once typing pauses"""
+        self.__generation += 1
+        self.__valid = None
+        self.__validationTimer.start()
+
+    @QtCore.pyqtSlot()
+    def __startValidation(self):
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(1, "QLabelledPromptDialog")
+        self.__submitted = self.__generation
+        self.__executor.submit(self.__validate, self.__generation, self.__validator, self._inputField.text())
+
+    def __validate(self, generation, validator, text):
+        """Run the validator. Called on the worker thread."""
+        if generation != self.__generation:
+            return  # Stale, the text changed while this was queued
+
+        try:
+            result = validator(text)
+        except Exception as exception:
+            result = str(exception) or type(exception).__name__
+
+        if result is None or result is True:
+            valid, message = True, ""
+        elif result is False:
+            valid, message = False, "Invalid input"
+        else:
+            valid, message = False, str(result)
+
+        try:
+            self._validationDone.emit(generation, valid, message)
+        except RuntimeError:
+            pass  # The dialog has been deleted
+
+    @QtCore.pyqtSlot(int, bool, str)
+    def __validationDone(self, generation, valid, message):
+        if generation != self.__generation:
+            return  # A result for text that has since changed
+        self.__showResult(valid, message)
+        self.validated.emit(valid, message)
+
+        if self.__confirmWhenValid:
+            self.__confirmWhenValid = False
+            if valid:
+                self.accept()
+
+    def __showResult(self, valid, message):
+        self.__valid = valid
+        self._validationLabel.setText(message)
+        self._validationLabel.setVisible(not valid)
+        self._confirmButton.setEnabled(valid)
+
+    @QtCore.pyqtSlot()
+    def __shutdown(self):
+        self.__validationTimer.stop()
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
     def __confirmClicked(self):
-        """Will close the window"""
-        self.accept()
+        """Will close the window, once the input has been validated"""
+        if self.__valid is None:
+            # Validate now rather than after the delay, and confirm if it passes
+            self.__confirmWhenValid = True
+            if self.__submitted != self.__generation:
+                self.__validationTimer.stop()
+                self.__startValidation()
+        elif self.__valid:
+            self.accept()
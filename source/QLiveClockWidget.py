@@ -1,15 +1,27 @@
-import time
 import copy
 import datetime
-import threading
+from . import Metrics
 from PyQt5 import QtCore
 from PyQt5 import QtWidgets
+from .ClockTicker import ClockTicker
+from .QGlyphLabel import QGlyphLabel
 
 
 class QLiveClockWidget(QtWidgets.QWidget):
     """The QLiveClockWidget is a widget which shows and updates
     a live system clock to display the time. It wraps a single
-    QLabel, and runs the clock update in a separate thread.
+    QLabel, and is updated by the shared ClockTicker, so every
+    clock in the process wakes up on the same single timer, once
+    per second (or minute) boundary. When Metrics are enabled,
+    metrics() records how late each tick arrives after its boundary.
+
+    With painted=True the time is shown by a QGlyphLabel instead,
+    which paints cached digit pixmaps and only repaints the digits
+    that changed. Use it for displays with many clocks.
+
+    A clock can show another timezone than the local one. Every clock
+    converts the same tick of the shared ClockTicker, so each clock
+    added costs only a timezone conversion per tick.
 
     Signals:
     secondPassed -- Once every second
@@ -18,9 +30,10 @@ class QLiveClockWidget(QtWidgets.QWidget):
     """
     secondPassed = QtCore.pyqtSignal()
     newMinute = QtCore.pyqtSignal(int)
-    newHour = QtCore.pyqtSlot(int)
+    newHour = QtCore.pyqtSignal(int)
 
-    def __init__(self, parent=None, align=0, precision=0.1):
+    def __init__(self, parent=None, align=0, precision=None, resolution="second", timeFormat=None,
+                 painted=False, timezone=None):
         """Constructor for QLiveClockWidget
 
         Keyword Arguments:
@@ -29,30 +42,56 @@ class QLiveClockWidget(QtWidgets.QWidget):
                  0 = Center
                  1 = Left
                  2 = Right
-        precision -- The interval in seconds the clock should update (default: 0.1)
+        precision -- Ignored. Kept for compatibility, as updates are now
+                     aligned to second boundaries (default: None)
+        resolution -- "second" or "minute". A minute clock wakes up once
+                      a minute and never emits secondPassed (default: "second")
+        timeFormat -- strftime format of the label (default: "%H:%M:%S",
+                      or "%H:%M" for minute resolution)
+        painted -- Paint the time from cached glyphs (default: False)
+        timezone -- A datetime.tzinfo, or a datetime.timedelta offset from
+                    UTC, to show. None for local time (default: None)
+
+        Exceptions:
+        ValueError -- If the resolution is unknown
 
         Example:
         C = QLiveClockWidget()
         C.newMinute.connect(displayAlert)
         C.secondPassed.connect(updateAppData)
         C.newHour.connect(hourlyRoutine)
+        QLiveClockWidget(painted=True, timezone=zoneinfo.ZoneInfo("Europe/Oslo"))
         """
         super().__init__(parent)
-        self.__initUI()
+        if resolution not in ("second", "minute"):
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        self.__perSecond = resolution == "second"
+        self.timeFormat = timeFormat or ("%H:%M:%S" if self.__perSecond else "%H:%M")
+        self.__ticker = ClockTicker.instance()
+        self.__timezone = None
+        self.__initUI(align, painted)
+
+        self.__metrics = Metrics.MetricsRegistry("QLiveClockWidget")
+        self.__tickCount = self.__metrics.counter("ticks")
+        self.__tickLateness = self.__metrics.histogram("tick.lateMs")
 
         self.currentTime = datetime.datetime.now()
+        self.setTimezone(timezone)
 
-        self.__timeLock = threading.Lock()
-        self.__updateThread = threading.Thread(target=self.__updateTime,
-                                               args=[precision],
-                                               daemon=True)
-        self.__updateThread.start()
+        ticker = self.__ticker
+        ticker.tick.connect(self.__updateTime)
+        ticker.subscribe(self.__perSecond)
+        self.destroyed.connect(lambda _=None, perSecond=self.__perSecond: ticker.unsubscribe(perSecond))
 
-    def __initUI(self):
+    def __initUI(self, align, painted):
         """Initialize the UI"""
 
         # Setup widgets
-        self._timeLabel = QtWidgets.QLabel(self)
+        self._timeLabel = QGlyphLabel(parent=self) if painted else QtWidgets.QLabel(self)
+        self._timeLabel.setAlignment({1: QtCore.Qt.AlignLeft,
+                                      2: QtCore.Qt.AlignRight}.get(align, QtCore.Qt.AlignHCenter)
+                                     | QtCore.Qt.AlignVCenter)
 
         # Setup layouts
         self._hLayout = QtWidgets.QHBoxLayout()
@@ -60,52 +99,66 @@ class QLiveClockWidget(QtWidgets.QWidget):
 
         self.setLayout(self._hLayout)
 
-        # Connect signals
-        self.secondPassed.connect(self.__setLabelText)
-
-    def __updateTime(self, precision):
+    @QtCore.pyqtSlot(object)
+    def __updateTime(self, now):
         """Update the internal time and send relevant time change
-        signals. Should be run in the internal clock thread.
+        signals. Called by the shared ClockTicker.
 
         Arguments:
-        precision -- The interval in seconds the clock should update
+        now -- The datetime of the tick
         """
-        lastSecond = self.currentTime.second
-        lastMinute = self.currentTime.minute
-        lastHour = self.currentTime.hour
-
-        while True:
-            self.__timeLock.acquire()
+        if self.__timezone is not None:
+            now = self.__ticker.utcTime(now).astimezone(self.__timezone)
+        last = self.currentTime
+        self.currentTime = now
+        if Metrics.enabled:
+            self.__tickCount.add()
+            self.__tickLateness.observe(now.microsecond / 1000)
 
-            # New Second
-            self.currentTime = datetime.datetime.now()
-            if lastSecond < self.currentTime.second:
-                self.secondPassed.emit()
-                lastSecond = self.currentTime.second
+        if self.__perSecond and now.replace(microsecond=0) != last.replace(microsecond=0):
+            self.secondPassed.emit()
 
-            # New Minute
-            if lastMinute < self.currentTime.minute:
-                self.newMinute.emit(self.currentTime.minute)
-                lastSecond = self.currentTime.second
-                lastMinute = self.currentTime.minute
+        # Compare whole timestamps, so wrapping from 59 to 0 counts too
+        if now.replace(second=0, microsecond=0) != last.replace(second=0, microsecond=0):
+            self.newMinute.emit(now.minute)
 
-            # New Hour
-            if lastHour < self.currentTime.hour:
-                self.newHour.emit(self.currentTime.hour)
-                lastSecond = self.currentTime.second
-                lastMinute = self.currentTime.minute
-                lastMinute = self.currentTime.hour
+        if now.replace(minute=0, second=0, microsecond=0) != last.replace(minute=0, second=0, microsecond=0):
+            self.newHour.emit(now.hour)
 
-            self.__timeLock.release()
+        self.__setLabelText()
 
-            time.sleep(precision)
-
-    @QtCore.pyqtSlot()
     def __setLabelText(self):
         """Updates the text of the time label"""
-        self.__timeLock.acquire()
-        self._timeLabel.setText(self.currentTime.strftime("%H:%M:%S"))
-        self.__timeLock.release()
+        self._timeLabel.setText(self.currentTime.strftime(self.timeFormat))
+
+    def setTimezone(self, timezone):
+        """Show the time in another timezone
+
+        Arguments:
+        timezone -- A datetime.tzinfo, or a datetime.timedelta offset from
+                    UTC. None for local time.
+
+        Example:
+        setTimezone(datetime.timedelta(hours=5, minutes=30))
+        setTimezone(zoneinfo.ZoneInfo("America/New_York"))
+        """
+        if isinstance(timezone, datetime.timedelta):
+            timezone = datetime.timezone(timezone)
+        self.__timezone = timezone
+
+        now = datetime.datetime.now()
+        if timezone is not None:
+            now = now.astimezone(timezone)
+        self.currentTime = now
+        self.__setLabelText()
+
+    def timezone(self):
+        """Returns the datetime.tzinfo of the clock, or None for local time"""
+        return self.__timezone
+
+    def metrics(self):
+        """Returns the Metrics.MetricsRegistry of this clock"""
+        return self.__metrics
 
     def getTime(self, asString=False):
         """Get the currently displayed time in datetime format
@@ -121,9 +174,6 @@ class QLiveClockWidget(QtWidgets.QWidget):
         getTime(True) # returns for example "16:21:10"
         """
         if asString:
-            return self.currentTime.strftime("%H:%M:%S")
+            return self.currentTime.strftime(self.timeFormat)
         else:
-            self.__timeLock.acquire()
-            retVal = copy.copy(self.currentTime)
-            self.__timeLock.release()
-            return retVal
+            return copy.copy(self.currentTime)
@@ -1,13 +1,47 @@
+from PyQt5 import QtCore
 from PyQt5 import QtWidgets
+from .PrefixIndex import PrefixIndex
+
+
+class _ChoiceModel(QtCore.QAbstractListModel):
+    """A list model showing a subset of the choices, by position"""
+
+    def __init__(self, keys, parent=None):
+        super().__init__(parent)
+        self.__keys = keys
+        self.__visible = range(len(keys))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.__visible)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.__keys[self.__visible[index.row()]]
+        return None
+
+    def setVisible(self, positions):
+        """Show only the choices at the given positions, in order"""
+        self.beginResetModel()
+        self.__visible = positions
+        self.endResetModel()
+
+    def positionOf(self, row):
+        """Returns the position in the choice list of a visible row"""
+        return self.__visible[row]
 
 
 class QMultipleChoiceWidget(QtWidgets.QWidget):
     """A dynamically populated widget with buttons that link
     to functions. Great if you need to provide the user with
     multiple choices that are unique to each other.
+
+    With virtualized=True, large dictionaries are shown in a filterable
+    list instead of buttons. Only the visible rows are rendered, typing
+    filters the choices by prefix or substring, Up/Down move the
+    selection and Enter picks it.
     """
 
-    def __init__(self, buttonDictionary, parent=None):
+    def __init__(self, buttonDictionary, parent=None, virtualized=False, matchPrefix=False):
         """Constructor for QMultipleChoiceWidget
 
         Arguments:
@@ -16,6 +50,10 @@ class QMultipleChoiceWidget(QtWidgets.QWidget):
 
         Keyword Arguments:
         QWidget parent -- Widget to be the parent of this widget
+        virtualized -- Show a filterable list instead of buttons. Worth it
+                       from around a hundred choices (default: False)
+        matchPrefix -- In the list, filter by prefix instead of
+                       substring (default: False)
 
         Exceptions:
         The constructor will raise a logic error if the buttonDictionary
@@ -24,6 +62,9 @@ class QMultipleChoiceWidget(QtWidgets.QWidget):
         Example:
         QMultipleChoiceWidget({"Option 1" : someFunction,
                                "Option 2" : someOtherfunction})
+
+        QMultipleChoiceWidget({host: lambda h=host: connect(h) for host in hosts},
+                              virtualized=True)
         """
 
         super().__init__(parent)
@@ -34,14 +75,125 @@ class QMultipleChoiceWidget(QtWidgets.QWidget):
         self.setGeometry(800, 400, 300, 80)
         self.setWindowTitle("Select an Option")
 
+        # One lookup table dispatches every choice
+        self.__keys = list(buttonDictionary)
+        self.__callbacks = dict(buttonDictionary)
+
+        self.__virtualized = virtualized
+        self.__matchPrefix = matchPrefix
+
         self.Buttons = {}
+        if virtualized:
+            self.__initList()
+        else:
+            self.__initButtons()
+
+    def __initButtons(self):
+        """Spawn one button per choice"""
         self.__layout = QtWidgets.QGridLayout()
 
-        for k, v in buttonDictionary.items():
+        for k in self.__keys:
             self.Buttons[k] = QtWidgets.QPushButton(self)
             self.Buttons[k].setText(k)
-            self.Buttons[k].clicked.connect(v)
-            self.Buttons[k].clicked.connect(lambda: self.close())
+            self.Buttons[k].clicked.connect(self.__buttonClicked)
             self.__layout.addWidget(self.Buttons[k])
 
         self.setLayout(self.__layout)
+
+    def __initList(self):
+        """Show the choices in a filterable list that only renders visible rows"""
+        self.setGeometry(800, 400, 300, 400)
+        self.__index = None
+        self.__lastQuery = ""
+        self.__lastMatches = None
+
+        self.__filterEdit = QtWidgets.QLineEdit(self)
+        self.__filterEdit.setPlaceholderText("Type to filter...")
+        self.__filterEdit.setClearButtonEnabled(True)
+        self.__filterEdit.textChanged.connect(self.__filterChanged)
+        self.__filterEdit.installEventFilter(self)
+
+        self.__model = _ChoiceModel(self.__keys, self)
+        self.__listView = QtWidgets.QListView(self)
+        self.__listView.setUniformItemSizes(True)
+        self.__listView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.__listView.setModel(self.__model)
+        self.__listView.activated.connect(self.__rowActivated)
+        self.__selectRow(0)
+
+        self.__layout = QtWidgets.QVBoxLayout()
+        self.__layout.addWidget(self.__filterEdit)
+        self.__layout.addWidget(self.__listView)
+        self.setLayout(self.__layout)
+        self.__filterEdit.setFocus()
+
+    def isVirtualized(self):
+        """Returns True if the choices are shown in a filterable list"""
+        return self.__virtualized
+
+    def choose(self, buttonText):
+        """Pick a choice, as if it had been clicked: calls its function
+        and then closes the widget
+
+        Exceptions:
+        KeyError -- If there is no such choice
+        """
+        self.__callbacks[buttonText]()
+        self.close()
+
+    def setFilter(self, text):
+        """Filter the list to the choices matching text. Only used in list mode."""
+        if self.__virtualized:
+            self.__filterEdit.setText(text)
+
+    def eventFilter(self, watched, event):
+        """Forward navigation keys from the filter field to the list"""
+        if (self.__virtualized and watched is self.__filterEdit
+                and event.type() == QtCore.QEvent.KeyPress):
+            key = event.key()
+            if key in (QtCore.Qt.Key_Up, QtCore.Qt.Key_Down, QtCore.Qt.Key_PageUp, QtCore.Qt.Key_PageDown):
+                QtWidgets.QApplication.sendEvent(self.__listView, event)
+                return True
+            if key in (QtCore.Qt.Key_Return, QtCore.Qt.Key_Enter):
+                current = self.__listView.currentIndex()
+                if current.isValid():
+                    self.__rowActivated(current)
+                return True
+            if key == QtCore.Qt.Key_Escape:
+                self.close()
+                return True
+        return super().eventFilter(watched, event)
+
+    @QtCore.pyqtSlot()
+    def __buttonClicked(self):
+        self.choose(self.sender().text())
+
+    @QtCore.pyqtSlot(QtCore.QModelIndex)
+    def __rowActivated(self, index):
+        self.choose(self.__keys[self.__model.positionOf(index.row())])
+
+    @QtCore.pyqtSlot(str)
+    def __filterChanged(self, text):
+        """Refilter the list. A query that extends the previous substring
+        query only rescans the previous matches.
+        """
+        if not text:
+            matches = range(len(self.__keys))
+        else:
+            if self.__index is None:
+                self.__index = PrefixIndex(self.__keys)  # Built on first use
+            if self.__matchPrefix:
+                matches = self.__index.prefixMatches(text)
+            elif self.__lastMatches is not None and self.__lastQuery and self.__lastQuery.casefold() in text.casefold():
+                matches = self.__index.matches(text, within=self.__lastMatches)
+            else:
+                matches = self.__index.matches(text)
+
+        self.__lastQuery = text
+        self.__lastMatches = matches if text else None
+        self.__model.setVisible(matches)
+        self.__selectRow(0)
+
+    def __selectRow(self, row):
+        if self.__model.rowCount() > row:
+            self.__listView.setCurrentIndex(self.__model.index(row))
@@ -1,17 +1,46 @@
+import math
+import time
+import threading
+from . import Metrics
+from PyQt5 import QtCore
 from PyQt5 import QtWidgets
+from .ProgressChannel import ProgressChannel
 
 
 class QProgressTaskDialog(QtWidgets.QDialog):
     """A widget which shows a progress bar and tracks
     a task that can be cancelled by the user.
+
+    Progress is reported to a ProgressChannel, which any thread can write
+    to cheaply, and the dialog samples it every refreshInterval ms. The
+    bar is only repainted when the sampled value changed, and the
+    throughput and ETA are computed from an exponentially smoothed rate.
+    To run the work itself on a thread or process pool, see TaskRunner.
+    When Metrics are enabled, metrics() counts setProgress calls and
+    refreshes, and records the throughput.
+
+    Signals:
+    cancelRequested -- When the user presses Cancel
     """
 
-    def __init__(self, taskName):
+    cancelRequested = QtCore.pyqtSignal()
+
+    # Seconds over which the throughput is smoothed
+    _RATE_TIME_CONSTANT = 3.0
+
+    # Steps of the progress bar, so large totals still move smoothly
+    _BAR_STEPS = 1000
+
+    def __init__(self, taskName, total=100, refreshInterval=100):
         """Constructor for QProgressTaskDialog
 
         Arguments:
         string taskName -- Title of the window and label before progress bar
 
+        Keyword Arguments:
+        total -- The count at which the task is complete (default: 100)
+        refreshInterval -- Milliseconds between UI refreshes (default: 100)
+
         Example:
         W = QProgressTaskDialog("Clearing Forest")
         for i in range(100):
@@ -19,6 +48,13 @@ class QProgressTaskDialog(QtWidgets.QDialog):
                 W.setProgress(i + 1)
             else:
                 W.close()
+
+        # From worker threads, with absolute counts
+        W = QProgressTaskDialog("Planting Trees", total=len(trees))
+        advance = W.progressChannel().advance
+        for tree in trees:
+            plant(tree)
+            advance()
         """
 
         super().__init__()
@@ -32,7 +68,10 @@ class QProgressTaskDialog(QtWidgets.QDialog):
         self.__subTaskLabel = QtWidgets.QLabel(self)
         self.__subTaskLabel.setText("Working...")
 
+        self.__rateLabel = QtWidgets.QLabel(self)
+
         self.__progressBar = QtWidgets.QProgressBar(self)
+        self.__progressBar.setRange(0, self._BAR_STEPS)
 
         self.__cancelButton = QtWidgets.QPushButton(self)
         self.__cancelButton.clicked.connect(self.__cancelTask)
@@ -46,6 +85,7 @@ class QProgressTaskDialog(QtWidgets.QDialog):
         __vLayout = QtWidgets.QVBoxLayout(self)
         __vLayout.addLayout(__hLayout)
         __vLayout.addWidget(self.__subTaskLabel)
+        __vLayout.addWidget(self.__rateLabel)
         __vLayout.addStretch()
 
         self.setLayout(__vLayout)
@@ -54,8 +94,66 @@ class QProgressTaskDialog(QtWidgets.QDialog):
         self.__progress = 0
         self.__maxProgress = 100
 
+        self.__channel = ProgressChannel(total)
+        self.__setPercent = self.__channel.setPercent
+        self.__guiThread = threading.get_ident()
+        self.__refreshInterval = refreshInterval / 1000
+        self.__nextRefresh = 0.0
+        self.__shownDone = None
+        self.__shownTotal = None
+        self.__lastSample = None
+        self.__rate = None
+
+        self.__metrics = Metrics.MetricsRegistry("QProgressTaskDialog")
+        self.__setProgressCalls = self.__metrics.counter("setProgress.calls")
+        self.__refreshCount = self.__metrics.counter("refresh.count")
+        self.__refreshTime = self.__metrics.histogram("refresh.seconds")
+        self.__throughput = self.__metrics.gauge("throughput")
+
+        self.__refreshTimer = QtCore.QTimer(self)
+        self.__refreshTimer.setInterval(refreshInterval)
+        self.__refreshTimer.timeout.connect(self.__refresh)
+
+    def reset(self, taskName=None, total=100):
+        """Make the dialog ready for another task, as if it were new, so it
+        can be reused rather than rebuilt. See WidgetPool. Connections to
+        cancelRequested are kept, see WidgetPool.connect(). Only call once
+        nothing reports to the previous task any more.
+
+        Keyword Arguments:
+        taskName -- New task name, None to keep the current one (default: None)
+        total -- The count at which the task is complete (default: 100)
+        """
+        # Only touch what changed, so reusing the dialog doesn't lay it out again
+        if taskName is not None and taskName != self.__taskLabel.text():
+            self.setWindowTitle(taskName)
+            self.__taskLabel.setText(taskName)
+        if self.__subTaskLabel.text() != "Working...":
+            self.__subTaskLabel.setText("Working...")
+        if self.__rateLabel.text():
+            self.__rateLabel.clear()
+        if self.__progressBar.value() != 0:
+            self.__progressBar.setValue(0)
+
+        self.__cancelled = False
+        self.__progress = 0
+        self.__channel.reset(total)
+        self.__nextRefresh = 0.0
+        self.__shownDone = None
+        self.__shownTotal = None
+        self.__lastSample = None
+        self.__rate = None
+
+    def progressChannel(self):
+        """Returns the ProgressChannel the dialog reads. Keep a reference to
+        its advance or setDone method for the cheapest reporting from a loop.
+        """
+        return self.__channel
+
     def setProgress(self, value):
-        """Set the progress of the task as a number between 0 and 100
+        """Set the progress of the task as a number between 0 and 100.
+        Safe to call from any thread. On the GUI thread, the bar is updated
+        at most once per refresh interval, and when the task reaches 100.
 
         Arguments:
         int value -- The new progress value (0 - 100)
@@ -64,11 +162,47 @@ class QProgressTaskDialog(QtWidgets.QDialog):
         for i in xrange(200):
             W.setProgress(i / 200 * 100)
         """
-        if value > 100:
-            value = 100
-        elif value < 0:
-            value = 0
-        self.__progressBar.setValue(value)
+        self.__setPercent(value)  # Clamped and converted when the channel is read
+        if Metrics.enabled:
+            self.__setProgressCalls.add()
+
+        # Without a running event loop, e.g. a loop on the GUI thread, refresh here
+        if ((value >= 100 or time.monotonic() >= self.__nextRefresh)
+                and threading.get_ident() == self.__guiThread):
+            self.__refresh()
+
+    def setTotal(self, total):
+        """Set the count at which the task is complete. Safe to call from any thread."""
+        self.__channel.setTotal(total)
+
+    def setDone(self, done):
+        """Set the number of units done, out of the total. Safe to call from any thread."""
+        self.__channel.setDone(done)
+
+    def advance(self, amount=1):
+        """Add to the number of units done. Safe to call from any thread."""
+        self.__channel.advance(amount)
+
+    def metrics(self):
+        """Returns the Metrics.MetricsRegistry of this dialog"""
+        return self.__metrics
+
+    def throughput(self):
+        """Returns the smoothed rate in units per second, or None before
+        there are two samples
+        """
+        return self.__rate
+
+    def eta(self):
+        """Returns the estimated seconds left, or None if unknown"""
+        if not self.__rate:
+            return None
+        return max(0.0, (self.__channel.total() - self.__channel.done()) / self.__rate)
+
+    @QtCore.pyqtSlot(str)
+    def setSubTask(self, text):
+        """Set the sub-task text shown below the progress bar"""
+        self.__subTaskLabel.setText(text)
 
     def setProgressWithCancel(self, value):
         """Does the same as setProgress, except will raise an exception if
@@ -81,12 +215,70 @@ class QProgressTaskDialog(QtWidgets.QDialog):
 
     def getProgress(self):
         """Returns the current Progress value as a number between 0 and 100"""
-        return self.__progress
+        return self.__channel.fraction() * 100
 
     def isCancelled(self):
         """Returns true if the user has requested to Cancel the task."""
         return self.__cancelled
 
+    def showEvent(self, event):
+        """Refresh on a timer while shown"""
+        super().showEvent(event)
+        self.__refresh()
+        self.__refreshTimer.start()
+
+    def hideEvent(self, event):
+        """Stop refreshing while hidden"""
+        super().hideEvent(event)
+        self.__refreshTimer.stop()
+
+    @QtCore.pyqtSlot()
+    def __refresh(self):
+        """Sample the channel, update the smoothed rate, and repaint the
+        bar and labels if anything changed
+        """
+        now = time.monotonic()
+        began = time.perf_counter() if Metrics.enabled else None
+        self.__nextRefresh = now + self.__refreshInterval
+        done = self.__channel.done()
+        total = self.__channel.total()
+
+        if self.__lastSample is not None:
+            lastTime, lastDone = self.__lastSample
+            elapsed = now - lastTime
+            if elapsed > 0:
+                rate = (done - lastDone) / elapsed
+                if self.__rate is None:
+                    self.__rate = rate
+                else:
+                    self.__rate += (1 - math.exp(-elapsed / self._RATE_TIME_CONSTANT)) * (rate - self.__rate)
+        self.__lastSample = (now, done)
+
+        if done != self.__shownDone or total != self.__shownTotal:
+            self.__shownDone = done
+            self.__shownTotal = total
+
+            fraction = min(1.0, max(0.0, done / total)) if total > 0 else 0.0
+            self.__progressBar.setValue(int(fraction * self._BAR_STEPS))
+            self.__rateLabel.setText(self.__rateText(done, total))
+
+        if began is not None:
+            self.__refreshCount.add()
+            self.__refreshTime.observe(time.perf_counter() - began)
+            self.__throughput.set(self.__rate or 0.0)
+
+    def __rateText(self, done, total):
+        text = f"{done:,.0f} / {total:,.0f}"
+        if self.__rate:
+            text += f" - {self.__rate:,.1f}/s"
+            eta = self.eta()
+            if eta is not None and done < total:
+                minutes, seconds = divmod(int(math.ceil(eta)), 60)
+                hours, minutes = divmod(minutes, 60)
+                text += f" - ETA {hours}:{minutes:02}:{seconds:02}" if hours else f" - ETA {minutes}:{seconds:02}"
+        return text
+
     def __cancelTask(self):
         """Requests the task to be cancelled. Up to the programmer to respect the wish"""
         self.__cancelled = True
+        self.cancelRequested.emit()
@@ -1,7 +1,87 @@
 """This file contains paths to resources required by various
 modules in PyQt5_CWidgets. Examples are paths to fonts / logos /
 icons etc.
+
+Paths are resolved relative to this package rather than the working
+directory. If the resources have been compiled into an embedded Qt
+resource bundle with:
+
+    pyrcc5 resources/resources.qrc -o source/ResourcesData.py
+
+the paths point into the bundle instead, and nothing is read from disk.
+
+Fonts and stylesheets are loaded once per process and cached, so use
+loadFont() and styleSheet() rather than reading the files directly.
 """
 
-monspaceFont = "../resources/fonts/UbuntuMono-R.ttf"
-consoleStyle = "../resources/styles/consoleStyle.css"
+import os
+import importlib
+import threading
+from PyQt5 import QtCore
+from PyQt5 import QtGui
+
+try:
+    importlib.import_module(".ResourcesData", __package__)  # Registers the embedded bundle
+    _resourceRoot = ":"
+except ImportError:
+    _resourceRoot = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  os.pardir, "resources"))
+
+monspaceFont = _resourceRoot + "/fonts/UbuntuMono-R.ttf"
+consoleStyle = _resourceRoot + "/styles/consoleStyle.css"
+
+_cacheLock = threading.Lock()
+_fontFamilies = {}
+_styleSheets = {}
+
+
+def isEmbedded():
+    """Returns True if resources are read from the embedded bundle"""
+    return _resourceRoot == ":"
+
+
+def loadFont(path):
+    """Register a font file with the application, once per process.
+    Requires a QApplication.
+
+    Arguments:
+    path -- Path of the font, such as Resources.monspaceFont
+
+    Returns:
+    list -- The font families in the file, empty if it failed to load
+
+    Example:
+    Resources.loadFont(Resources.monspaceFont)
+    """
+    with _cacheLock:
+        families = _fontFamilies.get(path)
+        if families is None:
+            fontId = QtGui.QFontDatabase.addApplicationFont(path)
+            families = QtGui.QFontDatabase.applicationFontFamilies(fontId) if fontId >= 0 else []
+            _fontFamilies[path] = families
+        return families
+
+
+def styleSheet(path):
+    """Read a stylesheet, once per process
+
+    Arguments:
+    path -- Path of the stylesheet, such as Resources.consoleStyle
+
+    Returns:
+    str -- The stylesheet, empty if the file could not be read
+
+    Example:
+    widget.setStyleSheet(Resources.styleSheet(Resources.consoleStyle))
+    """
+    with _cacheLock:
+        text = _styleSheets.get(path)
+        if text is None:
+            styleFile = QtCore.QFile(path)
+            if styleFile.open(QtCore.QIODevice.ReadOnly | QtCore.QIODevice.Text):
+                text = bytes(styleFile.readAll()).decode("utf-8")
+                styleFile.close()
+            else:
+                text = ""
+            _styleSheets[path] = text
+        return text
@@ -0,0 +1,463 @@
+import time
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+from PyQt5 import QtCore
+
+
+class TaskCancelled(Exception):
+    """Raised by CancellationToken.raiseIfCancelled() inside a task"""
+
+
+class CancellationToken:
+    """Lets a running task know that it should stop. Cancellation is
+    cooperative: the task checks isCancelled() or calls raiseIfCancelled()
+    between units of work.
+
+    In a worker process the token wraps a shared event, which is an
+    inter-process call, so it is checked at most every pollInterval seconds.
+    """
+
+    def __init__(self, event=None, pollInterval=0):
+        """Constructor for CancellationToken
+
+        Keyword Arguments:
+        event -- The event to wrap, a new threading.Event when None (default: None)
+        pollInterval -- Min seconds between checks of the event (default: 0)
+        """
+        self.__event = event if event is not None else threading.Event()
+        self.__pollInterval = pollInterval
+        self.__nextPoll = 0.0
+        self.__cancelled = False
+
+    def event(self):
+        """Returns the wrapped event"""
+        return self.__event
+
+    def cancel(self):
+        """Request the task to stop"""
+        self.__event.set()
+        self.__cancelled = True
+
+    def isCancelled(self):
+        """Returns True if the task has been asked to stop"""
+        if self.__cancelled:
+            return True
+        if self.__pollInterval:
+            now = time.monotonic()
+            if now < self.__nextPoll:
+                return False
+            self.__nextPoll = now + self.__pollInterval
+        self.__cancelled = self.__event.is_set()
+        return self.__cancelled
+
+    def raiseIfCancelled(self):
+        """Raise TaskCancelled if the task has been asked to stop
+
+        Exceptions:
+        TaskCancelled -- If the task has been asked to stop
+        """
+        if self.isCancelled():
+            raise TaskCancelled()
+
+
+class ProgressReporter:
+    """Reports the progress of a task in its own units. The reporter
+    covers a span of the main progress bar, and subtask() splits off
+    part of that span for a nested step, so nested steps add up on the
+    main bar.
+
+    Example:
+    def work(token, progress, paths):
+        progress.setTotal(len(paths))
+        for path in paths:
+            token.raiseIfCancelled()
+            with progress.subtask(1, f"Reading {path}") as step:
+                step.setTotal(os.path.getsize(path))
+                for block in readBlocks(path):
+                    step.advance(len(block))
+    """
+
+    def __init__(self, sink, span=1.0, onText=None):
+        """Constructor for ProgressReporter. Task runners create these.
+
+        Arguments:
+        sink -- Called with progress in main bar units
+
+        Keyword Arguments:
+        span -- Main bar units covered by this reporter (default: 1.0)
+        onText -- Called with the sub-task text (default: None)
+        """
+        self.__sink = sink
+        self.__span = span
+        self.__onText = onText
+        self.__total = 1
+        self.__scale = span
+        self.__done = 0
+
+    def setTotal(self, total):
+        """Set the number of units this reporter counts to (default: 1)"""
+        self.__total = total
+        self.__scale = self.__span / total if total > 0 else 0
+
+    def advance(self, amount=1):
+        """Add to the units done"""
+        self.__done += amount
+        self.__sink(amount * self.__scale)
+
+    def setDone(self, done):
+        """Set the units done to an absolute value"""
+        self.advance(done - self.__done)
+
+    def setText(self, text):
+        """Set the sub-task text shown by the dialog"""
+        if self.__onText is not None:
+            self.__onText(text)
+
+    def subtask(self, weight=1, text=None):
+        """Split off a nested step worth weight of this reporter's units.
+        Don't also advance this reporter for those units; the step is
+        counted when it advances, and completed by finish() or on leaving
+        a with block.
+
+        Keyword Arguments:
+        weight -- Units of this reporter the step is worth (default: 1)
+        text -- Sub-task text to show while it runs (default: None)
+
+        Returns:
+        ProgressReporter -- The reporter of the step
+        """
+        if text is not None:
+            self.setText(text)
+        self.__done += weight
+        return ProgressReporter(self.__sink, weight * self.__scale, self.__onText)
+
+    def finish(self):
+        """Mark the remaining units as done"""
+        if self.__done < self.__total:
+            self.advance(self.__total - self.__done)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.finish()
+        return False
+
+
+class _ThreadSink:
+    """Forwards task progress to the dialog channel, counting how much was reported"""
+
+    __slots__ = ("channel", "reported")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.reported = 0.0
+
+    def __call__(self, amount):
+        self.reported += amount
+        self.channel.advance(amount)
+
+
+class _RemoteSink:
+    """Collects task progress in a worker process, and publishes it to a
+    shared dict at most every interval seconds
+    """
+
+    def __init__(self, state, interval):
+        self.__state = state
+        self.__interval = interval
+        self.__nextFlush = 0.0
+        self.__text = None
+        self.reported = 0.0
+
+    def __call__(self, amount):
+        self.reported += amount
+        now = time.monotonic()
+        if now >= self.__nextFlush:
+            self.flush(now)
+
+    def setText(self, text):
+        self.__text = text
+        self.flush()
+
+    def flush(self, now=None):
+        self.__nextFlush = (now or time.monotonic()) + self.__interval
+        self.__state.update(done=self.reported, text=self.__text)
+
+
+def _runInProcess(fn, state, cancelEvent, weight, interval, args, kwargs):
+    """Runs a task in a worker process, with a token and reporter backed by shared objects"""
+    sink = _RemoteSink(state, interval)
+    try:
+        return fn(CancellationToken(cancelEvent, interval), ProgressReporter(sink, weight, sink.setText),
+                  *args, **kwargs)
+    finally:
+        sink.flush()
+
+
+class _Task:
+    __slots__ = ("future", "fn", "args", "kwargs", "weight", "sink", "state", "batch", "launched",
+                 "shownDone", "text")
+
+    def __init__(self, fn, args, kwargs, weight, batch=None):
+        self.future = concurrent.futures.Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.weight = weight
+        self.batch = batch
+        self.sink = None
+        self.state = None
+        self.launched = False
+        self.shownDone = 0.0
+        self.text = None
+
+
+class _Batch:
+    __slots__ = ("waiting", "running", "limit")
+
+    def __init__(self, limit):
+        self.waiting = collections.deque()
+        self.running = 0
+        self.limit = limit
+
+
+class TaskRunner(QtCore.QObject):
+    """Runs callables on a thread pool or a process pool, behind a
+    QProgressTaskDialog. Each callable is called as
+    fn(token, progress, *args, **kwargs), with a CancellationToken and a
+    ProgressReporter. Tasks are weighted on the dialog's progress bar,
+    and the Cancel button cancels them.
+
+    Thread pools suit work that releases the GIL or waits on I/O. Process
+    pools let CPU bound work use every core; there the callable and its
+    arguments must be picklable, and progress and cancellation go through
+    a multiprocessing manager, checked at most every pollInterval seconds.
+
+    Signals:
+    taskFinished -- The future and the result of a task
+    taskFailed -- The future and the exception of a task
+    taskCancelled -- The future of a task that was cancelled
+    allFinished -- When no task is pending or running
+    """
+
+    taskFinished = QtCore.pyqtSignal(object, object)
+    taskFailed = QtCore.pyqtSignal(object, object)
+    taskCancelled = QtCore.pyqtSignal(object)
+    allFinished = QtCore.pyqtSignal()
+
+    _taskDone = QtCore.pyqtSignal(object)
+    _textChanged = QtCore.pyqtSignal(str)
+
+    def __init__(self, dialog=None, parent=None, processes=False, maxWorkers=None, pollInterval=0.1):
+        """Constructor for TaskRunner
+
+        Keyword Arguments:
+        dialog -- The QProgressTaskDialog showing the progress (default: None)
+        parent -- parent object (default: dialog)
+        processes -- Run tasks in worker processes instead of threads (default: False)
+        maxWorkers -- Max tasks running at once, the number of CPUs when
+                      None (default: None)
+        pollInterval -- Seconds between progress updates from worker
+                        processes (default: 0.1)
+
+        Example:
+        W = QProgressTaskDialog("Rendering Frames")
+        R = TaskRunner(W, processes=True)
+        R.allFinished.connect(W.close)
+        R.submitBatch(renderFrame, [(frame,) for frame in frames], maxConcurrent=4)
+        W.show()
+        """
+        super().__init__(parent if parent is not None else dialog)
+        self.__dialog = dialog
+        self.__processes = processes
+        self.__pollInterval = pollInterval
+        self.__outstanding = set()
+        self.__manager = None
+
+        if processes:
+            self.__executor = concurrent.futures.ProcessPoolExecutor(maxWorkers)
+        else:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(maxWorkers, thread_name_prefix="TaskRunner")
+        self.__token = self.__newToken()
+
+        self._taskDone.connect(self.__finishTask)
+        self.__pollTimer = QtCore.QTimer(self)
+        self.__pollTimer.setInterval(int(pollInterval * 1000))
+        self.__pollTimer.timeout.connect(self.__pollProcesses)
+
+        if dialog is not None:
+            dialog.cancelRequested.connect(self.cancel)
+            self._textChanged.connect(dialog.setSubTask)
+
+    def submit(self, fn, *args, weight=1, **kwargs):
+        """Run a task
+
+        Arguments:
+        fn -- Called as fn(token, progress, *args, **kwargs)
+
+        Keyword Arguments:
+        weight -- Share of the progress bar relative to other tasks (default: 1)
+
+        Returns:
+        Future -- The future of the task's result
+        """
+        task = _Task(fn, args, kwargs, weight)
+        self.__add(task)
+        self.__launch(task)
+        return task.future
+
+    def submitBatch(self, fn, argsList, maxConcurrent=None, weight=1):
+        """Run fn once per argument tuple, at most maxConcurrent at a time
+
+        Arguments:
+        fn -- Called as fn(token, progress, *args)
+        argsList -- An iterable of argument tuples
+
+        Keyword Arguments:
+        maxConcurrent -- Max tasks of this batch running at once, or None
+                         to only be limited by the pool (default: None)
+        weight -- Share of the progress bar of each task (default: 1)
+
+        Returns:
+        list -- The futures of the tasks, in order
+        """
+        batch = _Batch(maxConcurrent)
+        tasks = [_Task(fn, tuple(args), {}, weight, batch) for args in argsList]
+        for task in tasks:
+            self.__add(task)
+            batch.waiting.append(task)
+        self.__launchBatch(batch)
+        return [task.future for task in tasks]
+
+    @QtCore.pyqtSlot()
+    def cancel(self):
+        """Cancel every task. Pending tasks are dropped, and running tasks
+        are asked to stop through their token. Later tasks get a new token.
+        """
+        self.__token.cancel()
+        self.__token = self.__newToken()
+        for task in list(self.__outstanding):
+            if task.future.cancel():
+                self._taskDone.emit(task)
+
+    def outstandingCount(self):
+        """Returns the number of tasks pending or running"""
+        return len(self.__outstanding)
+
+    def shutdown(self, wait=True):
+        """Stop the pool. Cancel first to not wait for running tasks."""
+        self.__executor.shutdown(wait)
+        if self.__manager is not None:
+            self.__manager.shutdown()
+            self.__manager = None
+
+    def __newToken(self):
+        if not self.__processes:
+            return CancellationToken()
+        if self.__manager is None:
+            self.__manager = multiprocessing.Manager()
+        return CancellationToken(self.__manager.Event())
+
+    def __add(self, task):
+        """Start counting a task on the progress bar"""
+        if self.__dialog is not None:
+            channel = self.__dialog.progressChannel()
+            if not self.__outstanding:
+                channel.reset(total=0)
+            channel.setTotal(channel.total() + task.weight)
+        self.__outstanding.add(task)
+
+    def __launch(self, task):
+        """Hand a task to the pool. Returns False if it was cancelled."""
+        if not task.future.set_running_or_notify_cancel():
+            self._taskDone.emit(task)
+            return False
+
+        task.launched = True
+        token = self.__token
+        if self.__processes:
+            task.state = self.__manager.dict(done=0.0, text=None)
+            inner = self.__executor.submit(_runInProcess, task.fn, task.state, token.event(),
+                                           task.weight, self.__pollInterval, task.args, task.kwargs)
+            self.__pollTimer.start()
+        else:
+            channel = self.__dialog.progressChannel() if self.__dialog is not None else None
+            task.sink = _ThreadSink(channel) if channel is not None else (lambda amount: None)
+            reporter = ProgressReporter(task.sink, task.weight, self._textChanged.emit)
+            inner = self.__executor.submit(task.fn, token, reporter, *task.args, **task.kwargs)
+        inner.add_done_callback(lambda inner, task=task: self.__settle(task, inner))
+        return True
+
+    def __launchBatch(self, batch):
+        while batch.waiting and (batch.limit is None or batch.running < batch.limit):
+            task = batch.waiting.popleft()
+            if self.__launch(task):
+                batch.running += 1
+
+    def __settle(self, task, inner):
+        """Copy the pool's outcome into the task's future. Runs on a pool thread."""
+        if inner.cancelled():
+            task.future.set_exception(TaskCancelled())
+        elif inner.exception() is not None:
+            task.future.set_exception(inner.exception())
+        else:
+            task.future.set_result(inner.result())
+        self._taskDone.emit(task)
+
+    @QtCore.pyqtSlot(object)
+    def __finishTask(self, task):
+        """Complete the task's share of the bar, report it, and start the next of its batch"""
+        if task not in self.__outstanding:
+            return
+        self.__outstanding.discard(task)
+
+        if self.__dialog is not None:
+            if task.state is not None:
+                self.__pollTask(task)
+            reported = task.sink.reported if isinstance(task.sink, _ThreadSink) else task.shownDone
+            if reported < task.weight:
+                self.__dialog.progressChannel().advance(task.weight - reported)
+
+        future = task.future
+        if future.cancelled() or isinstance(future.exception(), TaskCancelled):
+            self.taskCancelled.emit(future)
+        elif future.exception() is not None:
+            self.taskFailed.emit(future, future.exception())
+        else:
+            self.taskFinished.emit(future, future.result())
+
+        if task.batch is not None and task.launched:
+            task.batch.running -= 1
+            self.__launchBatch(task.batch)
+        task.state = None
+
+        if not self.__outstanding:
+            self.__pollTimer.stop()
+            if self.__dialog is not None:
+                # Fractions of a task, summed as floats, can fall just short of the total
+                channel = self.__dialog.progressChannel()
+                channel.setDone(channel.total())
+            self.allFinished.emit()
+
+    @QtCore.pyqtSlot()
+    def __pollProcesses(self):
+        """Move progress published by worker processes to the dialog"""
+        for task in list(self.__outstanding):
+            if task.state is not None:
+                self.__pollTask(task)
+
+    def __pollTask(self, task):
+        try:
+            state = task.state.copy()
+        except (OSError, EOFError):
+            return
+        if self.__dialog is not None and state["done"] > task.shownDone:
+            self.__dialog.progressChannel().advance(state["done"] - task.shownDone)
+            task.shownDone = state["done"]
+        if state["text"] is not None and state["text"] != task.text:
+            task.text = state["text"]
+            self._textChanged.emit(task.text)
@@ -0,0 +1,150 @@
+from PyQt5 import QtCore
+
+
+class WidgetPool(QtCore.QObject):
+    """Keeps ready-built instances of a widget that is shown often, such
+    as QProgressTaskDialog, QLabelledPromptDialog or QAlarmLockWidget,
+    so showing one costs a reset() and a show() rather than building
+    every child widget and layout again.
+
+    Instances are built ahead of time, one at a time and prewarmDelay
+    apart, so prewarming never blocks the GUI for long and doesn't hold
+    up painting an instance that was just acquired. A prewarmed instance
+    is also polished, its layout activated and its native window
+    created, so its first show() costs no more than later ones.
+
+    release() hides an instance and resets it, and acquire() hands it
+    out again, calling reset() with any arguments given. A widget can be
+    pooled if reset() with no arguments returns it to its initial state.
+    reset() should only touch state that changed, so a reused instance
+    is not laid out again.
+
+    reset() leaves signal connections alone. Connect to an acquired
+    instance through connect(), and release() disconnects just those
+    connections, so connections made by the widget itself or by other
+    code survive the trip through the pool.
+
+    Example:
+    P = WidgetPool(lambda: QProgressTaskDialog("Working"), size=2)
+    dialog = P.acquire(taskName="Exporting", total=len(rows))
+    P.connect(dialog, dialog.cancelRequested, worker.cancel)
+    dialog.show()
+    ...
+    P.release(dialog)
+    """
+
+    def __init__(self, factory, size=1, maxSize=None, prewarmDelay=100, parent=None):
+        """Constructor for WidgetPool. Starts prewarming once the event
+        loop runs.
+
+        Arguments:
+        factory -- Called with no arguments to build a new instance
+
+        Keyword Arguments:
+        size -- Instances kept ready for acquire() (default: 1)
+        maxSize -- Max released instances kept, the rest are deleted.
+                   None for size (default: None)
+        prewarmDelay -- Milliseconds before missing instances are built (default: 100)
+        parent -- parent object (default: None)
+
+        Example:
+        WidgetPool(lambda: QLabelledPromptDialog("Host", completions=hosts), size=1)
+        """
+        super().__init__(parent)
+        self.factory = factory
+        self.size = size
+        self.maxSize = size if maxSize is None else max(size, maxSize)
+        self.prewarmDelay = prewarmDelay
+        self.__free = []
+        self.__connections = {}  # Acquired instance -> [(signal, slot)]
+        self.__prewarmScheduled = False
+        self.__schedulePrewarm()
+
+    def acquire(self, *args, **kwargs):
+        """Take an instance out of the pool, building one if none is ready
+
+        Arguments are passed to the instance's reset(), if any are given.
+
+        Returns:
+        QWidget -- The instance, not yet shown
+
+        Example:
+        acquire("Wake up", locks=True, lockTime=30)
+        """
+        widget = self.__free.pop() if self.__free else self.__build()
+        if args or kwargs:
+            widget.reset(*args, **kwargs)
+        self.__schedulePrewarm()
+        return widget
+
+    def connect(self, widget, signal, slot):
+        """Connect a signal of an acquired instance until it is released
+
+        Arguments:
+        widget -- An instance from acquire()
+        signal -- A bound signal of the instance
+        slot -- The callable to connect it to
+
+        Example:
+        connect(prompt, prompt.validated, self.showValidation)
+        """
+        signal.connect(slot)
+        self.__connections.setdefault(widget, []).append((signal, slot))
+
+    def release(self, widget):
+        """Hide an instance and put it back in the pool for reuse. It is
+        deleted instead if the pool already holds maxSize instances.
+        Connections made through connect() are removed.
+
+        Arguments:
+        widget -- An instance from acquire()
+        """
+        for signal, slot in self.__connections.pop(widget, ()):
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                pass  # Already disconnected by the caller
+        widget.hide()
+        if len(self.__free) >= self.maxSize:
+            widget.deleteLater()
+            return
+        widget.reset()
+        self.__free.append(widget)
+
+    def freeCount(self):
+        """Returns the number of instances ready for acquire()"""
+        return len(self.__free)
+
+    def prewarm(self):
+        """Build the missing ready instances now rather than when idle"""
+        while len(self.__free) < self.size:
+            self.__free.append(self.__build())
+
+    def clear(self):
+        """Delete the ready instances. New ones are built when idle."""
+        for widget in self.__free:
+            widget.deleteLater()
+        self.__free = []
+        self.__schedulePrewarm()
+
+    def __build(self):
+        """Build an instance, and do the work of its first show() that doesn't need it visible"""
+        widget = self.factory()
+        widget.ensurePolished()
+        if widget.layout() is not None:
+            widget.layout().activate()
+        widget.winId()  # Creates the native window
+        return widget
+
+    def __schedulePrewarm(self):
+        if not self.__prewarmScheduled and len(self.__free) < self.size:
+            self.__prewarmScheduled = True
+            QtCore.QTimer.singleShot(self.prewarmDelay, self.__prewarmOne)
+
+    @QtCore.pyqtSlot()
+    def __prewarmOne(self):
+        """Build one instance, and come back for the next after other events"""
+        self.__prewarmScheduled = False
+        if len(self.__free) < self.size:
+            self.__free.append(self.__build())
+            self.__schedulePrewarm()
@@ -0,0 +1,78 @@
+"""Custom PyQt5 widgets.
+
+Every widget class is available from the package, but its module is only
+imported the first time it is used, so importing the package is cheap
+and using one widget only loads what that widget needs.
+
+Import widgets from the package rather than from their module. Importing
+a module directly, as import source.QProgressTaskDialog does, binds the
+module on the package until the next widget is looked up.
+
+Example:
+from source import QProgressTaskDialog
+"""
+import types
+import importlib
+
+# Modules that hold a class of the same name
+_classModules = frozenset((
+    "QAlarmLockWidget",
+    "QAlarmScheduler",
+    "QConsoleInputWidget",
+    "QConsoleOutputWidget",
+    "QConsoleViewport",
+    "QGlyphLabel",
+    "QLabelledPromptDialog",
+    "QLiveClockWidget",
+    "QMultipleChoiceWidget",
+    "QProgressTaskDialog",
+    "ClockTicker",
+    "ConsoleHistory",
+    "ConsoleInputWriter",
+    "ConsoleLineStore",
+    "ConsoleDiskLog",
+    "ConsoleSearch",
+    "ConsoleSource",
+    "PrefixIndex",
+    "ProgressChannel",
+    "TaskRunner",
+    "WidgetPool",
+))
+
+# Other exported name -> module it lives in
+_exports = {
+    "ConsoleLogHandler": "ConsoleSources",
+    "ConsoleFileTailer": "ConsoleSources",
+    "feedFromStream": "ConsoleSources",
+    "feedFromAsyncProcess": "ConsoleSources",
+    "ConsoleRecorder": "ConsoleRecording",
+    "ConsoleReplay": "ConsoleRecording",
+    "readRecording": "ConsoleRecording",
+    "CancellationToken": "TaskRunner",
+    "ProgressReporter": "TaskRunner",
+    "TaskCancelled": "TaskRunner",
+    "MetricsRegistry": "Metrics",
+    "MetricsDumper": "Metrics",
+}
+
+__all__ = sorted(_classModules | set(_exports))
+
+
+def __getattr__(name):
+    module = name if name in _classModules else _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    names = globals()
+    # Importing a submodule binds it on the package over the class of the
+    # same name, also for the modules it imports, so bind the classes back
+    for other in _classModules:
+        if isinstance(names.get(other), types.ModuleType):
+            names[other] = getattr(names[other], other)
+    names[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))